@@ -0,0 +1,114 @@
+'use strict';
+// Warm JavaScript tool worker, started by app.worker_pool with
+// --disallow-code-generation-from-strings and a capped heap.
+//
+// Protocol on stdin/stdout: 4-byte big-endian length followed by a JSON object.
+//   request:  {"code": string, "filename": string, "timeout_ms": number, "max_output_bytes": number}
+//   response: {"stdout": string, "stderr": string, "exit_code": number, "timed_out": boolean,
+//              "cpu_time_ms": number, "peak_rss_kb": number, "truncated": boolean}
+//
+// Each request runs in a fresh vm context that only exposes the JS built-ins and a captured
+// console, so process, require, global and fetch are not reachable from submitted code. The
+// console is built inside the context, so neither it nor its methods lead back to this
+// process's own prototypes; its one host function only takes arguments and returns nothing.
+// Console output past max_output_bytes per stream (0 = unlimited) is dropped. CPU time is
+// this run's; peak RSS is the worker process's high-water mark.
+const fs = require('fs');
+const util = require('util');
+const vm = require('vm');
+
+let buffered = Buffer.alloc(0);
+
+// Evaluated in each new context; `emit` is the host bridge and stays private to the closure.
+const installConsole = new vm.Script(`(emit) => {
+  const sink = (stream) => (...args) => { emit(stream, ...args); };
+  globalThis.console = { log: sink(1), info: sink(1), debug: sink(1), error: sink(2), warn: sink(2) };
+}`);
+
+function describeError(err) {
+  try {
+    return err && err.stack ? String(err.stack) : `Uncaught ${String(err)}`;
+  } catch (_) {
+    return 'Uncaught exception';
+  }
+}
+
+function run({ code, filename, timeout_ms: timeoutMs, max_output_bytes: maxOutputBytes = 0 }) {
+  const stdout = { chunks: [], bytes: 0 };
+  const stderr = { chunks: [], bytes: 0 };
+  let truncated = false;
+  const write = (stream, text) => {
+    const room = maxOutputBytes ? maxOutputBytes - stream.bytes : Infinity;
+    const size = Buffer.byteLength(text, 'utf8');
+    if (size > room) {
+      truncated = true;
+      text = room > 0 ? Buffer.from(text, 'utf8').subarray(0, room).toString('utf8') : '';
+    }
+    stream.chunks.push(text);
+    stream.bytes += Math.min(size, room);
+  };
+  // Custom inspectors are skipped: they would be called with host objects as arguments. Errors
+  // are swallowed too, since a host-realm exception would reach the sandbox.
+  const emit = (stream, ...args) => {
+    let text;
+    try {
+      text = util.formatWithOptions({ customInspect: false }, ...args);
+    } catch (_) {
+      text = '[unformattable console arguments]';
+    }
+    write(stream === 1 ? stdout : stderr, `${text}\n`);
+  };
+  const context = vm.createContext(
+    {},
+    { codeGeneration: { strings: false, wasm: false }, microtaskMode: 'afterEvaluate' },
+  );
+  installConsole.runInContext(context)(emit);
+
+  let exitCode = 0;
+  let timedOut = false;
+  const cpuStart = process.cpuUsage();
+  try {
+    new vm.Script(code, { filename }).runInContext(context, { timeout: timeoutMs });
+  } catch (err) {
+    if (err && err.code === 'ERR_SCRIPT_EXECUTION_TIMEOUT') {
+      timedOut = true;
+    }
+    write(stderr, `${describeError(err)}\n`);
+    exitCode = 1;
+  }
+  const cpu = process.cpuUsage(cpuStart);
+  return {
+    stdout: stdout.chunks.join(''),
+    stderr: stderr.chunks.join(''),
+    exit_code: exitCode,
+    timed_out: timedOut,
+    cpu_time_ms: (cpu.user + cpu.system) / 1000,
+    peak_rss_kb: process.resourceUsage().maxRSS,
+    truncated,
+  };
+}
+
+function respond(message) {
+  const body = Buffer.from(JSON.stringify(message), 'utf8');
+  const header = Buffer.alloc(4);
+  header.writeUInt32BE(body.length, 0);
+  fs.writeSync(1, Buffer.concat([header, body]));
+}
+
+function drain() {
+  while (buffered.length >= 4) {
+    const size = buffered.readUInt32BE(0);
+    if (buffered.length < 4 + size) {
+      return;
+    }
+    const request = JSON.parse(buffered.subarray(4, 4 + size).toString('utf8'));
+    buffered = buffered.subarray(4 + size);
+    respond(run(request));
+  }
+}
+
+process.stdin.on('data', (chunk) => {
+  buffered = Buffer.concat([buffered, chunk]);
+  drain();
+});
+process.stdin.on('end', () => process.exit(0));
@@ -0,0 +1,166 @@
+"""Fork-server for warm Python tool execution.
+
+Started by ``app.worker_pool`` as ``python -I -B _python_worker.py`` with the sandbox env. It only
+uses the standard library and never runs submitted code itself: every request is executed in a
+freshly forked child, so one snippet cannot leak state into the next.
+
+Protocol on stdin/stdout: 4-byte big-endian length followed by a JSON object.
+  request:  {"path": str, "cwd": str, "timeout": float, "bytecode": str (optional)}
+
+``bytecode`` names a file holding the snippet's marshalled code object, compiled by the parent
+with the same interpreter; when present the child loads it instead of compiling ``path``.
+``limits`` become rlimits of the child (0 or missing means unlimited); output past
+``max_output_bytes`` per stream is drained and dropped. CPU time and peak RSS come from the
+child's rusage.
+  response: {"stdout": str, "stderr": str, "exit_code": int, "timed_out": bool}
+"""
+import json
+import marshal
+import os
+import resource
+import select
+import signal
+import struct
+import sys
+import time
+import traceback
+
+_HEADER = struct.Struct(">I")
+
+
+def _read_exact(fd, size):
+    chunks = []
+    while size:
+        chunk = os.read(fd, size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _read_message(fd):
+    header = _read_exact(fd, _HEADER.size)
+    if header is None:
+        return None
+    body = _read_exact(fd, _HEADER.unpack(header)[0])
+    return None if body is None else json.loads(body)
+
+
+def _write_message(fd, message):
+    body = json.dumps(message).encode("utf-8")
+    os.write(fd, _HEADER.pack(len(body)) + body)
+
+
+def _apply_limits(limits):
+    for name, key in (("RLIMIT_CPU", "cpu_seconds"), ("RLIMIT_AS", "memory_bytes"), ("RLIMIT_FSIZE", "file_bytes")):
+        value = int(limits.get(key) or 0)
+        if value > 0 and hasattr(resource, name):
+            # Hard CPU limit one second above soft, so SIGXCPU (not SIGKILL) ends the run.
+            hard = value + 1 if name == "RLIMIT_CPU" else value
+            resource.setrlimit(getattr(resource, name), (value, hard))
+
+
+def _run_child(path, bytecode_path, cwd, limits, out_w, err_w):
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(out_w, 1)
+    os.dup2(err_w, 2)
+    sys.stdin = open(0, "r", closefd=False)
+    sys.stdout = open(1, "w", closefd=False)
+    sys.stderr = open(2, "w", closefd=False)
+    os.chdir(cwd)
+    sys.argv = [path]
+    exit_code = 0
+    try:
+        _apply_limits(limits)
+        if bytecode_path:
+            with open(bytecode_path, "rb") as handle:
+                code = marshal.load(handle)
+        else:
+            with open(path, "rb") as handle:
+                code = compile(handle.read(), path, "exec")
+        exec(code, {"__name__": "__main__", "__file__": path, "__builtins__": __builtins__})
+    except SystemExit as exc:
+        if exc.code is None:
+            exit_code = 0
+        elif isinstance(exc.code, int):
+            exit_code = exc.code
+        else:
+            print(exc.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(exit_code & 0xFF)
+
+
+def _collect(pid, out_r, err_r, timeout, max_output_bytes):
+    buffers = {out_r: [], err_r: []}
+    sizes = {out_r: 0, err_r: 0}
+    truncated = False
+    open_fds = [out_r, err_r]
+    deadline = time.monotonic() + timeout
+    timed_out = False
+    while open_fds:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            os.kill(pid, signal.SIGKILL)
+            break
+        ready, _, _ = select.select(open_fds, [], [], remaining)
+        for fd in ready:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                open_fds.remove(fd)
+                continue
+            room = max_output_bytes - sizes[fd] if max_output_bytes else len(chunk)
+            if room < len(chunk):
+                truncated = True
+            if room > 0:
+                buffers[fd].append(chunk[:room])
+                sizes[fd] += min(room, len(chunk))
+    _, status, usage = os.wait4(pid, 0)
+    return {
+        "stdout": b"".join(buffers[out_r]).decode("utf-8", "replace"),
+        "stderr": b"".join(buffers[err_r]).decode("utf-8", "replace"),
+        "exit_code": os.waitstatus_to_exitcode(status),
+        "timed_out": timed_out,
+        "cpu_time_ms": (usage.ru_utime + usage.ru_stime) * 1000,
+        "peak_rss_kb": usage.ru_maxrss,
+        "truncated": truncated,
+    }
+
+
+def main():
+    request_fd = sys.stdin.fileno()
+    response_fd = os.dup(sys.stdout.fileno())
+    while True:
+        request = _read_message(request_fd)
+        if request is None:
+            return
+        limits = request.get("limits") or {}
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(out_r)
+            os.close(err_r)
+            os.close(response_fd)
+            _run_child(request["path"], request.get("bytecode"), request["cwd"], limits, out_w, err_w)
+        os.close(out_w)
+        os.close(err_w)
+        try:
+            reply = _collect(pid, out_r, err_r, request["timeout"], int(limits.get("max_output_bytes") or 0))
+        finally:
+            os.close(out_r)
+            os.close(err_r)
+        _write_message(response_fd, reply)
+
+
+if __name__ == "__main__":
+    main()
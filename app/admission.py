@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import math
+
+
+class AdmissionError(RuntimeError):
+    pass
+
+
+class QueueFullError(AdmissionError):
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BudgetExceededError(AdmissionError):
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after(pending: int, avg_seconds: float, workers: int) -> int:
+    """Expected seconds until a slot frees up, assuming the current average service time."""
+    estimate = pending * max(avg_seconds, 0.05) / workers
+    return max(1, min(60, math.ceil(estimate)))
@@ -2,24 +2,36 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from threading import Lock
-from typing import Dict, List
+from typing import Dict, Iterator, List
 from uuid import uuid4
 
+from app.context import estimate_tokens
+from app.conversation_store import ConversationStore, InMemoryConversationStore
 from app.models import AgentDefinition, ConversationMessage, CreateAgentRequest
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentState:
     definition: AgentDefinition
-    conversation: List[ConversationMessage] = field(default_factory=list)
+    # Conversation lives in the store; only its length is cached, loaded on first access.
+    message_count: int | None = None
+    # Bumped on every clear so cached views of the history (e.g. context windows) can tell they are stale.
+    history_epoch: int = 0
+    # Serialises writes to this agent's conversation; reads never take it.
+    lock: Lock = field(default_factory=Lock, repr=False, compare=False)
     scratchpad: list[str] = field(default_factory=list)
     pinned_facts: dict[str, str] = field(default_factory=dict)
 
 
 class AgentManager:
-    def __init__(self) -> None:
+    def __init__(self, store: ConversationStore | None = None) -> None:
+        # Guards agent creation only. ``_agents`` is copy-on-write: it is replaced, never mutated,
+        # so readers can use whatever dict they see without locking.
         self._lock = Lock()
-        self._agents: Dict[str, AgentState] = {}
+        self._store = store or InMemoryConversationStore()
+        self._agents: Dict[str, AgentState] = {
+            definition.id: AgentState(definition=definition) for definition in self._store.load_agents()
+        }
 
     def create_agent(self, request: CreateAgentRequest) -> AgentDefinition:
         agent_id = str(uuid4())
@@ -37,33 +49,66 @@ class AgentManager:
             budget_tokens=request.budget_tokens,
             budget_seconds=request.budget_seconds,
         )
+        self._store.save_agent(definition)
         with self._lock:
-            self._agents[agent_id] = AgentState(definition=definition)
+            agents = dict(self._agents)
+            agents[agent_id] = AgentState(definition=definition, message_count=0)
+            self._agents = agents
         return definition
 
     def list_agents(self) -> List[AgentDefinition]:
-        with self._lock:
-            return [state.definition for state in self._agents.values()]
+        return [state.definition for state in self._agents.values()]
 
     def add_message(self, agent_id: str, role: str, content: str) -> ConversationMessage:
-        message = ConversationMessage(role=role, content=content)
-        with self._lock:
-            self._require_agent(agent_id).conversation.append(message)
+        message = ConversationMessage(role=role, content=content, id=uuid4().hex, tokens=estimate_tokens(content))
+        state = self._require_agent(agent_id)
+        with state.lock:
+            self._store.append(agent_id, message)
+            if state.message_count is not None:
+                state.message_count += 1
         return message
 
-    def get_history(self, agent_id: str) -> List[ConversationMessage]:
-        with self._lock:
-            return list(self._require_agent(agent_id).conversation)
+    def get_history(
+        self, agent_id: str, offset: int = 0, limit: int | None = None, after_seq: int = 0
+    ) -> List[ConversationMessage]:
+        self._require_agent(agent_id)
+        return self._store.read(agent_id, offset=offset, limit=limit, after_seq=after_seq)
+
+    def iter_history(
+        self, agent_id: str, page_size: int = 500, after_seq: int = 0
+    ) -> Iterator[List[ConversationMessage]]:
+        self._require_agent(agent_id)
+        return self._store.iter_pages(agent_id, page_size=page_size, after_seq=after_seq)
+
+    def message_seq(self, agent_id: str, message_id: str) -> int:
+        self._require_agent(agent_id)
+        seq = self._store.seq_of(agent_id, message_id)
+        if seq is None:
+            raise KeyError(f"Message {message_id} not found for agent {agent_id}")
+        return seq
+
+    def history_length(self, agent_id: str) -> int:
+        state = self._require_agent(agent_id)
+        with state.lock:
+            if state.message_count is None:
+                state.message_count = self._store.count(agent_id)
+            return state.message_count
 
     def clear_history(self, agent_id: str) -> None:
-        with self._lock:
-            self._require_agent(agent_id).conversation.clear()
+        state = self._require_agent(agent_id)
+        with state.lock:
+            self._store.clear(agent_id)
+            state.message_count = 0
+            state.history_epoch += 1
+
+    def history_epoch(self, agent_id: str) -> int:
+        return self._require_agent(agent_id).history_epoch
 
     def get_agent(self, agent_id: str) -> AgentDefinition:
-        with self._lock:
-            return self._require_agent(agent_id).definition
+        return self._require_agent(agent_id).definition
 
     def _require_agent(self, agent_id: str) -> AgentState:
-        if agent_id not in self._agents:
+        state = self._agents.get(agent_id)
+        if state is None:
             raise KeyError(f"Agent {agent_id} not found")
-        return self._agents[agent_id]
+        return state
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+from app.models import ConversationMessage
+
+if TYPE_CHECKING:
+    from app.interoperability import ProviderAdapter
+
+
+@dataclass
+class _Batch:
+    adapter: ProviderAdapter
+    model: str
+    deadline: float
+    items: List[Tuple[List[ConversationMessage], Future]] = field(default_factory=list)
+
+
+class MicroBatcher:
+    """Coalesces concurrent generate calls for the same adapter and model.
+
+    The first call for an (adapter, model) opens a batch; it is dispatched through
+    ``ProviderAdapter.generate_batch`` once ``window_ms`` has passed or ``max_batch`` calls
+    have joined, whichever comes first, and each caller's future gets its own output (or the
+    batch's exception). Dispatches run on ``workers`` threads; one timer thread closes batches.
+    """
+
+    def __init__(self, window_ms: float = 5.0, max_batch: int = 16, workers: int = 8) -> None:
+        if max_batch < 1:
+            raise ValueError("max_batch must be >= 1")
+        self._window = window_ms / 1000
+        self._max_batch = max_batch
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._open: Dict[Tuple[int, str], _Batch] = {}
+        self._deadlines: List[Tuple[float, int, Tuple[int, str], _Batch]] = []
+        self._seq = itertools.count()
+        self._timer: threading.Thread | None = None
+        self._closed = False
+        self._stats: Dict[str, int] = {"batches": 0, "requests": 0, "max_size": 0}
+
+    def submit(self, adapter: ProviderAdapter, model: str, messages: List[ConversationMessage]) -> Future:
+        future: Future = Future()
+        key = (id(adapter), model)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Batcher is closed")
+            batch = self._open.get(key)
+            if batch is None:
+                batch = self._open[key] = _Batch(adapter, model, deadline=time.monotonic() + self._window)
+                heapq.heappush(self._deadlines, (batch.deadline, next(self._seq), key, batch))
+                self._ensure_timer()
+                self._cond.notify()
+            batch.items.append((messages, future))
+            if len(batch.items) >= self._max_batch:
+                del self._open[key]
+                self._pool.submit(self._dispatch, batch)
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        stats["avg_size"] = round(stats["requests"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            pending = list(self._open.values())
+            self._open.clear()
+            self._cond.notify_all()
+        for batch in pending:
+            self._dispatch(batch)
+        self._pool.shutdown(wait=True)
+
+    def _ensure_timer(self) -> None:
+        if self._timer is None:
+            self._timer = threading.Thread(target=self._run_timer, name="batch-timer", daemon=True)
+            self._timer.start()
+
+    def _run_timer(self) -> None:
+        with self._cond:
+            while not self._closed:
+                if not self._deadlines:
+                    self._cond.wait()
+                    continue
+                deadline, _, key, batch = self._deadlines[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                heapq.heappop(self._deadlines)
+                # A batch that filled up was already dispatched and replaced.
+                if self._open.get(key) is batch:
+                    del self._open[key]
+                    self._pool.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch: _Batch) -> None:
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["requests"] += len(batch.items)
+            self._stats["max_size"] = max(self._stats["max_size"], len(batch.items))
+        try:
+            outputs = batch.adapter.generate_batch(batch.model, [messages for messages, _ in batch.items])
+            if len(outputs) != len(batch.items):
+                raise RuntimeError(f"generate_batch returned {len(outputs)} outputs for {len(batch.items)} requests")
+        except Exception as exc:
+            for _, future in batch.items:
+                future.set_exception(exc)
+            return
+        for (_, future), output in zip(batch.items, outputs):
+            future.set_result(output)
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.models import Capability, CapabilityProfile, ProviderType
+
+_BITS: Dict[Capability, int] = {capability: 1 << index for index, capability in enumerate(Capability)}
+
+DEFAULT_PROFILES = [
+    CapabilityProfile(
+        provider=ProviderType.openai_compatible,
+        model="local/default",
+        context_length=8192,
+        max_output_tokens=1024,
+        capabilities=[Capability.streaming, Capability.structured_output],
+        cost_tier="low",
+        latency_tier="fast",
+    ),
+    CapabilityProfile(
+        provider=ProviderType.openai,
+        model="gpt-4.1-mini",
+        context_length=128000,
+        max_output_tokens=8192,
+        capabilities=[
+            Capability.streaming,
+            Capability.structured_output,
+            Capability.tool_calling,
+            Capability.parallel_tool_calls,
+            Capability.reasoning_tokens,
+        ],
+        cost_per_1k_tokens=0.002,
+        cost_tier="standard",
+        latency_tier="balanced",
+    ),
+]
+
+
+def capability_mask(capabilities: Iterable[Capability]) -> int:
+    mask = 0
+    for capability in capabilities:
+        mask |= _BITS[capability]
+    return mask
+
+
+def capabilities_in(mask: int) -> List[Capability]:
+    return [capability for capability, bit in _BITS.items() if mask & bit]
+
+
+@dataclass
+class _Snapshot:
+    version: int
+    profiles: Dict[str, CapabilityProfile]
+    masks: Dict[str, int]
+    # required mask -> (negated context lengths ascending, matching profiles by context descending),
+    # filled on first use; a reload starts a new snapshot, so entries never go stale.
+    matches: Dict[int, Tuple[List[int], List[CapabilityProfile]]] = field(default_factory=dict)
+
+
+class CapabilityCatalog:
+    """Model capability profiles indexed by capability bitset.
+
+    ``profiles`` are the built-in entries; a JSON file at ``path`` (a list of profiles, or
+    ``{"profiles": [...]}``) adds to or overrides them by model name. The file is re-read when
+    its mtime changes, checked at most every ``reload_interval`` seconds; a file that fails to
+    load leaves the previous catalog in place and is reported in ``info()``.
+
+    Each profile's capabilities are a bitmask, so a capability check is one AND. The profiles
+    satisfying a given set of capabilities are computed once per catalog version and kept
+    sorted by context length, so ``find`` is a dict hit plus a bisect.
+    """
+
+    def __init__(
+        self,
+        profiles: Iterable[CapabilityProfile] | None = None,
+        path: str | Path | None = None,
+        reload_interval: float = 2.0,
+    ) -> None:
+        self._base = {p.model: p for p in (DEFAULT_PROFILES if profiles is None else profiles)}
+        self._path = Path(path) if path else None
+        self._reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime: float | None = None
+        self._next_check = 0.0
+        self._file_profiles: Dict[str, CapabilityProfile] = {}
+        self._last_error: str | None = None
+        self._snapshot = self._build(version=1)
+        if self._path is not None:
+            self._check_file(force=True)
+
+    def get(self, model: str) -> CapabilityProfile | None:
+        return self._current().profiles.get(model)
+
+    def profiles(self) -> List[CapabilityProfile]:
+        return list(self._current().profiles.values())
+
+    def find(self, required: Iterable[Capability] | int = (), min_context: int = 0) -> List[CapabilityProfile]:
+        """Profiles having every ``required`` capability and at least ``min_context`` tokens of
+        context, largest context first."""
+        snapshot = self._current()
+        mask = required if isinstance(required, int) else capability_mask(required)
+        entry = snapshot.matches.get(mask)
+        if entry is None:
+            hits = sorted(
+                (p for model, p in snapshot.profiles.items() if snapshot.masks[model] & mask == mask),
+                key=lambda p: -p.context_length,
+            )
+            entry = snapshot.matches[mask] = ([-p.context_length for p in hits], hits)
+        negated_contexts, hits = entry
+        return hits[: bisect_right(negated_contexts, -min_context)]
+
+    def missing(self, profile: CapabilityProfile, required: Iterable[Capability]) -> List[Capability]:
+        snapshot = self._current()
+        have = snapshot.masks.get(profile.model) if snapshot.profiles.get(profile.model) is profile else None
+        if have is None:
+            have = capability_mask(profile.capabilities)
+        return capabilities_in(capability_mask(required) & ~have)
+
+    def add(self, profile: CapabilityProfile) -> None:
+        with self._lock:
+            self._base[profile.model] = profile
+            self._snapshot = self._build(self._snapshot.version + 1)
+
+    def info(self) -> Dict[str, Any]:
+        snapshot = self._current()
+        return {
+            "version": snapshot.version,
+            "profiles": len(snapshot.profiles),
+            "path": str(self._path) if self._path else None,
+            "last_error": self._last_error,
+        }
+
+    def _current(self) -> _Snapshot:
+        if self._path is not None and time.monotonic() >= self._next_check:
+            self._check_file()
+        return self._snapshot
+
+    def _check_file(self, force: bool = False) -> None:
+        with self._lock:
+            if not force and time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self._reload_interval
+            try:
+                mtime = os.stat(self._path).st_mtime
+            except OSError as exc:
+                self._last_error = f"Cannot read {self._path}: {exc.strerror}"
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                raw = json.loads(self._path.read_text(encoding="utf-8"))
+                entries = raw["profiles"] if isinstance(raw, dict) else raw
+                loaded = [CapabilityProfile.model_validate(entry) for entry in entries]
+            except (OSError, ValueError, KeyError, TypeError) as exc:
+                self._last_error = f"Invalid catalog {self._path}: {exc}"
+                return
+            self._mtime = mtime
+            self._last_error = None
+            self._file_profiles = {p.model: p for p in loaded}
+            self._snapshot = self._build(self._snapshot.version + 1)
+
+    def _build(self, version: int) -> _Snapshot:
+        profiles = {**self._base, **self._file_profiles}
+        masks = {model: capability_mask(p.capabilities) for model, p in profiles.items()}
+        return _Snapshot(version=version, profiles=profiles, masks=masks)
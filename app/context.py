@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Deque, List
+
+from app.models import AgentDefinition, CapabilityProfile, ConversationMessage
+
+if TYPE_CHECKING:
+    from app.agent_manager import AgentManager
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text.split())
+
+
+def message_tokens(message: ConversationMessage) -> int:
+    return message.tokens if message.tokens is not None else estimate_tokens(message.content)
+
+
+@dataclass
+class ContextWindow:
+    messages: List[ConversationMessage]
+    tokens: int
+    dropped: int
+
+
+@dataclass
+class _CachedWindow:
+    epoch: int
+    budget: int
+    last_seq: int = 0
+    messages: Deque[ConversationMessage] = field(default_factory=deque)
+    tokens: int = 0
+    dropped: int = 0
+
+
+class ContextWindowBuilder:
+    """Keeps a rolling, token-budgeted tail of each agent's history.
+
+    Each build only reads messages newer than the cached window and trims the oldest turns
+    until the window fits ``context_length - max_output_tokens`` (minus the system prompt and
+    the new prompt), so the cost is O(new messages). The cache is rebuilt from the store when
+    the history was cleared or the budget grew past turns that were already dropped.
+    """
+
+    def __init__(self, agent_manager: AgentManager, max_cached_agents: int = 1024) -> None:
+        self._agent_manager = agent_manager
+        self._max_cached_agents = max_cached_agents
+        self._lock = threading.Lock()
+        self._windows: "OrderedDict[str, _CachedWindow]" = OrderedDict()
+
+    def build(self, agent: AgentDefinition, prompt: str, profile: CapabilityProfile) -> ContextWindow:
+        system = ConversationMessage(role="system", content=agent.system_prompt)
+        user = ConversationMessage(role="user", content=prompt)
+        fixed = message_tokens(system) + message_tokens(user)
+        budget = max(profile.context_length - profile.max_output_tokens - fixed, 0)
+
+        window = self._window_for(agent.id, budget)
+        for page in self._agent_manager.iter_history(agent.id, after_seq=window.last_seq):
+            for message in page:
+                window.messages.append(message)
+                window.tokens += message_tokens(message)
+                window.last_seq = message.seq or window.last_seq
+            self._trim(window, budget)
+        self._trim(window, budget)
+
+        messages = [system]
+        if window.dropped:
+            messages.append(
+                ConversationMessage(
+                    role="system",
+                    content=f"[{window.dropped} earlier messages omitted to fit the context window]",
+                )
+            )
+        messages.extend(window.messages)
+        messages.append(user)
+        return ContextWindow(messages=messages, tokens=fixed + window.tokens, dropped=window.dropped)
+
+    def invalidate(self, agent_id: str) -> None:
+        with self._lock:
+            self._windows.pop(agent_id, None)
+
+    def _window_for(self, agent_id: str, budget: int) -> _CachedWindow:
+        epoch = self._agent_manager.history_epoch(agent_id)
+        with self._lock:
+            window = self._windows.get(agent_id)
+            if window is None or window.epoch != epoch or (window.dropped and budget > window.budget):
+                window = _CachedWindow(epoch=epoch, budget=budget)
+                self._windows[agent_id] = window
+            else:
+                window.budget = budget
+            self._windows.move_to_end(agent_id)
+            while len(self._windows) > self._max_cached_agents:
+                self._windows.popitem(last=False)
+        return window
+
+    @staticmethod
+    def _trim(window: _CachedWindow, budget: int) -> None:
+        while window.messages and window.tokens > budget:
+            window.tokens -= message_tokens(window.messages.popleft())
+            window.dropped += 1
@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from app.models import AgentDefinition, ConversationMessage
+
+
+class ConversationStore:
+    """Storage for agent definitions and their append-only conversation logs.
+
+    ``append`` assigns each message the agent's next ``seq``; sequence numbers keep increasing
+    across ``clear`` so they can serve as pagination cursors. Reads may run concurrently with
+    anything. Callers serialise writes (``append``/``clear``) per agent; ``AgentManager`` does
+    this with its per-agent lock.
+    """
+
+    def save_agent(self, definition: AgentDefinition) -> None:
+        raise NotImplementedError
+
+    def load_agents(self) -> List[AgentDefinition]:
+        raise NotImplementedError
+
+    def append(self, agent_id: str, message: ConversationMessage) -> ConversationMessage:
+        raise NotImplementedError
+
+    def read(
+        self, agent_id: str, offset: int = 0, limit: int | None = None, after_seq: int = 0
+    ) -> List[ConversationMessage]:
+        raise NotImplementedError
+
+    def seq_of(self, agent_id: str, message_id: str) -> int | None:
+        raise NotImplementedError
+
+    def count(self, agent_id: str) -> int:
+        raise NotImplementedError
+
+    def clear(self, agent_id: str) -> None:
+        raise NotImplementedError
+
+    def iter_pages(self, agent_id: str, page_size: int = 500, after_seq: int = 0) -> Iterator[List[ConversationMessage]]:
+        # Keyset pagination on seq: every page starts where the previous one ended.
+        while True:
+            page = self.read(agent_id, limit=page_size, after_seq=after_seq)
+            if not page:
+                return
+            yield page
+            after_seq = page[-1].seq or after_seq
+
+    def close(self) -> None:
+        pass
+
+
+# Role names are interned: each stored message keeps a 2-byte index into this table.
+_ROLES: List[str] = ["system", "user", "assistant", "tool"]
+_ROLE_INDEX: Dict[str, int] = {role: index for index, role in enumerate(_ROLES)}
+_roles_lock = threading.Lock()
+_NO_ID = bytes(16)
+
+
+def _role_index(role: str) -> int:
+    index = _ROLE_INDEX.get(role)
+    if index is None:
+        with _roles_lock:
+            index = _ROLE_INDEX.get(role)
+            if index is None:
+                if len(_ROLES) >= 1 << 16:
+                    raise ValueError("Too many distinct message roles")
+                index = _ROLE_INDEX[role] = len(_ROLES)
+                _ROLES.append(role)
+    return index
+
+
+def _packed_id(message_id: str | None) -> bytes | None:
+    # uuid4().hex ids (what AgentManager assigns) pack into 16 bytes; anything else does not.
+    if message_id is None or len(message_id) != 32:
+        return None
+    try:
+        raw = bytes.fromhex(message_id)
+    except ValueError:
+        return None
+    return raw if raw.hex() == message_id else None
+
+
+class _MessageLog:
+    """One agent's messages stored column-wise in flat buffers rather than as objects.
+
+    Content is one UTF-8 buffer with an offsets array, roles are interned indexes, ids are
+    packed 16-byte values, and ``seq`` is implied by position: a log holds consecutive
+    sequence numbers starting at ``first_seq``. Only ``append`` writes, and it bumps ``size``
+    last, so a reader that snapshots ``size`` first sees complete rows without locking.
+    """
+
+    __slots__ = ("first_seq", "size", "roles", "tokens", "offsets", "content", "ids", "other_ids")
+
+    def __init__(self, first_seq: int) -> None:
+        self.first_seq = first_seq
+        self.size = 0
+        self.roles = array("H")
+        # -1 when the token count is unknown
+        self.tokens = array("q")
+        self.offsets = array("Q", [0])
+        self.content = bytearray()
+        self.ids = bytearray()
+        # ids that do not pack into 16 bytes, by row
+        self.other_ids: Dict[int, str] = {}
+
+    def append(self, message: ConversationMessage) -> int:
+        row = self.size
+        packed = _packed_id(message.id)
+        if packed is None and message.id is not None:
+            self.other_ids[row] = message.id
+        self.roles.append(_role_index(message.role))
+        self.tokens.append(-1 if message.tokens is None else message.tokens)
+        self.content += message.content.encode("utf-8")
+        self.offsets.append(len(self.content))
+        self.ids += packed or _NO_ID
+        self.size = row + 1
+        return self.first_seq + row
+
+    def rows(self, start: int, stop: int) -> List[ConversationMessage]:
+        messages = []
+        for row in range(start, stop):
+            message_id = self.other_ids.get(row)
+            if message_id is None:
+                packed = self.ids[row * 16 : row * 16 + 16]
+                message_id = packed.hex() if packed != _NO_ID else None
+            tokens = self.tokens[row]
+            # Stored rows were validated on the way in.
+            messages.append(
+                ConversationMessage.model_construct(
+                    role=_ROLES[self.roles[row]],
+                    content=self.content[self.offsets[row] : self.offsets[row + 1]].decode("utf-8"),
+                    id=message_id,
+                    seq=self.first_seq + row,
+                    tokens=None if tokens < 0 else tokens,
+                )
+            )
+        return messages
+
+    def find(self, message_id: str) -> int | None:
+        # A scan of the packed id buffer; fast, but linear in the log length.
+        packed = _packed_id(message_id)
+        if packed is None:
+            for row, other in self.other_ids.items():
+                if other == message_id:
+                    return row
+            return None
+        position = self.ids.find(packed)
+        while position != -1 and position % 16:
+            position = self.ids.find(packed, position + 1)
+        return None if position == -1 else position // 16
+
+
+class InMemoryConversationStore(ConversationStore):
+    def __init__(self) -> None:
+        # Guards the dict layout only. Logs are append-only and ``clear`` swaps in a fresh log,
+        # so reads need no locking; see ``_MessageLog``.
+        self._lock = threading.Lock()
+        self._agents: Dict[str, AgentDefinition] = {}
+        self._logs: Dict[str, _MessageLog] = {}
+
+    def save_agent(self, definition: AgentDefinition) -> None:
+        with self._lock:
+            self._agents[definition.id] = definition
+
+    def load_agents(self) -> List[AgentDefinition]:
+        with self._lock:
+            return list(self._agents.values())
+
+    def append(self, agent_id: str, message: ConversationMessage) -> ConversationMessage:
+        log = self._logs.get(agent_id)
+        if log is None:
+            with self._lock:
+                log = self._logs.setdefault(agent_id, _MessageLog(first_seq=1))
+        message.seq = log.append(message)
+        return message
+
+    def read(
+        self, agent_id: str, offset: int = 0, limit: int | None = None, after_seq: int = 0
+    ) -> List[ConversationMessage]:
+        log = self._logs.get(agent_id)
+        if log is None:
+            return []
+        size = log.size
+        start = offset + min(max(after_seq - log.first_seq + 1, 0), size)
+        stop = size if limit is None else min(start + limit, size)
+        return log.rows(start, stop)
+
+    def seq_of(self, agent_id: str, message_id: str) -> int | None:
+        log = self._logs.get(agent_id)
+        row = log.find(message_id) if log is not None else None
+        return None if row is None else log.first_seq + row
+
+    def count(self, agent_id: str) -> int:
+        log = self._logs.get(agent_id)
+        return log.size if log is not None else 0
+
+    def clear(self, agent_id: str) -> None:
+        with self._lock:
+            log = self._logs.get(agent_id)
+            if log is not None:
+                # Sequence numbers are never reused, so the fresh log continues after the old one.
+                self._logs[agent_id] = _MessageLog(first_seq=log.first_seq + log.size)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """One row per message, keyed by (agent_id, seq); nothing is held in memory per agent.
+
+    Writes go through a single connection; reads use one connection per thread, which WAL
+    lets run concurrently with the writer.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._conn = sqlite3.connect(str(self._path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS agents (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS agent_seq (agent_id TEXT PRIMARY KEY, last_seq INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                agent_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                id TEXT,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                tokens INTEGER,
+                PRIMARY KEY (agent_id, seq)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS messages_id ON messages(agent_id, id)")
+
+    def save_agent(self, definition: AgentDefinition) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO agents (id, data) VALUES (?, ?)",
+                (definition.id, definition.model_dump_json()),
+            )
+
+    def load_agents(self) -> List[AgentDefinition]:
+        rows = self._reader().execute("SELECT data FROM agents ORDER BY rowid").fetchall()
+        return [AgentDefinition.model_validate_json(row[0]) for row in rows]
+
+    def append(self, agent_id: str, message: ConversationMessage) -> ConversationMessage:
+        # The connection's context manager commits, or rolls back if either insert fails.
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            seq = self._conn.execute(
+                """
+                INSERT INTO agent_seq (agent_id, last_seq) VALUES (?, 1)
+                ON CONFLICT(agent_id) DO UPDATE SET last_seq = last_seq + 1
+                RETURNING last_seq
+                """,
+                (agent_id,),
+            ).fetchone()[0]
+            self._conn.execute(
+                "INSERT INTO messages (agent_id, seq, id, role, content, tokens) VALUES (?, ?, ?, ?, ?, ?)",
+                (agent_id, seq, message.id, message.role, message.content, message.tokens),
+            )
+        message.seq = seq
+        return message
+
+    def read(
+        self, agent_id: str, offset: int = 0, limit: int | None = None, after_seq: int = 0
+    ) -> List[ConversationMessage]:
+        rows = self._reader().execute(
+            """
+            SELECT seq, id, role, content, tokens FROM messages
+            WHERE agent_id = ? AND seq > ? ORDER BY seq LIMIT ? OFFSET ?
+            """,
+            (agent_id, after_seq, -1 if limit is None else limit, offset),
+        ).fetchall()
+        return [
+            ConversationMessage.model_construct(role=role, content=content, id=message_id, seq=seq, tokens=tokens)
+            for seq, message_id, role, content, tokens in rows
+        ]
+
+    def seq_of(self, agent_id: str, message_id: str) -> int | None:
+        row = self._reader().execute(
+            "SELECT seq FROM messages WHERE agent_id = ? AND id = ?", (agent_id, message_id)
+        ).fetchone()
+        return row[0] if row else None
+
+    def count(self, agent_id: str) -> int:
+        return self._reader().execute("SELECT COUNT(*) FROM messages WHERE agent_id = ?", (agent_id,)).fetchone()[0]
+
+    def clear(self, agent_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE agent_id = ?", (agent_id,))
+
+    def close(self) -> None:
+        with self._lock:
+            for reader in self._readers:
+                reader.close()
+            self._readers.clear()
+            self._conn.close()
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self._path), check_same_thread=False, isolation_level=None)
+            self._local.conn = conn
+            with self._lock:
+                self._readers.append(conn)
+        return conn
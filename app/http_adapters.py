@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterator
+
+from app.interoperability import ProviderAdapter, ProviderError
+from app.models import ConversationMessage, ProviderType
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+
+@dataclass
+class HTTPPoolConfig:
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    max_concurrency: int = 32
+    timeout_seconds: float = 60.0
+    http2: bool = True
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class HTTPProviderAdapter(ProviderAdapter):
+    """Adapter for a provider reached over HTTP.
+
+    One sync and one async ``httpx`` client are kept per adapter, so connections are pooled and
+    kept alive across requests (HTTP/2 when ``h2`` is installed). In-flight requests are capped
+    at ``max_concurrency`` on each path.
+    """
+
+    path = ""
+
+    def __init__(
+        self,
+        provider: ProviderType,
+        base_url: str,
+        api_key: str | None = None,
+        pool: HTTPPoolConfig | None = None,
+    ) -> None:
+        super().__init__(provider=provider)
+        if httpx is None:
+            raise RuntimeError("HTTP provider adapters require the 'httpx' package")
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key if api_key is not None else os.environ.get(f"{provider.value.upper()}_API_KEY")
+        self.pool = pool or HTTPPoolConfig()
+        self._lock = threading.Lock()
+        self._client: Any = None
+        self._sync_limit = threading.BoundedSemaphore(self.pool.max_concurrency)
+        # Async clients and semaphores belong to the event loop that created them.
+        self._async_loop: asyncio.AbstractEventLoop | None = None
+        self._async_client: Any = None
+        self._async_limit: asyncio.Semaphore | None = None
+
+    def headers(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+    def build_payload(self, model: str, messages: list[ConversationMessage]) -> dict[str, Any]:
+        return {"model": model, "messages": self.transform_messages(messages)}
+
+    def parse_output(self, data: dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def stream_payload(self, model: str, messages: list[ConversationMessage]) -> dict[str, Any]:
+        return {**self.build_payload(model, messages), "stream": True}
+
+    def parse_stream_event(self, data: dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def _sse_chunk(self, line: str) -> str | None:
+        if not line.startswith("data:"):
+            return None
+        raw = line[len("data:") :].strip()
+        if not raw or raw == "[DONE]":
+            return None
+        return self.parse_stream_event(json.loads(raw)) or None
+
+    def stream(self, model: str, messages: list[ConversationMessage]) -> Iterator[str]:
+        try:
+            with self._sync_limit:
+                with self._sync_client().stream("POST", self.path, json=self.stream_payload(model, messages)) as response:
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        chunk = self._sse_chunk(line)
+                        if chunk is not None:
+                            yield chunk
+        except httpx.HTTPError as exc:
+            raise ProviderError(f"{self.provider.value} stream failed: {exc}") from exc
+
+    async def astream(self, model: str, messages: list[ConversationMessage]) -> AsyncIterator[str]:
+        client, limit = self._async_client_for_loop()
+        try:
+            async with limit:
+                async with client.stream("POST", self.path, json=self.stream_payload(model, messages)) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        chunk = self._sse_chunk(line)
+                        if chunk is not None:
+                            yield chunk
+        except httpx.HTTPError as exc:
+            raise ProviderError(f"{self.provider.value} stream failed: {exc}") from exc
+
+    def generate(self, model: str, messages: list[ConversationMessage]) -> str:
+        try:
+            with self._sync_limit:
+                response = self._sync_client().post(self.path, json=self.build_payload(model, messages))
+            response.raise_for_status()
+        except httpx.HTTPError as exc:
+            raise ProviderError(f"{self.provider.value} request failed: {exc}") from exc
+        return self.parse_output(response.json())
+
+    def generate_batch(self, model: str, batch: list[list[ConversationMessage]]) -> list[str]:
+        # Chat endpoints take one conversation per request: fan the batch out over the pooled client.
+        if len(batch) <= 1:
+            return super().generate_batch(model, batch)
+        with ThreadPoolExecutor(max_workers=min(len(batch), self.pool.max_concurrency)) as executor:
+            return list(executor.map(lambda messages: self.generate(model, messages), batch))
+
+    async def agenerate(self, model: str, messages: list[ConversationMessage]) -> str:
+        client, limit = self._async_client_for_loop()
+        try:
+            async with limit:
+                response = await client.post(self.path, json=self.build_payload(model, messages))
+            response.raise_for_status()
+        except httpx.HTTPError as exc:
+            raise ProviderError(f"{self.provider.value} request failed: {exc}") from exc
+        return self.parse_output(response.json())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+
+    def _client_kwargs(self) -> dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "headers": self.headers(),
+            "timeout": self.pool.timeout_seconds,
+            "limits": httpx.Limits(
+                max_connections=self.pool.max_connections,
+                max_keepalive_connections=self.pool.max_keepalive_connections,
+                keepalive_expiry=self.pool.keepalive_expiry,
+            ),
+            "http2": self.pool.http2 and _http2_available(),
+        }
+
+    def _sync_client(self) -> Any:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(**self._client_kwargs())
+            return self._client
+
+    def _async_client_for_loop(self) -> tuple[Any, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._async_loop is not loop:
+                self._async_loop = loop
+                self._async_client = httpx.AsyncClient(**self._client_kwargs())
+                self._async_limit = asyncio.Semaphore(self.pool.max_concurrency)
+            return self._async_client, self._async_limit
+
+
+class OpenAIChatAdapter(HTTPProviderAdapter):
+    path = "/chat/completions"
+
+    def parse_output(self, data: dict[str, Any]) -> str:
+        return data["choices"][0]["message"]["content"] or ""
+
+    def parse_stream_event(self, data: dict[str, Any]) -> str:
+        choices = data.get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content") or ""
+
+
+class AnthropicMessagesAdapter(HTTPProviderAdapter):
+    path = "/v1/messages"
+    max_tokens = 1024
+
+    def headers(self) -> dict[str, str]:
+        headers = {"anthropic-version": "2023-06-01"}
+        if self.api_key:
+            headers["x-api-key"] = self.api_key
+        return headers
+
+    def build_payload(self, model: str, messages: list[ConversationMessage]) -> dict[str, Any]:
+        system = "\n\n".join(m.content for m in messages if m.role == "system" and m.content)
+        payload: dict[str, Any] = {
+            "model": model,
+            "max_tokens": self.max_tokens,
+            "messages": self.transform_messages([m for m in messages if m.role != "system"]),
+        }
+        if system:
+            payload["system"] = system
+        return payload
+
+    def parse_output(self, data: dict[str, Any]) -> str:
+        return "".join(block.get("text", "") for block in data.get("content", []) if block.get("type") == "text")
+
+    def parse_stream_event(self, data: dict[str, Any]) -> str:
+        if data.get("type") == "content_block_delta":
+            return data.get("delta", {}).get("text", "")
+        return ""
+
+
+class GenericRESTAdapter(HTTPProviderAdapter):
+    def parse_output(self, data: dict[str, Any]) -> str:
+        return data["output_text"]
+
+    # No streaming protocol is assumed for arbitrary REST endpoints: emit the whole output at once.
+    def stream(self, model: str, messages: list[ConversationMessage]) -> Iterator[str]:
+        yield self.generate(model, messages)
+
+    async def astream(self, model: str, messages: list[ConversationMessage]) -> AsyncIterator[str]:
+        yield await self.agenerate(model, messages)
+
+
+_HTTP_ADAPTERS: dict[ProviderType, type[HTTPProviderAdapter]] = {
+    ProviderType.openai: OpenAIChatAdapter,
+    ProviderType.azure: OpenAIChatAdapter,
+    ProviderType.openai_compatible: OpenAIChatAdapter,
+    ProviderType.anthropic: AnthropicMessagesAdapter,
+    ProviderType.generic_rest: GenericRESTAdapter,
+}
+
+
+def create_http_adapter(
+    provider: ProviderType, base_url: str, pool: HTTPPoolConfig | None = None
+) -> HTTPProviderAdapter:
+    adapter_cls = _HTTP_ADAPTERS.get(provider)
+    if adapter_cls is None:
+        raise ValueError(f"No HTTP adapter for provider {provider.value}")
+    return adapter_cls(provider=provider, base_url=base_url, pool=pool)
@@ -1,16 +1,38 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator, Tuple
 
 from app.models import (
     Capability,
     CapabilityProfile,
     ConversationMessage,
+    GenerateStreamEvent,
     ModelConfig,
     ProviderType,
     UnifiedGenerateRequest,
     UnifiedGenerateResponse,
 )
+from app.batching import MicroBatcher
+from app.capability_catalog import CapabilityCatalog
+from app.context import estimate_tokens
+from app.response_cache import ResponseCache, request_cache_key
+from app.routing import EXCLUDED_SCORE, RoutingEngine
+from app.telemetry import telemetry
+from app.tool_calls import parse_tool_calls
+
+
+class ProviderError(RuntimeError):
+    pass
+
+
+def _cache_status(response: UnifiedGenerateResponse) -> str:
+    return response.metadata.get("cache", {}).get("status", "off")
 
 
 @dataclass
@@ -24,6 +46,22 @@ class ProviderAdapter:
         last = messages[-1].content if messages else ""
         return f"[{self.provider.value}:{model}] {last}".strip()
 
+    async def agenerate(self, model: str, messages: list[ConversationMessage]) -> str:
+        # Local adapters do no I/O; network-backed adapters override this with a non-blocking call.
+        return self.generate(model=model, messages=messages)
+
+    def generate_batch(self, model: str, batch: list[list[ConversationMessage]]) -> list[str]:
+        # One output per conversation, in order; providers with a batch endpoint override this.
+        return [self.generate(model=model, messages=messages) for messages in batch]
+
+    def stream(self, model: str, messages: list[ConversationMessage]) -> Iterator[str]:
+        # Word-sized chunks of the full output; providers with native streaming override this.
+        yield from re.findall(r"\S+\s*", self.generate(model=model, messages=messages))
+
+    async def astream(self, model: str, messages: list[ConversationMessage]) -> AsyncIterator[str]:
+        for chunk in self.stream(model=model, messages=messages):
+            yield chunk
+
 
 class OpenAICompatibleAdapter(ProviderAdapter):
     def __init__(self) -> None:
@@ -31,7 +69,15 @@ class OpenAICompatibleAdapter(ProviderAdapter):
 
 
 class AdapterRegistry:
-    def __init__(self) -> None:
+    """Provider adapters, plus pooled HTTP adapters for the operator's allowlisted endpoints.
+
+    A request may only name a ``base_url`` listed in ``endpoints``: HTTP adapters attach the
+    server's ``{PROVIDER}_API_KEY`` credentials, which must never go to a caller-chosen host.
+    """
+
+    def __init__(self, catalog: CapabilityCatalog | None = None, endpoints: Iterable[str] = ()) -> None:
+        self.catalog = catalog or CapabilityCatalog()
+        self._endpoints = frozenset(url.strip().rstrip("/") for url in endpoints if url.strip())
         self._adapters = {
             ProviderType.openai: ProviderAdapter(ProviderType.openai),
             ProviderType.anthropic: ProviderAdapter(ProviderType.anthropic),
@@ -41,76 +87,417 @@ class AdapterRegistry:
             ProviderType.openai_compatible: OpenAICompatibleAdapter(),
             ProviderType.generic_rest: ProviderAdapter(ProviderType.generic_rest),
         }
-        self._profiles = {
-            "local/default": CapabilityProfile(
-                provider=ProviderType.openai_compatible,
-                model="local/default",
-                context_length=8192,
-                max_output_tokens=1024,
-                capabilities=[Capability.streaming, Capability.structured_output],
-            ),
-            "gpt-4.1-mini": CapabilityProfile(
-                provider=ProviderType.openai,
-                model="gpt-4.1-mini",
-                context_length=128000,
-                max_output_tokens=8192,
-                capabilities=[
-                    Capability.streaming,
-                    Capability.structured_output,
-                    Capability.tool_calling,
-                    Capability.parallel_tool_calls,
-                    Capability.reasoning_tokens,
-                ],
-            ),
-        }
-
+        # Bounded by the allowlist: at most one adapter per provider and endpoint.
+        self._http_adapters: dict[tuple[ProviderType, str], ProviderAdapter] = {}
+        self._http_lock = threading.Lock()
 
     def list_providers(self) -> list[ProviderType]:
         return list(self._adapters.keys())
-    def get_adapter(self, provider: ProviderType) -> ProviderAdapter:
-        return self._adapters[provider]
+
+    def check_endpoint(self, base_url: str) -> str:
+        endpoint = base_url.rstrip("/")
+        if endpoint not in self._endpoints:
+            raise ValueError(f"base_url {base_url!r} is not an allowed provider endpoint")
+        return endpoint
+
+    def get_adapter(self, provider: ProviderType, base_url: str | None = None) -> ProviderAdapter:
+        if base_url is None:
+            return self._adapters[provider]
+        # One pooled HTTP adapter per endpoint so connections are reused across requests.
+        from app.http_adapters import create_http_adapter
+
+        key = (provider, self.check_endpoint(base_url))
+        with self._http_lock:
+            adapter = self._http_adapters.get(key)
+            if adapter is None:
+                adapter = self._http_adapters[key] = create_http_adapter(provider, key[1])
+            return adapter
+
+    def profiles(self) -> list[CapabilityProfile]:
+        return self.catalog.profiles()
 
     def discover_capabilities(self, model: ModelConfig) -> CapabilityProfile:
-        return self._profiles.get(
-            model.model,
-            CapabilityProfile(provider=model.provider, model=model.model),
-        )
+        profile = self.catalog.get(model.model)
+        return profile if profile is not None else CapabilityProfile(provider=model.provider, model=model.model)
+
+
+@dataclass
+class RouteDecision:
+    provider: ProviderType
+    model: str
+    profile: CapabilityProfile
+    missing: list[Capability]
+    # Other profiles meeting every required capability, best first; used for hedging.
+    alternates: list[CapabilityProfile] = field(default_factory=list)
 
 
 class ModelRouter:
-    def __init__(self, registry: AdapterRegistry) -> None:
+    def __init__(
+        self,
+        registry: AdapterRegistry,
+        cache: ResponseCache | None = None,
+        engine: RoutingEngine | None = None,
+        hedge_workers: int = 16,
+        batcher: MicroBatcher | None = None,
+    ) -> None:
         self._registry = registry
+        self._cache = cache
+        self._engine = engine or RoutingEngine()
+        # Opt-in: without a batcher every call goes straight to its adapter.
+        self._batcher = batcher
+        self._hedge_workers = hedge_workers
+        self._hedge_pool: ThreadPoolExecutor | None = None
+        self._hedge_lock = threading.Lock()
+
+    @property
+    def engine(self) -> RoutingEngine:
+        return self._engine
+
+    @property
+    def batcher(self) -> MicroBatcher | None:
+        return self._batcher
 
     def negotiate_capabilities(self, request: UnifiedGenerateRequest) -> tuple[CapabilityProfile, list[Capability]]:
         profile = self._registry.discover_capabilities(request.model)
-        missing = [cap for cap in request.require_capabilities if cap not in profile.capabilities]
+        missing = self._registry.catalog.missing(profile, request.require_capabilities)
         if missing and not request.allow_auto_downgrade:
             raise ValueError(f"Missing required capabilities: {[m.value for m in missing]}")
         return profile, missing
 
-    def generate(self, request: UnifiedGenerateRequest) -> UnifiedGenerateResponse:
+    def resolve(self, request: UnifiedGenerateRequest) -> RouteDecision:
+        with telemetry.span("router.resolve", model=request.model.model):
+            return self._resolve(request)
+
+    def _resolve(self, request: UnifiedGenerateRequest) -> RouteDecision:
+        if request.model.base_url is not None:
+            self._registry.check_endpoint(request.model.base_url)
         profile, missing = self.negotiate_capabilities(request)
-        selected_model = request.model.model
-        selected_provider = request.model.provider
-
-        # simple fallback policy: if capabilities missing, route to stronger default model
-        if missing:
-            selected_model = "gpt-4.1-mini"
-            selected_provider = ProviderType.openai
-            profile = self._registry.discover_capabilities(
-                ModelConfig(provider=selected_provider, model=selected_model)
-            )
-
-        adapter = self._registry.get_adapter(selected_provider)
-        output = adapter.generate(model=selected_model, messages=request.messages)
+        # Only profiles that meet every requirement compete; partial matches are a last resort.
+        candidates = self._registry.catalog.find(request.require_capabilities) or self._registry.profiles()
+        ranked = self._engine.rank(request.model, request.require_capabilities, candidates)
+        requested = next(
+            (r for r in ranked if (r.profile.provider, r.profile.model) == (profile.provider, profile.model)), None
+        )
+        # Keep an explicitly requested model that can serve the request, unless it is in a dearer
+        # cost tier than asked for or mostly failing; otherwise take the best-ranked profile.
+        keep = not missing and (requested is None or requested.score < EXCLUDED_SCORE)
+        if not keep and ranked:
+            profile = ranked[0].profile
+        alternates = [
+            r.profile
+            for r in ranked
+            if not r.missing and (r.profile.provider, r.profile.model) != (profile.provider, profile.model)
+        ]
+        return RouteDecision(
+            provider=profile.provider, model=profile.model, profile=profile, missing=missing, alternates=alternates
+        )
+
+    def generate(self, request: UnifiedGenerateRequest) -> UnifiedGenerateResponse:
+        with telemetry.span("router.generate", model=request.model.model) as span:
+            response = self._generate(request)
+            span.attributes.update(used_model=response.used_model, cache=_cache_status(response))
+            return response
+
+    def _generate(self, request: UnifiedGenerateRequest) -> UnifiedGenerateResponse:
+        key, cached = self._cache_lookup(request)
+        if cached is not None:
+            return cached
+        if self._batches(request):
+            route, start = self.resolve(request), time.perf_counter()
+            output = self._timed(request, route, self._batched_call(request))
+            return self._batched_response(key, route, output, start)
+        route, output = self._call(
+            request,
+            self.resolve(request),
+            lambda adapter, route: adapter.generate(model=route.model, messages=request.messages),
+        )
+        return self._cache_store(key, self._build_response(route, output))
+
+    async def agenerate(self, request: UnifiedGenerateRequest) -> UnifiedGenerateResponse:
+        with telemetry.span("router.generate", model=request.model.model) as span:
+            response = await self._agenerate(request)
+            span.attributes.update(used_model=response.used_model, cache=_cache_status(response))
+            return response
+
+    async def _agenerate(self, request: UnifiedGenerateRequest) -> UnifiedGenerateResponse:
+        key, cached = self._cache_lookup(request)
+        if cached is not None:
+            return cached
+        if self._batches(request):
+            route, start = self.resolve(request), time.perf_counter()
+            output = await self._atimed(request, route, self._abatched_call(request))
+            return self._batched_response(key, route, output, start)
+        route, output = await self._acall(
+            request,
+            self.resolve(request),
+            lambda adapter, route: adapter.agenerate(model=route.model, messages=request.messages),
+        )
+        return self._cache_store(key, self._build_response(route, output))
+
+    def stream(self, request: UnifiedGenerateRequest) -> Iterator[GenerateStreamEvent]:
+        key, cached = self._cache_lookup(request)
+        if cached is not None:
+            yield GenerateStreamEvent(event="delta", delta=cached.output_text)
+            yield GenerateStreamEvent(event="done", response=cached)
+            return
+        route = self.resolve(request)
+        if self._batches(request):
+            # A batched call completes all at once, so its output arrives as a single delta.
+            start = time.perf_counter()
+            output = self._timed(request, route, self._batched_call(request))
+            yield GenerateStreamEvent(event="delta", delta=output)
+            yield GenerateStreamEvent(event="done", response=self._batched_response(key, route, output, start))
+            return
+        adapter = self._adapter_for(request, route)
+        start = time.perf_counter()
+        first_token_ms: int | None = None
+        parts: list[str] = []
+        try:
+            for chunk in adapter.stream(model=route.model, messages=request.messages):
+                if first_token_ms is None:
+                    first_token_ms = int((time.perf_counter() - start) * 1000)
+                parts.append(chunk)
+                yield GenerateStreamEvent(event="delta", delta=chunk)
+        except Exception:
+            self._record(request, route, start, ok=False)
+            raise
+        self._record(request, route, start, ok=True, output="".join(parts))
+        response = self._build_response(route, "".join(parts))
+        response.metadata["time_to_first_token_ms"] = first_token_ms
+        yield GenerateStreamEvent(event="done", response=self._cache_store(key, response))
+
+    async def astream(self, request: UnifiedGenerateRequest) -> AsyncIterator[GenerateStreamEvent]:
+        key, cached = self._cache_lookup(request)
+        if cached is not None:
+            yield GenerateStreamEvent(event="delta", delta=cached.output_text)
+            yield GenerateStreamEvent(event="done", response=cached)
+            return
+        route = self.resolve(request)
+        if self._batches(request):
+            start = time.perf_counter()
+            output = await self._atimed(request, route, self._abatched_call(request))
+            yield GenerateStreamEvent(event="delta", delta=output)
+            yield GenerateStreamEvent(event="done", response=self._batched_response(key, route, output, start))
+            return
+        adapter = self._adapter_for(request, route)
+        start = time.perf_counter()
+        first_token_ms: int | None = None
+        parts: list[str] = []
+        try:
+            async for chunk in adapter.astream(model=route.model, messages=request.messages):
+                if first_token_ms is None:
+                    first_token_ms = int((time.perf_counter() - start) * 1000)
+                parts.append(chunk)
+                yield GenerateStreamEvent(event="delta", delta=chunk)
+        except Exception:
+            self._record(request, route, start, ok=False)
+            raise
+        self._record(request, route, start, ok=True, output="".join(parts))
+        response = self._build_response(route, "".join(parts))
+        response.metadata["time_to_first_token_ms"] = first_token_ms
+        yield GenerateStreamEvent(event="done", response=self._cache_store(key, response))
+
+    def _batches(self, request: UnifiedGenerateRequest) -> bool:
+        # The fast tier is latency-sensitive and hedged instead.
+        return self._batcher is not None and request.allow_batching and request.model.latency_tier != "fast"
+
+    def _batched_call(self, request: UnifiedGenerateRequest) -> Callable[[ProviderAdapter, RouteDecision], str]:
+        def call(adapter: ProviderAdapter, route: RouteDecision) -> str:
+            return self._batcher.submit(adapter, route.model, request.messages).result()
+
+        return call
+
+    def _abatched_call(
+        self, request: UnifiedGenerateRequest
+    ) -> Callable[[ProviderAdapter, RouteDecision], Awaitable[str]]:
+        def call(adapter: ProviderAdapter, route: RouteDecision) -> Awaitable[str]:
+            return asyncio.wrap_future(self._batcher.submit(adapter, route.model, request.messages))
+
+        return call
+
+    def _batched_response(
+        self, key: str | None, route: RouteDecision, output: str, start: float
+    ) -> UnifiedGenerateResponse:
+        response = self._build_response(route, output)
+        response.metadata["time_to_first_token_ms"] = int((time.perf_counter() - start) * 1000)
+        response.metadata["batched"] = True
+        return self._cache_store(key, response)
+
+    def _call(
+        self,
+        request: UnifiedGenerateRequest,
+        route: RouteDecision,
+        call: Callable[[ProviderAdapter, RouteDecision], str],
+    ) -> Tuple[RouteDecision, str]:
+        """Run ``call`` on ``route``, hedging it for the ``fast`` latency tier.
+
+        A hedged call gets a second attempt, on the best alternate profile (or the same one),
+        once the first has run longer than its model's p95 or has failed; the first success wins.
+        """
+        if request.model.latency_tier != "fast":
+            return route, self._timed(request, route, call)
+        pool = self._hedge_executor()
+        primary = pool.submit(self._timed, request, route, call)
+        done, _ = wait([primary], timeout=self._engine.hedge_after_ms(route.profile) / 1000)
+        if done and primary.exception() is None:
+            return route, primary.result()
+
+        backup_route = self._backup_route(route)
+        self._record_hedge(backup_route)
+        backup = pool.submit(self._timed, request, backup_route, call, True)
+        attempts: dict[Future, RouteDecision] = {primary: route, backup: backup_route}
+        pending = set(attempts)
+        error: BaseException | None = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return attempts[future], future.result()
+                error = error or future.exception()
+        raise error  # type: ignore[misc]
+
+    async def _acall(
+        self,
+        request: UnifiedGenerateRequest,
+        route: RouteDecision,
+        call: Callable[[ProviderAdapter, RouteDecision], Awaitable[str]],
+    ) -> Tuple[RouteDecision, str]:
+        if request.model.latency_tier != "fast":
+            return route, await self._atimed(request, route, call)
+        primary = asyncio.ensure_future(self._atimed(request, route, call))
+        done, _ = await asyncio.wait({primary}, timeout=self._engine.hedge_after_ms(route.profile) / 1000)
+        if done and primary.exception() is None:
+            return route, primary.result()
+
+        backup_route = self._backup_route(route)
+        self._record_hedge(backup_route)
+        backup = asyncio.ensure_future(self._atimed(request, backup_route, call, True))
+        attempts = {primary: route, backup: backup_route}
+        pending = set(attempts)
+        error: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    return attempts[task], task.result()
+                error = error or task.exception()
+        raise error  # type: ignore[misc]
+
+    def _timed(
+        self,
+        request: UnifiedGenerateRequest,
+        route: RouteDecision,
+        call: Callable[[ProviderAdapter, RouteDecision], str],
+        hedged: bool = False,
+    ) -> str:
+        start = time.perf_counter()
+        try:
+            output = call(self._adapter_for(request, route), route)
+        except Exception:
+            self._record(request, route, start, ok=False)
+            raise
+        self._record(request, route, start, ok=True, output=output, hedged=hedged)
+        return output
+
+    async def _atimed(
+        self,
+        request: UnifiedGenerateRequest,
+        route: RouteDecision,
+        call: Callable[[ProviderAdapter, RouteDecision], Awaitable[str]],
+        hedged: bool = False,
+    ) -> str:
+        start = time.perf_counter()
+        try:
+            output = await call(self._adapter_for(request, route), route)
+        except Exception:
+            self._record(request, route, start, ok=False)
+            raise
+        self._record(request, route, start, ok=True, output=output, hedged=hedged)
+        return output
+
+    def _record(
+        self,
+        request: UnifiedGenerateRequest,
+        route: RouteDecision,
+        start: float,
+        ok: bool,
+        output: str = "",
+        hedged: bool = False,
+    ) -> None:
+        elapsed = time.perf_counter() - start
+        # Callers may name any model; only catalogued ones get routing stats and a metric label
+        # of their own, so arbitrary names cannot grow either without bound.
+        catalogued = self._catalogued(route)
+        if catalogued:
+            tokens = sum(estimate_tokens(m.content) for m in request.messages) + estimate_tokens(output) if ok else 0
+            self._engine.record(route.profile, elapsed * 1000, ok, tokens=tokens, hedged=hedged)
+        telemetry.observe(
+            "agent_model_call_duration_seconds",
+            elapsed,
+            provider=route.provider.value,
+            model=route.model if catalogued else "other",
+            outcome="ok" if ok else "error",
+        )
+
+    def _catalogued(self, route: RouteDecision) -> bool:
+        return self._registry.catalog.get(route.model) is not None
+
+    def _record_hedge(self, route: RouteDecision) -> None:
+        if self._catalogued(route):
+            self._engine.record_hedge(route.profile)
+
+    def _backup_route(self, route: RouteDecision) -> RouteDecision:
+        if not route.alternates:
+            return route
+        profile = route.alternates[0]
+        return RouteDecision(provider=profile.provider, model=profile.model, profile=profile, missing=route.missing)
+
+    def _hedge_executor(self) -> ThreadPoolExecutor:
+        with self._hedge_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=self._hedge_workers, thread_name_prefix="hedge")
+            return self._hedge_pool
+
+    def _adapter_for(self, request: UnifiedGenerateRequest, route: RouteDecision) -> ProviderAdapter:
+        # The request's base_url only applies when routing kept the requested provider.
+        base_url = request.model.base_url if route.provider == request.model.provider else None
+        return self._registry.get_adapter(route.provider, base_url)
+
+    def _build_response(self, route: RouteDecision, output: str) -> UnifiedGenerateResponse:
         return UnifiedGenerateResponse(
             output_text=output,
-            used_provider=selected_provider,
-            used_model=selected_model,
-            downgraded_capabilities=missing,
+            used_provider=route.provider,
+            used_model=route.model,
+            downgraded_capabilities=route.missing,
+            tool_calls=parse_tool_calls(output),
             metadata={
-                "context_length": profile.context_length,
-                "max_output_tokens": profile.max_output_tokens,
-                "capabilities": [c.value for c in profile.capabilities],
+                "context_length": route.profile.context_length,
+                "max_output_tokens": route.profile.max_output_tokens,
+                "capabilities": [c.value for c in route.profile.capabilities],
             },
         )
+
+    def _cache_lookup(self, request: UnifiedGenerateRequest) -> tuple[str | None, UnifiedGenerateResponse | None]:
+        if self._cache is None or not request.use_cache:
+            return None, None
+        key = request_cache_key(request)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._annotate_cache(cached, "hit")
+        return key, cached
+
+    def _cache_store(self, key: str | None, response: UnifiedGenerateResponse) -> UnifiedGenerateResponse:
+        if self._cache is None:
+            return response
+        if key is None:
+            self._annotate_cache(response, "bypass")
+            return response
+        self._cache.put(key, response)
+        self._annotate_cache(response, "miss")
+        return response
+
+    def _annotate_cache(self, response: UnifiedGenerateResponse, status: str) -> None:
+        stats = self._cache.stats() if self._cache is not None else {}
+        response.metadata["cache"] = {"status": status, "hits": stats.get("hits", 0), "misses": stats.get("misses", 0)}
@@ -1,30 +1,98 @@
 from __future__ import annotations
 
+import asyncio
+import itertools
+import json
+import subprocess
+import os
+from dataclasses import asdict
 from pathlib import Path
+from typing import Annotated, AsyncIterator, Iterable, Iterator, List
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 
+from app.admission import BudgetExceededError, QueueFullError
 from app.agent_manager import AgentManager
-from app.interoperability import AdapterRegistry, ModelRouter
+from app.batching import MicroBatcher
+from app.capability_catalog import CapabilityCatalog
+from app.conversation_store import SQLiteConversationStore
+from app.interoperability import AdapterRegistry, ModelRouter, ProviderError
 from app.models import (
+    Capability,
+    ConversationMessage,
     ModelConfig,
     CreateAgentRequest,
     ProviderType,
+    QueueTaskBatchRequest,
     QueueTaskRequest,
+    TaskQueryRequest,
     ToolExecutionRequest,
     UnifiedGenerateRequest,
 )
+from app.response_cache import ResponseCache
+from app.responses import CompressionMiddleware, JSONBytesResponse
 from app.task_queue import BackgroundTaskQueue
-from app.tool_runtime import UnsafeCodeError, execute_tool
+from app.task_store import FINISHED_STATUSES, SQLiteTaskStore, TaskState, TaskStatus
+from app.telemetry import telemetry
+from app.tool_executor import ToolExecutor, ToolJob, ToolJobStatus
+from app.tool_runtime import UnsafeCodeError
+from app.webhooks import CallbackURLError, WebhookDispatcher
 
 BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = Path(os.environ.get("AGENT_DATA_DIR", BASE_DIR.parent / "data"))
 
 app = FastAPI(title="Local Agent Creator")
-registry = AdapterRegistry()
-router = ModelRouter(registry=registry)
-manager = AgentManager()
-queue = BackgroundTaskQueue(agent_manager=manager, router=router)
+# Set AGENT_COMPRESS_MIN_BYTES=0 to turn response compression off.
+COMPRESS_MIN_BYTES = int(os.environ.get("AGENT_COMPRESS_MIN_BYTES", "1024"))
+if COMPRESS_MIN_BYTES > 0:
+    app.add_middleware(CompressionMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+# Comma-separated provider base URLs that requests may route to; others are refused.
+registry = AdapterRegistry(
+    catalog=CapabilityCatalog(path=os.environ.get("AGENT_MODEL_CATALOG") or None),
+    endpoints=os.environ.get("AGENT_PROVIDER_ENDPOINTS", "").split(","),
+)
+# Micro-batching of generate calls is off unless a window is configured.
+BATCH_WINDOW_MS = float(os.environ.get("AGENT_BATCH_WINDOW_MS", "0"))
+router = ModelRouter(
+    registry=registry,
+    cache=ResponseCache(
+        ttl_seconds=float(os.environ.get("AGENT_CACHE_TTL_SECONDS", "300")),
+        disk_dir=os.environ.get("AGENT_CACHE_DIR") or None,
+    ),
+    batcher=(
+        MicroBatcher(window_ms=BATCH_WINDOW_MS, max_batch=int(os.environ.get("AGENT_BATCH_MAX_SIZE", "16")))
+        if BATCH_WINDOW_MS > 0
+        else None
+    ),
+)
+manager = AgentManager(store=SQLiteConversationStore(DATA_DIR / "conversations.db"))
+# Shared by /tools routes and agent tool calls, so both count against one concurrency limit.
+tools = ToolExecutor(
+    workers=int(os.environ.get("AGENT_TOOL_WORKERS", "4")),
+    max_pending=int(os.environ.get("AGENT_TOOL_MAX_PENDING", "64")),
+)
+queue = BackgroundTaskQueue(
+    agent_manager=manager,
+    router=router,
+    workers=int(os.environ.get("AGENT_QUEUE_WORKERS", "4")),
+    store=SQLiteTaskStore(DATA_DIR / "tasks.db"),
+    tools=tools,
+    # Comma-separated callback hosts trusted even on internal addresses; others must resolve to public IPs.
+    webhooks=WebhookDispatcher(
+        secret=os.environ.get("AGENT_WEBHOOK_SECRET") or None,
+        allowed_hosts=os.environ.get("AGENT_WEBHOOK_ALLOWED_HOSTS", "").split(","),
+    ),
+    budget_window=float(os.environ.get("AGENT_BUDGET_WINDOW_SECONDS", "3600")),
+)
+if os.environ.get("AGENT_TRACE_FILE"):
+    telemetry.export_to(os.environ["AGENT_TRACE_FILE"])
+telemetry.gauge("agent_queue_depth", lambda: queue.stats()["queue_depth"])
+telemetry.gauge("agent_tasks_in_flight", lambda: queue.stats()["in_flight"])
+telemetry.gauge("agent_active_agents", lambda: queue.stats()["active_agents"])
+telemetry.gauge("agent_tool_jobs_pending", lambda: tools.stats()["pending"])
+telemetry.gauge("agent_tool_jobs_running", lambda: tools.stats()["running"])
 
 
 @app.get("/")
@@ -37,22 +105,50 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(telemetry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/agents")
 def create_agent(request: CreateAgentRequest):
-    return manager.create_agent(request).model_dump()
+    return JSONBytesResponse(manager.create_agent(request))
 
 
 @app.get("/agents")
 def list_agents():
-    return [agent.model_dump() for agent in manager.list_agents()]
+    return JSONBytesResponse(manager.list_agents())
+
+
+def _ndjson(pages: Iterable[List[ConversationMessage]], offset: int, limit: int | None) -> Iterator[str]:
+    messages = itertools.chain.from_iterable(pages)
+    for message in itertools.islice(messages, offset, None if limit is None else offset + limit):
+        yield message.model_dump_json() + "\n"
 
 
 @app.get("/agents/{agent_id}/history")
-def get_history(agent_id: str):
+def get_history(
+    agent_id: str,
+    offset: int = Query(default=0, ge=0),
+    limit: int | None = Query(default=None, ge=1, le=10_000),
+    cursor: int | None = Query(default=None, ge=0, description="Return messages after this seq"),
+    since: str | None = Query(default=None, description="Return messages after this message id"),
+    format: str = Query(default="json", pattern="^(json|ndjson)$"),
+):
     try:
-        return [m.model_dump() for m in manager.get_history(agent_id)]
+        after_seq = cursor or 0
+        if since is not None:
+            after_seq = max(after_seq, manager.message_seq(agent_id, since))
+        if format == "ndjson":
+            pages = manager.iter_history(agent_id, after_seq=after_seq)
+            return StreamingResponse(_ndjson(pages, offset, limit), media_type="application/x-ndjson")
+        messages = manager.get_history(agent_id, offset=offset, limit=limit, after_seq=after_seq)
     except KeyError as exc:
         raise HTTPException(status_code=404, detail=str(exc)) from exc
+    response = JSONBytesResponse(messages)
+    if limit is not None and len(messages) == limit:
+        response.headers["X-Next-Cursor"] = str(messages[-1].seq)
+    return response
 
 
 @app.delete("/agents/{agent_id}/history")
@@ -64,57 +160,270 @@ def clear_history(agent_id: str):
     return {"status": "cleared", "agent_id": agent_id}
 
 
-@app.post("/tasks")
-def enqueue_task(request: QueueTaskRequest):
+def _enqueue(requests: List[QueueTaskRequest]) -> List[TaskState]:
     try:
-        task = queue.enqueue(agent_id=request.agent_id, prompt=request.prompt)
+        return queue.enqueue_many((r.agent_id, r.prompt, r.priority, r.callback_url) for r in requests)
     except KeyError as exc:
         raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except CallbackURLError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except (QueueFullError, BudgetExceededError) as exc:
+        raise HTTPException(
+            status_code=429, detail=str(exc), headers={"Retry-After": str(exc.retry_after)}
+        ) from exc
+
+
+@app.post("/tasks")
+def enqueue_task(request: QueueTaskRequest):
+    task = _enqueue([request])[0]
     return {"id": task.id, "status": task.status}
 
 
-@app.get("/tasks/{task_id}")
-def get_task(task_id: str):
-    try:
-        task = queue.get_task(task_id)
-    except KeyError as exc:
-        raise HTTPException(status_code=404, detail=str(exc)) from exc
+@app.post("/tasks:batch")
+def enqueue_tasks(request: QueueTaskBatchRequest):
+    return {"tasks": [{"id": task.id, "status": task.status} for task in _enqueue(request.tasks)]}
+
+
+async def _query_tasks(query: TaskQueryRequest) -> dict:
+    timed_out = False
+    if query.wait_for is not None:
+        if not query.ids:
+            raise HTTPException(status_code=400, detail="wait_for requires ids")
+        # Awaited on the event loop: a long poll must not hold a threadpool thread while it waits.
+        timed_out = not await queue.await_for(query.ids, mode=query.wait_for, timeout=query.timeout_seconds)
+    tasks = await asyncio.to_thread(
+        queue.find_tasks,
+        task_ids=query.ids,
+        agent_id=query.agent_id,
+        statuses=[TaskStatus(status) for status in query.status],
+        limit=query.limit,
+    )
+    found = {task.id for task in tasks}
+    return {
+        "tasks": [_task_payload(task) for task in tasks],
+        "missing": [task_id for task_id in query.ids or () if task_id not in found],
+        "timed_out": timed_out,
+    }
+
+
+@app.get("/tasks")
+async def list_tasks(query: Annotated[TaskQueryRequest, Query()]):
+    return JSONBytesResponse(await _query_tasks(query))
+
+
+@app.post("/tasks:query")
+async def query_tasks(query: TaskQueryRequest):
+    return JSONBytesResponse(await _query_tasks(query))
+
+
+@app.get("/queue/stats")
+def queue_stats():
+    return queue.stats()
+
+
+def _task_payload(task: TaskState) -> dict:
     return {
         "id": task.id,
         "status": task.status,
+        "priority": task.priority,
         "result": task.result,
+        "partial_result": task.partial_result,
         "error": task.error,
         "reasoning_steps": task.reasoning_steps,
         "actions": task.actions,
         "tokens_estimate": task.tokens_estimate,
         "latency_ms": task.latency_ms,
+        "first_token_ms": task.first_token_ms,
+        "stage_ms": task.stage_ms,
     }
 
 
-@app.post("/tools/execute")
-def execute_tool_endpoint(request: ToolExecutionRequest):
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+@app.get("/tasks/{task_id}")
+def get_task(task_id: str):
+    try:
+        task = queue.get_task(task_id)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    return JSONBytesResponse(_task_payload(task))
+
+
+# Event streams are async generators waiting on the queue's per-task and per-agent signals, so
+# idle subscribers hold no threadpool thread.
+async def _task_events(task_id: str) -> AsyncIterator[str]:
+    sent = 0
+    status = None
+    while True:
+        task = await queue.awatch(task_id, seen_chars=sent, seen_status=status, timeout=15.0)
+        idle = True
+        if task.status != status:
+            status, idle = task.status, False
+            yield _sse("status", json.dumps({"status": status.value, "first_token_ms": task.first_token_ms}))
+        if len(task.partial_result) > sent:
+            yield _sse("delta", json.dumps({"delta": task.partial_result[sent:]}))
+            sent, idle = len(task.partial_result), False
+        if task.status in FINISHED_STATUSES:
+            yield _sse("done", json.dumps(jsonable_encoder(_task_payload(task))))
+            return
+        if idle:
+            yield ": keep-alive\n\n"
+
+
+async def _agent_events(agent_id: str, after: int, long_poll: bool) -> AsyncIterator[str]:
+    while True:
+        events = await queue.aevents(after=after, agent_id=agent_id, timeout=15.0)
+        if not events:
+            yield ": keep-alive\n\n"
+        for event in events:
+            after = event.seq
+            data = {"task_id": event.task_id, "status": event.status.value, "at": event.at}
+            yield f"id: {event.seq}\n" + _sse("status", json.dumps(data))
+        if long_poll:
+            return
+
+
+# Status transitions of the agent's tasks; reconnecting clients resume via Last-Event-ID. With
+# long_poll the response closes after the first batch, for clients that cannot hold a stream.
+@app.get("/agents/{agent_id}/events")
+def stream_agent_events(
+    agent_id: str, after: int = 0, long_poll: bool = False, last_event_id: Annotated[int | None, Header()] = None
+):
+    try:
+        manager.get_agent(agent_id)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    cursor = last_event_id if last_event_id is not None else after
+    return StreamingResponse(_agent_events(agent_id, cursor, long_poll), media_type="text/event-stream")
+
+
+@app.get("/tasks/{task_id}/stream")
+def stream_task(task_id: str):
     try:
-        result = execute_tool(request.language, request.code, request.timeout_seconds)
-    except UnsafeCodeError as exc:
+        queue.get_task(task_id)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    return StreamingResponse(_task_events(task_id), media_type="text/event-stream")
+
+
+def _submit_tool(request: ToolExecutionRequest) -> ToolJob:
+    try:
+        return tools.submit(request.language, request.code, request.timeout_seconds)
+    except (UnsafeCodeError, SyntaxError, ValueError) as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except QueueFullError as exc:
+        raise HTTPException(
+            status_code=429, detail=str(exc), headers={"Retry-After": str(exc.retry_after)}
+        ) from exc
+
+
+@app.post("/tools/execute")
+async def execute_tool_endpoint(request: ToolExecutionRequest):
+    # Validation parses the snippet, so keep it off the event loop too.
+    job = await asyncio.to_thread(_submit_tool, request)
+    try:
+        result = await asyncio.wrap_future(job.done)
     except FileNotFoundError as exc:
         raise HTTPException(status_code=503, detail=f"Runtime not installed: {exc}") from exc
-    return {"stdout": result.stdout, "stderr": result.stderr, "exit_code": result.exit_code}
+    except subprocess.TimeoutExpired as exc:
+        raise HTTPException(status_code=504, detail=job.error) from exc
+    return asdict(result)
+
+
+@app.post("/tools/jobs", status_code=202)
+def submit_tool_job(request: ToolExecutionRequest):
+    job = _submit_tool(request)
+    return {"id": job.id, "status": job.status}
+
+
+@app.get("/tools/stats")
+def tool_stats():
+    return tools.stats()
+
+
+@app.get("/tools/jobs/{job_id}")
+def get_tool_job(job_id: str):
+    try:
+        return tools.get(job_id).payload()
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+async def _tool_job_events(job: ToolJob) -> AsyncIterator[str]:
+    status = None
+    for stage in (job.started, job.done):
+        if job.status in (ToolJobStatus.queued, ToolJobStatus.running) and job.status != status:
+            status = job.status
+            yield _sse("status", json.dumps({"status": status.value}))
+        waiter = asyncio.wrap_future(stage)
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), timeout=15.0)
+                break
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+            except Exception:
+                break  # a failed run is reported in the job payload below
+    yield _sse("done", json.dumps(jsonable_encoder(job.payload())))
+
+
+@app.get("/tools/jobs/{job_id}/stream")
+def stream_tool_job(job_id: str):
+    try:
+        job = tools.get(job_id)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    return StreamingResponse(_tool_job_events(job), media_type="text/event-stream")
+
+
+@app.get("/models/routing")
+def routing_stats():
+    batcher = router.batcher
+    return {"models": router.engine.snapshot(), "batching": batcher.stats() if batcher is not None else None}
 
 
 @app.get("/models/capabilities")
 def get_capabilities(provider: str, model: str):
     profile = registry.discover_capabilities(ModelConfig(provider=ProviderType(provider), model=model))
-    return profile.model_dump()
+    return JSONBytesResponse(profile)
+
+
+@app.get("/models/search")
+def search_models(
+    capability: List[Capability] = Query(default=[]),
+    min_context: int = Query(default=0, ge=0),
+):
+    profiles = registry.catalog.find(capability, min_context=min_context)
+    return JSONBytesResponse({"catalog": registry.catalog.info(), "models": profiles})
+
+
+async def _generate_events(request: UnifiedGenerateRequest) -> AsyncIterator[str]:
+    try:
+        async for event in router.astream(request):
+            yield _sse(event.event, event.model_dump_json(exclude_none=True))
+    except ProviderError as exc:
+        yield _sse("error", json.dumps({"detail": str(exc)}))
 
 
 @app.post("/models/generate")
-def generate(request: UnifiedGenerateRequest):
+async def generate(request: UnifiedGenerateRequest, stream: bool = False):
+    if stream:
+        try:
+            router.resolve(request)  # reject strict capability mismatches before the stream starts
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        return StreamingResponse(_generate_events(request), media_type="text/event-stream")
     try:
-        response = router.generate(request)
+        response = await router.agenerate(request)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
-    return response.model_dump()
+    except ProviderError as exc:
+        raise HTTPException(status_code=502, detail=str(exc)) from exc
+    return JSONBytesResponse(response)
 
 
 @app.get("/providers")
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from enum import Enum
-from typing import Any
+from typing import Any, Literal
 
 from pydantic import BaseModel, Field
 
@@ -23,6 +23,12 @@ class Capability(str, Enum):
     parallel_tool_calls = "parallel_tool_calls"
 
 
+class TaskPriority(str, Enum):
+    high = "high"
+    normal = "normal"
+    low = "low"
+
+
 class ProviderType(str, Enum):
     openai = "openai"
     anthropic = "anthropic"
@@ -36,6 +42,11 @@ class ProviderType(str, Enum):
 class ConversationMessage(BaseModel):
     role: str
     content: str
+    # Assigned when the message is stored: ``id`` is stable, ``seq`` increases per agent and is never reused.
+    id: str | None = None
+    seq: int | None = None
+    # Token count cached at append time so context assembly never re-tokenises history.
+    tokens: int | None = Field(default=None, exclude=True)
 
 
 class AgentDefinition(BaseModel):
@@ -49,6 +60,7 @@ class AgentDefinition(BaseModel):
     provider: ProviderType = ProviderType.openai_compatible
     allowed_tools: list[str] = Field(default_factory=list)
     network_allowlist: list[str] = Field(default_factory=list)
+    # Per-agent quotas over the task queue's rolling budget window (AGENT_BUDGET_WINDOW_SECONDS).
     budget_tokens: int = 20_000
     budget_seconds: int = 120
 
@@ -76,6 +88,24 @@ class ToolExecutionRequest(BaseModel):
 class QueueTaskRequest(BaseModel):
     agent_id: str
     prompt: str = Field(min_length=1)
+    priority: TaskPriority = TaskPriority.normal
+    # POSTed a JSON event when the task completes or fails.
+    callback_url: str | None = None
+
+
+class QueueTaskBatchRequest(BaseModel):
+    tasks: list[QueueTaskRequest] = Field(min_length=1, max_length=1000)
+
+
+class TaskQueryRequest(BaseModel):
+    # With ids, the other filters are ignored.
+    ids: list[str] | None = Field(default=None, max_length=10000)
+    agent_id: str | None = None
+    status: list[Literal["queued", "running", "completed", "failed"]] = Field(default_factory=list)
+    limit: int = Field(default=100, ge=1, le=1000)
+    # Long-poll: hold the response until all (or any) of ``ids`` finished or the timeout passes.
+    wait_for: Literal["all", "any"] | None = None
+    timeout_seconds: float = Field(default=30.0, ge=0, le=60)
 
 
 class ModelConfig(BaseModel):
@@ -93,6 +123,10 @@ class CapabilityProfile(BaseModel):
     context_length: int = 8192
     max_output_tokens: int = 2048
     capabilities: list[Capability] = Field(default_factory=list)
+    cost_per_1k_tokens: float = 0.0
+    cost_tier: str = "standard"
+    latency_tier: str = "balanced"
+    region: str | None = None
 
 
 class UnifiedGenerateRequest(BaseModel):
@@ -101,6 +135,15 @@ class UnifiedGenerateRequest(BaseModel):
     require_capabilities: list[Capability] = Field(default_factory=list)
     allow_auto_downgrade: bool = True
     output_schema: dict[str, Any] | None = None
+    use_cache: bool = True
+    # Set False to skip the router's micro-batching window (latency-sensitive callers).
+    allow_batching: bool = True
+
+
+class ToolCall(BaseModel):
+    id: str
+    name: str
+    arguments: dict[str, Any] = Field(default_factory=dict)
 
 
 class UnifiedGenerateResponse(BaseModel):
@@ -108,4 +151,11 @@ class UnifiedGenerateResponse(BaseModel):
     used_provider: ProviderType
     used_model: str
     downgraded_capabilities: list[Capability] = Field(default_factory=list)
+    tool_calls: list[ToolCall] = Field(default_factory=list)
     metadata: dict[str, Any] = Field(default_factory=dict)
+
+
+class GenerateStreamEvent(BaseModel):
+    event: str = Field(pattern="^(delta|done)$")
+    delta: str = ""
+    response: UnifiedGenerateResponse | None = None
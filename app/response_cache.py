@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from app.models import UnifiedGenerateRequest, UnifiedGenerateResponse
+
+
+def request_cache_key(request: UnifiedGenerateRequest) -> str:
+    # Only the fields that influence the output; message ids/seqs are bookkeeping.
+    canonical = {
+        "model": request.model.model_dump(mode="json"),
+        "messages": [[m.role, m.content] for m in request.messages],
+        "require_capabilities": sorted(c.value for c in request.require_capabilities),
+        "allow_auto_downgrade": request.allow_auto_downgrade,
+        "output_schema": request.output_schema,
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of generate responses, bounded by entry count and payload bytes.
+
+    Entries are kept as serialized JSON so their size is exact and every hit returns a fresh
+    response object. With ``disk_dir`` set, entries are also written there and memory misses
+    fall back to disk.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 300.0,
+        disk_dir: str | Path | None = None,
+    ) -> None:
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl_seconds
+        self._disk_dir = Path(disk_dir) if disk_dir else None
+        if self._disk_dir is not None:
+            self._disk_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._stats: Dict[str, int] = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0}
+
+    def get(self, key: str) -> UnifiedGenerateResponse | None:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return UnifiedGenerateResponse.model_validate_json(entry[1])
+
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["disk_hits"] += 1
+            self._insert(key, entry)
+        return UnifiedGenerateResponse.model_validate_json(entry[1])
+
+    def put(self, key: str, response: UnifiedGenerateResponse) -> None:
+        entry = (time.time() + self._ttl, response.model_dump_json().encode("utf-8"))
+        with self._lock:
+            self._insert(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "bytes": self._bytes}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _insert(self, key: str, entry: Tuple[float, bytes]) -> None:
+        if len(entry[1]) > self._max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self._bytes += len(entry[1])
+        while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        _, payload = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def _read_disk(self, key: str, now: float) -> Tuple[float, bytes] | None:
+        if self._disk_dir is None:
+            return None
+        path = self._disk_dir / f"{key}.json"
+        try:
+            raw = json.loads(path.read_bytes())
+        except (OSError, ValueError):
+            return None
+        if raw["expires_at"] < now:
+            path.unlink(missing_ok=True)
+            return None
+        return raw["expires_at"], raw["response"].encode("utf-8")
+
+    def _write_disk(self, key: str, entry: Tuple[float, bytes]) -> None:
+        if self._disk_dir is None:
+            return
+        path = self._disk_dir / f"{key}.json"
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps({"expires_at": entry[0], "response": entry[1].decode("utf-8")}), encoding="utf-8")
+        os.replace(tmp, path)
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+from enum import Enum
+from typing import Any, Dict, List
+
+from pydantic import BaseModel, TypeAdapter
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+_ADAPTERS: Dict[Any, TypeAdapter] = {}
+_COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/plain", "text/html", "text/css", "text/javascript")
+# Compressing bodies above this size happens in a worker thread, off the event loop.
+_OFFLOAD_BYTES = 256 * 1024
+
+
+def _adapter(key: Any) -> TypeAdapter:
+    adapter = _ADAPTERS.get(key)
+    if adapter is None:
+        adapter = _ADAPTERS[key] = TypeAdapter(key)
+    return adapter
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+def dump_json(value: Any) -> bytes:
+    """Serialize a response body straight to JSON bytes.
+
+    Models and lists of one model type go through pydantic-core's serializer, skipping the
+    intermediate dicts of ``model_dump`` and FastAPI's ``jsonable_encoder`` pass; anything
+    else uses orjson when installed, else the standard library.
+    """
+    if isinstance(value, BaseModel):
+        return _adapter(type(value)).dump_json(value)
+    if isinstance(value, list) and value and isinstance(value[0], BaseModel):
+        return _adapter(List[type(value[0])]).dump_json(value)
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class JSONBytesResponse(Response):
+    """A JSON response whose body is encoded once, by :func:`dump_json`."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return content if isinstance(content, bytes) else dump_json(content)
+
+
+def _accepted(header: str) -> set[str]:
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        name, _, q = params.strip().partition("=")
+        try:
+            if name.strip() == "q" and float(q) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware:
+    """Compresses complete responses of at least ``minimum_size`` bytes.
+
+    zstd is preferred when the client accepts it and ``zstandard`` is installed, then gzip.
+    Streamed responses (SSE, NDJSON pages) pass through untouched so that events are not held
+    back waiting for a compressible amount of output.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, zstd_level: int = 3) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    def negotiate(self, accept_encoding: str) -> str | None:
+        accepted = _accepted(accept_encoding)
+        if zstandard is not None and "zstd" in accepted:
+            return "zstd"
+        if "gzip" in accepted or "*" in accepted:
+            return "gzip"
+        return None
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.zstd_level).compress(body)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            held, start = start, None
+            headers = MutableHeaders(raw=held["headers"])
+            body = message.get("body", b"")
+            content_type = headers.get("content-type", "").split(";")[0].strip()
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or content_type not in _COMPRESSIBLE
+            ):
+                await send(held)
+                await send(message)
+                return
+            if len(body) >= _OFFLOAD_BYTES:
+                body = await asyncio.to_thread(self.compress, body, encoding)
+            else:
+                body = self.compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(held)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Tuple
+
+from app.models import Capability, CapabilityProfile, ModelConfig, ProviderType
+
+COST_TIERS = ("low", "standard", "premium")
+LATENCY_TIERS = ("fast", "balanced", "slow")
+# Assumed latency for a model with too few samples of its own.
+_PRIOR_LATENCY_MS: Dict[str, float] = {"fast": 400.0, "balanced": 1500.0, "slow": 5000.0}
+_LATENCY_WEIGHT: Dict[str, float] = {"fast": 3.0, "balanced": 1.0, "slow": 0.3}
+_COST_WEIGHT: Dict[str, float] = {"low": 3.0, "standard": 1.0, "premium": 0.3}
+_MIN_SAMPLES = 5
+# Added to the score of a model that should only be used when nothing else fits.
+EXCLUDED_SCORE = 1000.0
+
+
+def _cost_rank(tier: str) -> int:
+    return COST_TIERS.index(tier if tier in COST_TIERS else "standard")
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+@dataclass
+class _ModelStats:
+    # (latency_ms, ok) of the most recent calls
+    window: Deque[Tuple[float, bool]]
+    calls: int = 0
+    errors: int = 0
+    cost: float = 0.0
+    hedges: int = 0
+    hedge_wins: int = 0
+
+    def latencies(self) -> List[float]:
+        return sorted(latency for latency, ok in self.window if ok)
+
+    def error_rate(self) -> float:
+        if not self.window:
+            return 0.0
+        return sum(1 for _, ok in self.window if not ok) / len(self.window)
+
+
+@dataclass
+class RankedProfile:
+    profile: CapabilityProfile
+    missing: List[Capability] = field(default_factory=list)
+    score: float = 0.0
+
+
+class RoutingEngine:
+    """Ranks capability profiles by observed latency, error rate and cost.
+
+    Latency and errors are tracked over the last ``window`` calls per (provider, model). A model
+    with fewer than a handful of successful samples is assumed to perform as its declared
+    latency tier. The request's ``latency_tier`` and ``cost_tier`` set how much each term
+    weighs; models in a dearer cost tier than requested, or failing more than half their recent
+    calls, only rank after every other candidate.
+    """
+
+    def __init__(self, window: int = 256, hedge_after_ms: float = 300.0) -> None:
+        self._window = window
+        self._hedge_after_ms = hedge_after_ms
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[ProviderType, str], _ModelStats] = {}
+
+    def record(
+        self, profile: CapabilityProfile, latency_ms: float, ok: bool, tokens: int = 0, hedged: bool = False
+    ) -> None:
+        with self._lock:
+            stats = self._stats_for(profile.provider, profile.model)
+            stats.window.append((latency_ms, ok))
+            stats.calls += 1
+            if not ok:
+                stats.errors += 1
+            stats.cost += tokens / 1000 * profile.cost_per_1k_tokens
+            if hedged:
+                stats.hedge_wins += 1
+
+    def record_hedge(self, profile: CapabilityProfile) -> None:
+        with self._lock:
+            self._stats_for(profile.provider, profile.model).hedges += 1
+
+    def rank(
+        self, config: ModelConfig, required: List[Capability], profiles: List[CapabilityProfile]
+    ) -> List[RankedProfile]:
+        """Profiles in the requested region, best first: full capability matches before partial ones."""
+        latency_tier = config.latency_tier if config.latency_tier in LATENCY_TIERS else "balanced"
+        cost_tier = config.cost_tier if config.cost_tier in COST_TIERS else "standard"
+        ranked = []
+        for profile in profiles:
+            if config.region and profile.region and profile.region != config.region:
+                continue
+            missing = [cap for cap in required if cap not in profile.capabilities]
+            ranked.append(RankedProfile(profile, missing, self._score(profile, latency_tier, cost_tier)))
+        ranked.sort(key=lambda item: (len(item.missing), item.score))
+        return ranked
+
+    def hedge_after_ms(self, profile: CapabilityProfile) -> float:
+        """How long to wait on a call before hedging it: the model's p95 once known."""
+        with self._lock:
+            stats = self._stats.get((profile.provider, profile.model))
+            latencies = stats.latencies() if stats is not None else []
+        if len(latencies) < _MIN_SAMPLES:
+            return self._hedge_after_ms
+        return _percentile(latencies, 95)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self._stats.items())
+            rows = []
+            for (provider, model), stats in items:
+                latencies = stats.latencies()
+                rows.append(
+                    {
+                        "provider": provider.value,
+                        "model": model,
+                        "calls": stats.calls,
+                        "errors": stats.errors,
+                        "error_rate": round(stats.error_rate(), 4),
+                        "p50_ms": round(_percentile(latencies, 50), 2) if latencies else None,
+                        "p95_ms": round(_percentile(latencies, 95), 2) if latencies else None,
+                        "p99_ms": round(_percentile(latencies, 99), 2) if latencies else None,
+                        "cost": round(stats.cost, 6),
+                        "hedges": stats.hedges,
+                        "hedge_wins": stats.hedge_wins,
+                    }
+                )
+        return rows
+
+    def _score(self, profile: CapabilityProfile, latency_tier: str, cost_tier: str) -> float:
+        with self._lock:
+            stats = self._stats.get((profile.provider, profile.model))
+            latencies = stats.latencies() if stats is not None else []
+            error_rate = stats.error_rate() if stats is not None else 0.0
+        if len(latencies) >= _MIN_SAMPLES:
+            expected_ms = _percentile(latencies, 95 if latency_tier == "fast" else 50)
+        else:
+            expected_ms = _PRIOR_LATENCY_MS.get(profile.latency_tier, _PRIOR_LATENCY_MS["balanced"])
+        score = (
+            _LATENCY_WEIGHT[latency_tier] * expected_ms / 1000
+            + _COST_WEIGHT[cost_tier] * profile.cost_per_1k_tokens * 100
+            + 10 * error_rate
+        )
+        # Soft exclusions: still eligible when nothing else fits.
+        if _cost_rank(profile.cost_tier) > _cost_rank(cost_tier):
+            score += EXCLUDED_SCORE
+        if error_rate > 0.5:
+            score += EXCLUDED_SCORE
+        return score
+
+    def _stats_for(self, provider: ProviderType, model: str) -> _ModelStats:
+        stats = self._stats.get((provider, model))
+        if stats is None:
+            stats = self._stats[(provider, model)] = _ModelStats(window=deque(maxlen=self._window))
+        return stats
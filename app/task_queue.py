@@ -1,115 +1,761 @@
 from __future__ import annotations
 
-import queue
+import asyncio
+import heapq
+import itertools
+import logging
+import math
 import threading
 import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from enum import Enum
-from typing import Dict, List
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Set, Tuple
 from uuid import uuid4
 
+from app.admission import BudgetExceededError, QueueFullError, retry_after
 from app.agent_manager import AgentManager
+from app.context import ContextWindowBuilder, estimate_tokens
 from app.interoperability import ModelRouter
-from app.models import Capability, ConversationMessage, ModelConfig, UnifiedGenerateRequest
+from app.models import (
+    AgentDefinition,
+    Capability,
+    ConversationMessage,
+    ModelConfig,
+    TaskPriority,
+    UnifiedGenerateRequest,
+    UnifiedGenerateResponse,
+)
+from app.task_store import InMemoryTaskStore, TaskState, TaskStatus, TaskStore
+from app.telemetry import Span, telemetry
+from app.tool_calls import RUNNABLE_TOOLS, run_tool_calls, tool_instructions, tool_results_message
+from app.tool_executor import ToolExecutor
+from app.webhooks import WebhookDispatcher, validate_callback_url
 
-
-class TaskStatus(str, Enum):
-    queued = "queued"
-    running = "running"
-    completed = "completed"
-    failed = "failed"
+PRIORITY_WEIGHTS: Dict[TaskPriority, int] = {
+    TaskPriority.high: 4,
+    TaskPriority.normal: 2,
+    TaskPriority.low: 1,
+}
+_PRIORITY_RANK: Dict[TaskPriority, int] = {TaskPriority.high: 0, TaskPriority.normal: 1, TaskPriority.low: 2}
+# Model calls per task, including the final answer; bounds runaway tool loops.
+MAX_AGENT_STEPS = 8
 
 
 @dataclass
-class TaskState:
-    id: str
+class AgentUsage:
+    """An agent's usage inside the current budget window, plus what queued tasks have reserved."""
+
+    tokens: int = 0
+    seconds: float = 0.0
+    reserved_tokens: int = 0
+    reserved_seconds: float = 0.0
+    # (monotonic time, tokens, seconds) per finished task still inside the window, oldest first
+    charges: Deque[Tuple[float, int, float]] = field(default_factory=deque, repr=False)
+
+    def expire(self, cutoff: float) -> None:
+        while self.charges and self.charges[0][0] <= cutoff:
+            _, tokens, seconds = self.charges.popleft()
+            self.tokens -= tokens
+            self.seconds -= seconds
+
+    def frees_at(self, tokens: int, seconds: float) -> float | None:
+        """When enough charges will have aged out to free ``tokens`` and ``seconds``, as the
+        monotonic time their window opened; None if finished work alone cannot free that much."""
+        freed_tokens, freed_seconds = 0, 0.0
+        for at, charged_tokens, charged_seconds in self.charges:
+            freed_tokens += charged_tokens
+            freed_seconds += charged_seconds
+            if freed_tokens >= tokens and freed_seconds >= seconds:
+                return at
+        return None
+
+
+@dataclass(slots=True)
+class TaskEvent:
+    seq: int
+    task_id: str
     agent_id: str
-    prompt: str
-    status: TaskStatus = TaskStatus.queued
-    result: str | None = None
-    error: str | None = None
-    reasoning_steps: List[str] = field(default_factory=list)
-    actions: List[str] = field(default_factory=list)
-    tokens_estimate: int = 0
-    latency_ms: int = 0
+    status: TaskStatus
+    at: float = field(default_factory=time.time)
+
+
+class _Signal:
+    """Wakes one waiter from any thread: a threading.Event for blocking callers, or an
+    asyncio.Event set on the waiter's own loop, so async waiters hold no thread."""
+
+    __slots__ = ("_loop", "_event")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        self._loop = loop
+        self._event: asyncio.Event | threading.Event = asyncio.Event() if loop is not None else threading.Event()
+
+    def set(self) -> None:
+        if self._loop is None:
+            self._event.set()
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            pass  # the waiter's loop has closed
+
+    def clear(self) -> None:
+        self._event.clear()
+
+    def wait(self, timeout: float) -> None:
+        self._event.wait(timeout)
+
+    async def wait_async(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+@dataclass
+class _Lane:
+    # heap of (priority rank, submission seq, task id): FIFO within a priority class
+    pending: List[Tuple[int, int, str]] = field(default_factory=list)
+    # stride-scheduling pass value; lower runs sooner
+    pass_value: float = 0.0
+
+
+@dataclass
+class WorkerStats:
+    name: str
+    started_at: float = field(default_factory=time.monotonic)
+    busy_seconds: float = 0.0
+    busy_since: float | None = None
+    tasks_processed: int = 0
+    current_task: str | None = None
+
+    def utilization(self, now: float) -> float:
+        busy = self.busy_seconds
+        if self.busy_since is not None:
+            busy += now - self.busy_since
+        elapsed = now - self.started_at
+        return busy / elapsed if elapsed > 0 else 0.0
+
+
+logger = logging.getLogger(__name__)
+
+
+def _events_key(agent_id: str | None) -> str:
+    return "*" if agent_id is None else f"agent:{agent_id}"
 
 
 class BackgroundTaskQueue:
-    def __init__(self, agent_manager: AgentManager, router: ModelRouter) -> None:
+    def __init__(
+        self,
+        agent_manager: AgentManager,
+        router: ModelRouter,
+        workers: int = 4,
+        max_pending: int = 10_000,
+        max_pending_per_agent: int = 1_000,
+        store: TaskStore | None = None,
+        tools: ToolExecutor | None = None,
+        webhooks: WebhookDispatcher | None = None,
+        max_events: int = 10_000,
+        budget_window: float = 3600.0,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self._owns_tools = tools is None
+        if tools is None:
+            tools = ToolExecutor(workers=workers)
+        self._tools = tools
+        self._webhooks = webhooks
+        self._max_pending = max_pending
+        self._max_pending_per_agent = max_pending_per_agent
         self._agent_manager = agent_manager
         self._router = router
-        self._q: queue.Queue[str] = queue.Queue()
+        self._context = ContextWindowBuilder(agent_manager)
+        self._store = store or InMemoryTaskStore()
+        # Queued and running tasks only; finished ones are served from the store.
         self._tasks: Dict[str, TaskState] = {}
         self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        # Waiters by key: a task id (its output and status), "agent:<id>" or "*" (status events).
+        self._subscribers: Dict[str, Set[_Signal]] = {}
         self._stop = threading.Event()
-        self._worker = threading.Thread(target=self._run, daemon=True)
-        self._worker.start()
+        # Recent status transitions, oldest first, for event streams; see ``events``.
+        self._events: Deque[TaskEvent] = deque(maxlen=max_events)
+        self._event_seq = itertools.count(1)
+        self._waiters: Dict[str, List[Future]] = {}
+        # One lane per agent. A lane exists while the agent has pending or running work; only
+        # lanes with nothing running sit in ``_ready``, which keeps each agent's tasks serial.
+        # ``_ready`` is ordered by stride-scheduling pass so agents share workers by weight.
+        self._lanes: Dict[str, _Lane] = {}
+        self._ready: List[Tuple[float, int, str]] = []
+        self._vtime = 0.0
+        self._seq = itertools.count()
+        self._pending = 0
+        # Agent budgets are quotas over a rolling window of this many seconds.
+        self._budget_window = budget_window
+        self._usage: Dict[str, AgentUsage] = {}
+        self._reservations: Dict[str, Tuple[int, float]] = {}
+        self._avg_task_seconds = 0.0
+        self._worker_stats = [WorkerStats(name=f"worker-{i}") for i in range(workers)]
+        self._recover()
+        self._workers = [
+            threading.Thread(target=self._run, args=(stats,), name=f"task-{stats.name}", daemon=True)
+            for stats in self._worker_stats
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def enqueue(
+        self,
+        agent_id: str,
+        prompt: str,
+        priority: TaskPriority = TaskPriority.normal,
+        callback_url: str | None = None,
+    ) -> TaskState:
+        return self.enqueue_many([(agent_id, prompt, priority, callback_url)])[0]
+
+    def enqueue_many(self, items: Iterable[Tuple[str, str, TaskPriority, str | None]]) -> List[TaskState]:
+        """Enqueue ``(agent_id, prompt, priority, callback_url)`` items all-or-nothing, under one
+        lock acquisition.
+
+        Each agent is looked up once however many items name it. If any item would be refused
+        (unknown agent, bad callback URL, full queue or lane, exhausted budget) nothing is enqueued.
+
+        ``budget_tokens`` and ``budget_seconds`` are per-agent quotas over the rolling budget
+        window. A prompt that alone exceeds ``budget_tokens`` can never run and is a ValueError;
+        one that only fails to fit what is left of the window raises BudgetExceededError with a
+        ``retry_after`` of when enough earlier usage ages out.
+        """
+        agents: Dict[str, AgentDefinition] = {}
+        batch: List[Tuple[TaskState, int]] = []
+        for agent_id, prompt, priority, callback_url in items:
+            agent = agents.get(agent_id)
+            if agent is None:
+                agent = agents[agent_id] = self._agent_manager.get_agent(agent_id)
+            if callback_url is not None:
+                if self._webhooks is not None:
+                    self._webhooks.check_url(callback_url)
+                else:
+                    validate_callback_url(callback_url)
+            est_tokens = estimate_tokens(agent.system_prompt) + estimate_tokens(prompt)
+            if est_tokens > agent.budget_tokens:
+                raise ValueError(f"Prompt needs ~{est_tokens} tokens, more than budget_tokens={agent.budget_tokens}")
+            task = TaskState(
+                id=str(uuid4()), agent_id=agent_id, prompt=prompt, priority=priority, callback_url=callback_url
+            )
+            batch.append((task, est_tokens))
+        per_agent: Dict[str, List[Tuple[TaskState, int]]] = {}
+        for task, est_tokens in batch:
+            per_agent.setdefault(task.agent_id, []).append((task, est_tokens))
 
-    def enqueue(self, agent_id: str, prompt: str) -> TaskState:
-        self._agent_manager.get_agent(agent_id)
-        task = TaskState(id=str(uuid4()), agent_id=agent_id, prompt=prompt)
+        with self._cond:
+            if self._pending + len(batch) > self._max_pending:
+                raise QueueFullError("Task queue is full", retry_after=self._retry_after())
+            est_seconds = self._avg_task_seconds
+            for agent_id, entries in per_agent.items():
+                agent = agents[agent_id]
+                lane = self._lanes.get(agent_id)
+                if (len(lane.pending) if lane is not None else 0) + len(entries) > self._max_pending_per_agent:
+                    raise QueueFullError(
+                        f"Too many pending tasks for agent {agent_id}", retry_after=self._retry_after()
+                    )
+                usage = self._window_usage(agent_id)
+                over_tokens = usage.tokens + usage.reserved_tokens + sum(t for _, t in entries) - agent.budget_tokens
+                over_seconds = (
+                    usage.seconds + usage.reserved_seconds + est_seconds * len(entries) - agent.budget_seconds
+                )
+                if over_tokens > 0 or over_seconds > 0:
+                    if over_tokens > 0:
+                        limit = f"budget_tokens={agent.budget_tokens}"
+                    else:
+                        limit = f"budget_seconds={agent.budget_seconds}"
+                    raise BudgetExceededError(
+                        f"Agent {agent_id} would exceed {limit} per {self._budget_window:g}s window",
+                        retry_after=self._budget_retry_after(usage, max(over_tokens, 0), max(over_seconds, 0.0)),
+                    )
+
+            for task, est_tokens in batch:
+                usage = self._usage.setdefault(task.agent_id, AgentUsage())
+                usage.reserved_tokens += est_tokens
+                usage.reserved_seconds += est_seconds
+                self._reservations[task.id] = (est_tokens, est_seconds)
+                self._store.save(task)
+                self._admit(task)
+        return [task for task, _ in batch]
+
+    def watch(
+        self, task_id: str, seen_chars: int, seen_status: TaskStatus | None, timeout: float
+    ) -> TaskState:
+        """Block until the task has more than ``seen_chars`` of output, leaves ``seen_status``,
+        or ``timeout`` passes."""
+        _, task = self._wait((task_id,), self._watch_check(task_id, seen_chars, seen_status), timeout)
+        return task if task is not None else self.get_task(task_id)
+
+    async def awatch(
+        self, task_id: str, seen_chars: int, seen_status: TaskStatus | None, timeout: float
+    ) -> TaskState:
+        _, task = await self._await((task_id,), self._watch_check(task_id, seen_chars, seen_status), timeout)
+        return task if task is not None else await asyncio.to_thread(self.get_task, task_id)
+
+    def get_usage(self, agent_id: str) -> AgentUsage:
         with self._lock:
-            self._tasks[task.id] = task
-        self._q.put(task.id)
-        return task
+            usage = self._window_usage(agent_id)
+            return AgentUsage(usage.tokens, usage.seconds, usage.reserved_tokens, usage.reserved_seconds)
 
     def get_task(self, task_id: str) -> TaskState:
+        # A single dict lookup is atomic, so status polls do not contend for the queue lock.
+        task = self._tasks.get(task_id)
+        if task is None:
+            task = self._store.get(task_id)
+        if task is None:
+            raise KeyError(f"Task {task_id} not found")
+        return task
+
+    def find_tasks(
+        self,
+        task_ids: Iterable[str] | None = None,
+        agent_id: str | None = None,
+        statuses: Iterable[TaskStatus] | None = None,
+        limit: int = 100,
+    ) -> List[TaskState]:
+        """Tasks by id, in the order given with unknown ids skipped; without ids, the most
+        recent ``limit`` tasks matching ``agent_id`` and ``statuses``."""
+        if task_ids is not None:
+            ids = list(dict.fromkeys(task_ids))
+            with self._lock:
+                found = {task_id: self._tasks[task_id] for task_id in ids if task_id in self._tasks}
+            found.update(self._store.get_many([task_id for task_id in ids if task_id not in found]))
+            return [found[task_id] for task_id in ids if task_id in found]
+
+        wanted = set(statuses) if statuses else None
+
+        with self._lock:
+            live = {
+                t.id: t
+                for t in self._tasks.values()
+                if (agent_id is None or t.agent_id == agent_id) and (wanted is None or t.status in wanted)
+            }
+        # Stored copies of live tasks may lag behind, so the in-memory state wins.
+        stored = self._store.query(agent_id=agent_id, statuses=wanted, limit=limit + len(live))
+        merged = {**{t.id: t for t in stored if t.id not in live}, **live}
+        return sorted(merged.values(), key=lambda t: t.created_at, reverse=True)[:limit]
+
+    def completion(self, task_id: str) -> Future:
+        """A future resolving to the task's final state once it has completed or failed."""
+        future: Future = Future()
+        with self._lock:
+            if task_id in self._tasks:
+                self._waiters.setdefault(task_id, []).append(future)
+                return future
+        future.set_result(self.get_task(task_id))
+        return future
+
+    def events(self, after: int = 0, agent_id: str | None = None, timeout: float = 15.0) -> List[TaskEvent]:
+        """Status transitions with ``seq`` above ``after``, optionally for one agent, waiting up to
+        ``timeout`` for one to arrive. Only the most recent ``max_events`` are retained."""
+        _, events = self._wait((_events_key(agent_id),), self._events_check(after, agent_id), timeout)
+        return events
+
+    async def aevents(self, after: int = 0, agent_id: str | None = None, timeout: float = 15.0) -> List[TaskEvent]:
+        _, events = await self._await((_events_key(agent_id),), self._events_check(after, agent_id), timeout)
+        return events
+
+    def wait_for(self, task_ids: Iterable[str], mode: str = "all", timeout: float = 30.0) -> bool:
+        """Block until ``all`` (or ``any``) of the tasks finished, or ``timeout`` passes.
+
+        Returns whether the condition was met. Unknown ids count as finished.
+        """
+        ids = list(task_ids)
+        done, _ = self._wait(ids, self._finished_check(ids, mode), timeout)
+        return done
+
+    async def await_for(self, task_ids: Iterable[str], mode: str = "all", timeout: float = 30.0) -> bool:
+        ids = list(task_ids)
+        done, _ = await self._await(ids, self._finished_check(ids, mode), timeout)
+        return done
+
+    # Each check runs under the queue lock and returns (done, value).
+    def _watch_check(
+        self, task_id: str, seen_chars: int, seen_status: TaskStatus | None
+    ) -> Callable[[], Tuple[bool, TaskState | None]]:
+        def check() -> Tuple[bool, TaskState | None]:
+            task = self._tasks.get(task_id)
+            done = task is None or len(task.partial_result) > seen_chars or task.status != seen_status
+            return done, task
+
+        return check
+
+    def _events_check(self, after: int, agent_id: str | None) -> Callable[[], Tuple[bool, List[TaskEvent]]]:
+        def check() -> Tuple[bool, List[TaskEvent]]:
+            matched = []
+            for event in reversed(self._events):
+                if event.seq <= after:
+                    break
+                if agent_id is None or event.agent_id == agent_id:
+                    matched.append(event)
+            return bool(matched), matched[::-1]
+
+        return check
+
+    def _finished_check(self, ids: List[str], mode: str) -> Callable[[], Tuple[bool, None]]:
+        if mode not in ("all", "any"):
+            raise ValueError(f"Unsupported wait mode: {mode}")
+        reduce = all if mode == "all" else any
+
+        def check() -> Tuple[bool, None]:
+            return reduce(task_id not in self._tasks for task_id in ids), None
+
+        return check
+
+    def _wait(self, keys: Iterable[str], check: Callable[[], Tuple[bool, Any]], timeout: float) -> Tuple[bool, Any]:
+        signal = _Signal()
+        deadline = time.monotonic() + timeout
+        self._subscribe(keys, signal)
+        try:
+            while True:
+                with self._lock:
+                    signal.clear()
+                    done, value = check()
+                remaining = deadline - time.monotonic()
+                if done or remaining <= 0:
+                    return done, value
+                signal.wait(remaining)
+        finally:
+            self._unsubscribe(keys, signal)
+
+    async def _await(
+        self, keys: Iterable[str], check: Callable[[], Tuple[bool, Any]], timeout: float
+    ) -> Tuple[bool, Any]:
+        signal = _Signal(asyncio.get_running_loop())
+        deadline = time.monotonic() + timeout
+        self._subscribe(keys, signal)
+        try:
+            while True:
+                with self._lock:
+                    signal.clear()
+                    done, value = check()
+                remaining = deadline - time.monotonic()
+                if done or remaining <= 0:
+                    return done, value
+                await signal.wait_async(remaining)
+        finally:
+            self._unsubscribe(keys, signal)
+
+    def _subscribe(self, keys: Iterable[str], signal: _Signal) -> None:
+        with self._lock:
+            for key in keys:
+                self._subscribers.setdefault(key, set()).add(signal)
+
+    def _unsubscribe(self, keys: Iterable[str], signal: _Signal) -> None:
+        with self._lock:
+            for key in keys:
+                subscribers = self._subscribers.get(key)
+                if subscribers is not None:
+                    subscribers.discard(signal)
+                    if not subscribers:
+                        del self._subscribers[key]
+
+    def _notify(self, *keys: str) -> None:
+        # Caller holds the lock. Only waiters on these keys wake, not every subscriber.
+        for key in keys:
+            for signal in self._subscribers.get(key, ()):
+                signal.set()
+
+    def stats(self) -> dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            workers = [
+                {
+                    "name": s.name,
+                    "busy": s.current_task is not None,
+                    "tasks_processed": s.tasks_processed,
+                    "utilization": round(s.utilization(now), 4),
+                }
+                for s in self._worker_stats
+            ]
+            return {
+                "workers": len(self._worker_stats),
+                "queue_depth": self._pending,
+                "max_pending": self._max_pending,
+                "in_flight": sum(1 for s in self._worker_stats if s.current_task is not None),
+                "active_agents": len(self._lanes),
+                "worker_stats": workers,
+            }
+
+    def _admit(self, task: TaskState) -> None:
+        self._tasks[task.id] = task
+        lane = self._lanes.get(task.agent_id)
+        if lane is None:
+            lane = self._lanes[task.agent_id] = _Lane(pass_value=self._vtime)
+            heapq.heappush(self._ready, (lane.pass_value, next(self._seq), task.agent_id))
+            self._cond.notify()
+        heapq.heappush(lane.pending, (_PRIORITY_RANK[task.priority], next(self._seq), task.id))
+        self._pending += 1
+        self._emit(task)
+
+    def _emit(self, task: TaskState) -> None:
+        self._events.append(TaskEvent(next(self._event_seq), task.id, task.agent_id, task.status))
+        self._notify(task.id, _events_key(task.agent_id), _events_key(None))
+
+    def _recover(self) -> None:
+        # Replay work that was queued or mid-flight when the previous process stopped.
+        with self._cond:
+            for task in self._store.load_unfinished():
+                if task.status == TaskStatus.running:
+                    task.status = TaskStatus.queued
+                    task.reasoning_steps.append("Recovered after restart; re-queued")
+                    task.actions.append("recover")
+                    self._store.save(task)
+                self._admit(task)
+
+    def _finish(self, task: TaskState, status: TaskStatus) -> None:
+        telemetry.inc("agent_tasks_total", status=status.value)
+        task.status = status
+        task.finished_at = time.time()
+        try:
+            self._store.save(task)
+        finally:
+            # Even if it could not be saved, the task is over: waiters must not hang on it.
+            self._tasks.pop(task.id, None)
+            self._emit(task)
+
+    def _abandon(self, task: TaskState, exc: BaseException) -> None:
+        # Last resort for an error that escaped _execute: fail the task and wake its waiters.
+        with self._lock:
+            pending = task.id in self._tasks or task.id in self._reservations or task.id in self._waiters
+            if task.id in self._tasks:
+                task.error = task.error or f"{type(exc).__name__}: {exc}"
+                try:
+                    self._finish(task, TaskStatus.failed)
+                except Exception:
+                    logger.exception("Could not save failed task %s", task.id)
+            if task.id in self._reservations:
+                self._release(task, 0, 0.0)
+        if pending:
+            self._notify_finished(task)
+
+    def _notify_finished(self, task: TaskState) -> None:
+        # Outside the queue lock: future callbacks and webhook delivery run arbitrary code.
         with self._lock:
-            if task_id not in self._tasks:
-                raise KeyError(f"Task {task_id} not found")
-            return self._tasks[task_id]
+            waiters = self._waiters.pop(task.id, [])
+        for future in waiters:
+            future.set_result(task)
+        if task.callback_url and self._webhooks is not None:
+            self._webhooks.send(
+                task.callback_url,
+                {
+                    "event": f"task.{task.status.value}",
+                    "task": {
+                        "id": task.id,
+                        "agent_id": task.agent_id,
+                        "status": task.status.value,
+                        "result": task.result,
+                        "error": task.error,
+                        "latency_ms": task.latency_ms,
+                        "finished_at": task.finished_at,
+                    },
+                },
+            )
+
+    def _retry_after(self) -> int:
+        return retry_after(self._pending, self._avg_task_seconds, len(self._worker_stats))
+
+    def _window_usage(self, agent_id: str) -> AgentUsage:
+        usage = self._usage.setdefault(agent_id, AgentUsage())
+        usage.expire(time.monotonic() - self._budget_window)
+        return usage
+
+    def _budget_retry_after(self, usage: AgentUsage, tokens: int, seconds: float) -> int:
+        opened = usage.frees_at(tokens, seconds)
+        if opened is None:
+            # Queued work holds the rest of the quota; once it runs, its charge ages out a window later.
+            return math.ceil(self._budget_window)
+        return max(1, math.ceil(opened + self._budget_window - time.monotonic()))
+
+    def _remaining_seconds(self, agent: AgentDefinition) -> float:
+        with self._lock:
+            return max(agent.budget_seconds - self._window_usage(agent.id).seconds, 0.0)
+
+    def _release(self, task: TaskState, tokens: int, seconds: float) -> None:
+        est_tokens, est_seconds = self._reservations.pop(task.id, (0, 0.0))
+        usage = self._usage.setdefault(task.agent_id, AgentUsage())
+        usage.reserved_tokens -= est_tokens
+        usage.reserved_seconds -= est_seconds
+        usage.tokens += tokens
+        usage.seconds += seconds
+        usage.charges.append((time.monotonic(), tokens, seconds))
+        self._avg_task_seconds = seconds if not self._avg_task_seconds else 0.8 * self._avg_task_seconds + 0.2 * seconds
 
     def shutdown(self) -> None:
         self._stop.set()
-        self._q.put("__STOP__")
-        self._worker.join(timeout=2)
+        with self._cond:
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join(timeout=2)
+        if self._owns_tools:
+            self._tools.shutdown()
+        self._store.flush()
+
+    def _run(self, stats: WorkerStats) -> None:
+        while True:
+            with self._cond:
+                while not self._ready and not self._stop.is_set():
+                    self._cond.wait()
+                if self._stop.is_set():
+                    return
+                pass_value, _, agent_id = heapq.heappop(self._ready)
+                self._vtime = max(self._vtime, pass_value)
+                lane = self._lanes[agent_id]
+                _, _, task_id = heapq.heappop(lane.pending)
+                task = self._tasks[task_id]
+                lane.pass_value = pass_value + 1.0 / PRIORITY_WEIGHTS[task.priority]
+                self._pending -= 1
+                stats.current_task = task_id
+                stats.busy_since = time.monotonic()
+
+            try:
+                self._execute(task_id)
+            except Exception as exc:
+                # Keep the worker alive: an escaped error must not shrink the pool.
+                logger.exception("Task %s failed outside its error handling", task_id)
+                self._abandon(task, exc)
+            finally:
+                with self._cond:
+                    stats.busy_seconds += time.monotonic() - (stats.busy_since or 0.0)
+                    stats.busy_since = None
+                    stats.current_task = None
+                    stats.tasks_processed += 1
+                    if lane.pending:
+                        heapq.heappush(self._ready, (lane.pass_value, next(self._seq), agent_id))
+                        self._cond.notify()
+                    else:
+                        del self._lanes[agent_id]
+
+    def _stream_step(self, task: TaskState, request: UnifiedGenerateRequest, start: float) -> UnifiedGenerateResponse:
+        response = None
+        for event in self._router.stream(request):
+            if event.delta:
+                with self._lock:
+                    if task.first_token_ms is None:
+                        task.first_token_ms = int((time.perf_counter() - start) * 1000)
+                    task.partial_result += event.delta
+                    self._notify(task.id)
+            if event.response is not None:
+                response = event.response
+        if response is None:
+            raise RuntimeError("Model stream ended without a final response")
+        return response
 
-    def _run(self) -> None:
-        while not self._stop.is_set():
-            task_id = self._q.get()
-            if task_id == "__STOP__":
-                return
-            self._execute(task_id)
+    @contextmanager
+    def _stage(self, task: TaskState, name: str, **attributes: Any) -> Iterator[Span]:
+        with telemetry.span(f"task.{name}", **attributes) as span:
+            yield span
+        task.stage_ms[name] = task.stage_ms.get(name, 0) + int(span.duration_seconds * 1000)
 
     def _execute(self, task_id: str) -> None:
-        start = time.perf_counter()
-        with self._lock:
-            task = self._tasks[task_id]
-            task.status = TaskStatus.running
-            task.reasoning_steps.append("Load agent definition and conversation context")
-            task.actions.append("fetch_agent")
+        with telemetry.span("task") as root:
+            self._execute_traced(task_id, root)
 
+    def _execute_traced(self, task_id: str, root: Span) -> None:
+        start = time.perf_counter()
+        task = self._tasks[task_id]
         try:
-            agent = self._agent_manager.get_agent(task.agent_id)
-            history = self._agent_manager.get_history(task.agent_id)
+            with self._lock:
+                task.status = TaskStatus.running
+                task.reasoning_steps.append("Load agent definition and conversation context")
+                task.actions.append("fetch_agent")
+                self._store.save(task)
+                self._emit(task)
+            root.attributes.update(
+                {"task.id": task.id, "agent.id": task.agent_id, "task.priority": task.priority.value}
+            )
+            waited = telemetry.record_span("task.queue_wait", start_ns=int(task.created_at * 1e9))
+            task.stage_ms["queue_wait"] = int(waited.duration_seconds * 1000)
 
-            messages = [ConversationMessage(role="system", content=agent.system_prompt)] + history + [
-                ConversationMessage(role="user", content=task.prompt)
-            ]
+            agent = self._agent_manager.get_agent(task.agent_id)
+            # The task may run for whatever is left of the agent's time quota in this window.
+            deadline = time.monotonic() + self._remaining_seconds(agent)
+            tools = [tool for tool in agent.allowed_tools if tool in RUNNABLE_TOOLS]
+            required = [Capability.streaming, Capability.structured_output]
+            if tools:
+                required.append(Capability.tool_calling)
+            request = UnifiedGenerateRequest(
+                model=ModelConfig(provider=agent.provider, model=agent.model),
+                require_capabilities=required,
+                allow_auto_downgrade=True,
+            )
             task.reasoning_steps.append("Negotiate model capabilities and fallback if needed")
             task.actions.append("capability_negotiation")
+            with self._stage(task, "negotiate"):
+                route = self._router.resolve(request)
+            parallel = Capability.parallel_tool_calls in route.profile.capabilities
 
-            response = self._router.generate(
-                UnifiedGenerateRequest(
-                    model=ModelConfig(provider=agent.provider, model=agent.model),
-                    messages=messages,
-                    require_capabilities=[Capability.streaming, Capability.structured_output],
-                    allow_auto_downgrade=True,
-                )
+            with self._stage(task, "context"):
+                context = self._context.build(agent, task.prompt, route.profile)
+            task.reasoning_steps.append(
+                f"Assemble context window: {len(context.messages)} messages, ~{context.tokens} tokens, "
+                f"{context.dropped} older messages omitted"
             )
+            task.actions.append("build_context")
+            messages = list(context.messages)
+            if tools:
+                messages.insert(1, tool_instructions(tools))
+            tokens = context.tokens
+
+            for step in range(1, MAX_AGENT_STEPS + 1):
+                request.messages = messages
+                step_start = time.perf_counter()
+                with self._stage(task, "model_call", step=step, model=route.model):
+                    response = self._stream_step(task, request, start)
+                calls = response.tool_calls if tools else []
+                with self._lock:
+                    task.reasoning_steps.append(
+                        f"Step {step}: model call in {int((time.perf_counter() - step_start) * 1000)} ms, "
+                        f"{len(calls)} tool calls requested"
+                    )
+                    task.actions.append("model_call")
+                if not calls:
+                    break
+                if step == MAX_AGENT_STEPS or time.monotonic() >= deadline:
+                    raise RuntimeError("Agent step or time budget exhausted before a final answer")
+
+                tools_start = time.perf_counter()
+                with self._stage(task, "tool_calls", step=step, calls=len(calls)):
+                    results = run_tool_calls(self._tools, calls, tools, deadline, parallel=parallel)
+                timings = ", ".join(f"{r.call.name}#{r.call.id} {r.latency_ms} ms" for r in results)
+                with self._lock:
+                    task.reasoning_steps.append(
+                        f"Step {step}: ran {len(results)} tool calls "
+                        f"{'in parallel' if parallel else 'sequentially'} in "
+                        f"{int((time.perf_counter() - tools_start) * 1000)} ms ({timings})"
+                    )
+                    task.actions.extend(
+                        f"tool:{r.call.name}" + ("" if r.error is None else ":error") for r in results
+                    )
+                feedback = [
+                    ConversationMessage(role="assistant", content=response.output_text),
+                    tool_results_message(results),
+                ]
+                messages = messages + feedback
+                tokens += sum(estimate_tokens(m.content) for m in feedback)
 
-            self._agent_manager.add_message(task.agent_id, role="user", content=task.prompt)
-            self._agent_manager.add_message(task.agent_id, role="assistant", content=response.output_text)
+            with self._stage(task, "history"):
+                self._agent_manager.add_message(task.agent_id, role="user", content=task.prompt)
+                self._agent_manager.add_message(task.agent_id, role="assistant", content=response.output_text)
 
             elapsed_ms = int((time.perf_counter() - start) * 1000)
             with self._lock:
                 task.reasoning_steps.append("Persist assistant output and run trace")
                 task.actions.append("write_conversation")
                 task.result = response.output_text
-                task.tokens_estimate = sum(len(m.content.split()) for m in messages)
+                task.tokens_estimate = tokens
                 task.latency_ms = elapsed_ms
-                task.status = TaskStatus.completed
+                self._finish(task, TaskStatus.completed)
+                self._release(task, task.tokens_estimate, time.perf_counter() - start)
         except Exception as exc:  # pragma: no cover
+            root.error = f"{type(exc).__name__}: {exc}"
             with self._lock:
                 task.error = str(exc)
-                task.status = TaskStatus.failed
+                self._finish(task, TaskStatus.failed)
+                self._release(task, 0, time.perf_counter() - start)
+        self._notify_finished(task)
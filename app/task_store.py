@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.models import TaskPriority
+
+logger = logging.getLogger(__name__)
+
+
+class TaskStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+
+FINISHED_STATUSES = frozenset({TaskStatus.completed, TaskStatus.failed})
+# Stays under SQLite's default limit on bound parameters per statement.
+_SQL_CHUNK = 500
+
+
+@dataclass(slots=True)
+class TaskState:
+    id: str
+    agent_id: str
+    prompt: str
+    priority: TaskPriority = TaskPriority.normal
+    status: TaskStatus = TaskStatus.queued
+    result: str | None = None
+    partial_result: str = ""
+    error: str | None = None
+    reasoning_steps: List[str] = field(default_factory=list)
+    actions: List[str] = field(default_factory=list)
+    tokens_estimate: int = 0
+    latency_ms: int = 0
+    first_token_ms: int | None = None
+    # Wall time per pipeline stage (queue_wait, negotiate, context, model_call, tool_calls, history).
+    stage_ms: Dict[str, int] = field(default_factory=dict)
+    callback_url: str | None = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+
+
+def _task_to_json(task: TaskState) -> str:
+    return json.dumps(asdict(task), default=lambda v: v.value if isinstance(v, Enum) else str(v))
+
+
+def _task_from_json(raw: str) -> TaskState:
+    data: Dict[str, Any] = json.loads(raw)
+    known = TaskState.__dataclass_fields__
+    task = TaskState(**{k: v for k, v in data.items() if k in known})
+    task.status = TaskStatus(task.status)
+    task.priority = TaskPriority(task.priority)
+    return task
+
+
+class TaskStore:
+    """Persistence for task records. ``save`` may be write-behind; ``flush`` forces it out."""
+
+    def save(self, task: TaskState) -> None:
+        raise NotImplementedError
+
+    def get(self, task_id: str) -> TaskState | None:
+        raise NotImplementedError
+
+    def get_many(self, task_ids: Iterable[str]) -> Dict[str, TaskState]:
+        found = {}
+        for task_id in task_ids:
+            task = self.get(task_id)
+            if task is not None:
+                found[task_id] = task
+        return found
+
+    def query(
+        self, agent_id: str | None = None, statuses: Iterable[TaskStatus] | None = None, limit: int = 100
+    ) -> List[TaskState]:
+        """Most recently created tasks first."""
+        raise NotImplementedError
+
+    def load_unfinished(self) -> List[TaskState]:
+        raise NotImplementedError
+
+    def evict_finished(self) -> int:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+
+class InMemoryTaskStore(TaskStore):
+    def __init__(self, finished_ttl_seconds: float = 3600.0, max_finished: int = 100_000) -> None:
+        self._ttl = finished_ttl_seconds
+        self._max_finished = max_finished
+        self._lock = threading.Lock()
+        self._tasks: Dict[str, TaskState] = {}
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+
+    def save(self, task: TaskState) -> None:
+        with self._lock:
+            self._tasks[task.id] = task
+            if task.status in FINISHED_STATUSES and task.id not in self._finished:
+                self._finished[task.id] = task.finished_at or time.time()
+                self._evict_locked()
+
+    def get(self, task_id: str) -> TaskState | None:
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def query(
+        self, agent_id: str | None = None, statuses: Iterable[TaskStatus] | None = None, limit: int = 100
+    ) -> List[TaskState]:
+        wanted = set(statuses) if statuses else None
+        with self._lock:
+            tasks = [
+                t
+                for t in self._tasks.values()
+                if (agent_id is None or t.agent_id == agent_id) and (wanted is None or t.status in wanted)
+            ]
+        return heapq.nlargest(limit, tasks, key=lambda t: t.created_at)
+
+    def load_unfinished(self) -> List[TaskState]:
+        with self._lock:
+            return [t for t in self._tasks.values() if t.status not in FINISHED_STATUSES]
+
+    def evict_finished(self) -> int:
+        with self._lock:
+            return self._evict_locked()
+
+    def _evict_locked(self) -> int:
+        cutoff = time.time() - self._ttl
+        evicted = 0
+        while self._finished:
+            task_id, finished_at = next(iter(self._finished.items()))
+            if len(self._finished) <= self._max_finished and finished_at >= cutoff:
+                break
+            del self._finished[task_id]
+            self._tasks.pop(task_id, None)
+            evicted += 1
+        return evicted
+
+
+class SQLiteTaskStore(TaskStore):
+    """SQLite (WAL) task store with a write-behind buffer.
+
+    ``save`` only snapshots the task into an in-memory buffer keyed by task id, so repeated
+    status changes of one task coalesce; a background thread writes the buffer out in a single
+    transaction every ``flush_interval`` seconds or once ``batch_size`` tasks are dirty.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        flush_interval: float = 0.05,
+        batch_size: int = 500,
+        finished_ttl_seconds: float = 3600.0,
+        max_finished: int = 100_000,
+        evict_interval: float = 30.0,
+    ) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._ttl = finished_ttl_seconds
+        self._max_finished = max_finished
+        self._evict_interval = evict_interval
+
+        self._conn = sqlite3.connect(str(self._path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                agent_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                finished_at REAL,
+                data TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks(status)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_finished_at ON tasks(finished_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_agent ON tasks(agent_id, created_at)")
+        self._db_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._dirty: Dict[str, Tuple[Any, ...]] = {}
+        self._inflight: Dict[str, Tuple[Any, ...]] = {}
+        self._closed = False
+        self._last_evict = time.monotonic()
+        self._writer = threading.Thread(target=self._write_loop, name="task-store-writer", daemon=True)
+        self._writer.start()
+
+    def save(self, task: TaskState) -> None:
+        row = (task.id, task.agent_id, task.status.value, task.created_at, task.finished_at, _task_to_json(task))
+        with self._wakeup:
+            self._dirty[task.id] = row
+            if len(self._dirty) >= self._batch_size:
+                self._wakeup.notify()
+
+    def get(self, task_id: str) -> TaskState | None:
+        with self._lock:
+            row = self._dirty.get(task_id) or self._inflight.get(task_id)
+        if row is not None:
+            return _task_from_json(row[5])
+        with self._db_lock:
+            found = self._conn.execute("SELECT data FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return _task_from_json(found[0]) if found else None
+
+    def get_many(self, task_ids: Iterable[str]) -> Dict[str, TaskState]:
+        ids = list(task_ids)
+        found: Dict[str, TaskState] = {}
+        missing = []
+        with self._lock:
+            for task_id in ids:
+                row = self._dirty.get(task_id) or self._inflight.get(task_id)
+                if row is not None:
+                    found[task_id] = _task_from_json(row[5])
+                else:
+                    missing.append(task_id)
+        rows = []
+        with self._db_lock:
+            for start in range(0, len(missing), _SQL_CHUNK):
+                chunk = missing[start : start + _SQL_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                query = f"SELECT id, data FROM tasks WHERE id IN ({placeholders})"
+                rows += self._conn.execute(query, chunk).fetchall()
+        found.update((task_id, _task_from_json(data)) for task_id, data in rows)
+        return found
+
+    def query(
+        self, agent_id: str | None = None, statuses: Iterable[TaskStatus] | None = None, limit: int = 100
+    ) -> List[TaskState]:
+        self.flush()
+        clauses, params = [], []
+        if agent_id is not None:
+            clauses.append("agent_id = ?")
+            params.append(agent_id)
+        if statuses:
+            wanted = [TaskStatus(s).value for s in statuses]
+            clauses.append(f"status IN ({','.join('?' * len(wanted))})")
+            params += wanted
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._db_lock:
+            rows = self._conn.execute(
+                f"SELECT data FROM tasks {where} ORDER BY created_at DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [_task_from_json(r[0]) for r in rows]
+
+    def load_unfinished(self) -> List[TaskState]:
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT data FROM tasks WHERE status IN (?, ?) ORDER BY created_at",
+                (TaskStatus.queued.value, TaskStatus.running.value),
+            ).fetchall()
+        return [_task_from_json(r[0]) for r in rows]
+
+    def evict_finished(self) -> int:
+        cutoff = time.time() - self._ttl
+        # The connection's context manager commits, or rolls back if a statement fails.
+        with self._db_lock, self._conn:
+            self._conn.execute("BEGIN")
+            expired = self._conn.execute(
+                "DELETE FROM tasks WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,)
+            ).rowcount
+            overflow = self._conn.execute(
+                """
+                DELETE FROM tasks WHERE id IN (
+                    SELECT id FROM tasks WHERE finished_at IS NOT NULL
+                    ORDER BY finished_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self._max_finished,),
+            ).rowcount
+        return expired + overflow
+
+    def flush(self) -> None:
+        # Serialised so an older batch can never land after a newer one for the same task.
+        with self._flush_lock:
+            with self._lock:
+                batch, self._dirty = self._dirty, {}
+                self._inflight.update(batch)
+            self._write(batch)
+
+    def close(self) -> None:
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify()
+        self._writer.join(timeout=2)
+        try:
+            self.flush()
+        finally:
+            with self._db_lock:
+                self._conn.close()
+
+    def _write(self, batch: Dict[str, Tuple[Any, ...]]) -> None:
+        try:
+            if batch:
+                with self._db_lock, self._conn:
+                    self._conn.execute("BEGIN")
+                    self._conn.executemany("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?)", batch.values())
+        except Exception:
+            # Requeue the rows for the next flush, unless a newer snapshot of the task is already waiting.
+            with self._lock:
+                for task_id, row in batch.items():
+                    self._dirty.setdefault(task_id, row)
+            raise
+        finally:
+            with self._lock:
+                for task_id, row in batch.items():
+                    if self._inflight.get(task_id) is row:
+                        del self._inflight[task_id]
+
+    def _write_loop(self) -> None:
+        failed = False
+        while True:
+            with self._wakeup:
+                if not self._closed and (failed or len(self._dirty) < self._batch_size):
+                    self._wakeup.wait(self._flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+                if time.monotonic() - self._last_evict >= self._evict_interval:
+                    self._last_evict = time.monotonic()
+                    self.evict_finished()
+                failed = False
+            except Exception:
+                # Keep the writer alive; the failed rows are back in the buffer and retried next round.
+                logger.exception("Writing tasks to %s failed", self._path)
+                failed = True
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterator, List, Tuple
+
+# Upper bounds in seconds; a +Inf bucket is implied.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_HELP: Dict[str, str] = {
+    "agent_span_duration_seconds": "Duration of traced pipeline stages.",
+    "agent_model_call_duration_seconds": "Duration of provider adapter calls.",
+    "agent_tasks_total": "Tasks finished, by status.",
+    "agent_tool_runs_total": "Tool snippets executed, by language and outcome.",
+    "agent_queue_depth": "Tasks waiting for a worker.",
+    "agent_tasks_in_flight": "Tasks being executed.",
+    "agent_active_agents": "Agents with queued or running tasks.",
+    "agent_tool_jobs_pending": "Tool jobs waiting for a tool worker.",
+    "agent_tool_jobs_running": "Tool jobs being executed.",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_current_span: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("agent_span", default=None)
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None = None
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int | None = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    @property
+    def duration_seconds(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def otlp(self) -> Dict[str, Any]:
+        attributes = [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()]
+        status = {"code": 2, "message": self.error} if self.error is not None else {"code": 1}
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": attributes,
+            "status": status,
+        }
+        if self.parent_id is not None:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+@dataclass
+class _Histogram:
+    counts: List[int]
+    total: float = 0.0
+    count: int = 0
+
+
+class Telemetry:
+    """Process-wide spans, histograms, counters and gauges.
+
+    ``span`` times a block, nests under the span active in the current context and feeds the
+    ``agent_span_duration_seconds`` histogram. ``render`` produces the Prometheus text format.
+    With ``trace_path`` set, finished spans are also appended to that file as OTLP/JSON lines
+    (one ``resourceSpans`` export per flush), readable by an OpenTelemetry collector's file
+    receiver; spans are buffered and written at most every ``flush_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        trace_path: str | Path | None = None,
+        service_name: str = "local-agent-builder",
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self._buckets = buckets
+        self._service_name = service_name
+        self._flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: List[Tuple[str, Labels, Callable[[], float]]] = []
+        self._trace_file: IO[str] | None = None
+        self._pending_spans: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        if trace_path:
+            self.export_to(trace_path)
+
+    def export_to(self, trace_path: str | Path) -> None:
+        path = Path(trace_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if self._trace_file is not None:
+                self._flush_locked()
+                self._trace_file.close()
+            self._trace_file = path.open("a", encoding="utf-8")
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        span = self._start(name, time.time_ns(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            _current_span.reset(token)
+            self._end(span)
+
+    def record_span(self, name: str, start_ns: int, end_ns: int | None = None, **attributes: Any) -> Span:
+        """Record a stage that has already happened, e.g. time spent waiting in a queue."""
+        span = self._start(name, start_ns, attributes)
+        self._end(span, end_ns)
+        return span
+
+    def observe(self, metric: str, seconds: float, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(metric, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(counts=[0] * (len(self._buckets) + 1))
+            histogram.counts[bisect_left(self._buckets, seconds)] += 1
+            histogram.total += seconds
+            histogram.count += 1
+
+    def inc(self, metric: str, amount: float = 1.0, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(metric, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def gauge(self, metric: str, read: Callable[[], float], **labels: Any) -> None:
+        """Register a gauge whose value is read at scrape time."""
+        with self._lock:
+            self._gauges.append((metric, _labels(labels), read))
+
+    def render(self) -> str:
+        with self._lock:
+            histograms = {
+                name: {key: (list(h.counts), h.total, h.count) for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = list(self._gauges)
+        lines: List[str] = []
+        for name, series in sorted(histograms.items()):
+            lines += [f"# HELP {name} {_HELP.get(name, name)}", f"# TYPE {name} histogram"]
+            for key, (counts, total, count) in sorted(series.items()):
+                cumulative = 0
+                for bound, bucket in zip((*self._buckets, "+Inf"), counts):
+                    cumulative += bucket
+                    lines.append(f"{name}_bucket{_format_labels((*key, ('le', str(bound))))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{name}_count{_format_labels(key)} {count}")
+        for name, series in sorted(counters.items()):
+            lines += [f"# HELP {name} {_HELP.get(name, name)}", f"# TYPE {name} counter"]
+            lines += [f"{name}{_format_labels(key)} {value}" for key, value in sorted(series.items())]
+        described = set()
+        for name, key, read in gauges:
+            if name not in described:
+                described.add(name)
+                lines += [f"# HELP {name} {_HELP.get(name, name)}", f"# TYPE {name} gauge"]
+            lines.append(f"{name}{_format_labels(key)} {float(read())}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
+
+    def _start(self, name: str, start_ns: int, attributes: Dict[str, Any]) -> Span:
+        parent = _current_span.get()
+        return Span(
+            name=name,
+            trace_id=parent.trace_id if parent is not None else os.urandom(16).hex(),
+            span_id=os.urandom(8).hex(),
+            parent_id=parent.span_id if parent is not None else None,
+            start_ns=start_ns,
+            attributes=attributes,
+        )
+
+    def _end(self, span: Span, end_ns: int | None = None) -> None:
+        span.end_ns = end_ns or time.time_ns()
+        self.observe("agent_span_duration_seconds", span.duration_seconds, span=span.name)
+        if self._trace_file is None:
+            return
+        with self._lock:
+            self._pending_spans.append(span.otlp())
+            if time.monotonic() - self._last_flush >= self._flush_interval:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        self._last_flush = time.monotonic()
+        if self._trace_file is None or not self._pending_spans:
+            return
+        export = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self._service_name}}]},
+                    "scopeSpans": [{"scope": {"name": "app.telemetry"}, "spans": self._pending_spans}],
+                }
+            ]
+        }
+        self._pending_spans = []
+        self._trace_file.write(json.dumps(export, separators=(",", ":")) + "\n")
+        self._trace_file.flush()
+
+
+telemetry = Telemetry()
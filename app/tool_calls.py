@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import json
+import re
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from app.models import ConversationMessage, ToolCall
+from app.tool_runtime import ToolExecutionResult
+
+if TYPE_CHECKING:
+    from app.tool_executor import ToolExecutor, ToolJob
+
+# Tools an agent can be granted through ``allowed_tools``; each runs snippets of that language.
+RUNNABLE_TOOLS = ("python", "javascript")
+DEFAULT_TOOL_TIMEOUT_SECONDS = 5
+MAX_TOOL_TIMEOUT_SECONDS = 30
+
+_FENCE = re.compile(r"^```(?:json)?\s*(.*?)\s*```$", re.DOTALL)
+
+
+def tool_instructions(tools: List[str]) -> ConversationMessage:
+    return ConversationMessage(
+        role="system",
+        content=(
+            f"You can call these tools: {', '.join(tools)}. Each runs the given code and returns its "
+            'output. To call tools, reply with only JSON: {"tool_calls": [{"id": "call_1", "name": '
+            '"python", "arguments": {"code": "print(1)", "timeout_seconds": 5}}]}. Several calls in '
+            "one reply may run in parallel. Results come back in a message starting with "
+            '"Tool results:"; reply without tool calls to give the final answer.'
+        ),
+    )
+
+
+def parse_tool_calls(text: str) -> List[ToolCall]:
+    """Tool calls requested by a model reply, or an empty list when it is a plain answer."""
+    stripped = text.strip()
+    if not stripped.startswith(("{", "```")):
+        return []
+    fenced = _FENCE.match(stripped)
+    try:
+        data = json.loads(fenced.group(1) if fenced else stripped)
+    except ValueError:
+        return []
+    raw_calls = data.get("tool_calls") if isinstance(data, dict) else None
+    if not isinstance(raw_calls, list):
+        return []
+
+    calls = []
+    for index, raw in enumerate(raw_calls, start=1):
+        if not isinstance(raw, dict) or not isinstance(raw.get("name"), str):
+            continue
+        arguments = raw.get("arguments") or {}
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except ValueError:
+                arguments = {"code": arguments}
+        if not isinstance(arguments, dict):
+            continue
+        calls.append(ToolCall(id=str(raw.get("id") or f"call_{index}"), name=raw["name"], arguments=arguments))
+    return calls
+
+
+@dataclass
+class ToolCallResult:
+    call: ToolCall
+    result: ToolExecutionResult | None = None
+    error: str | None = None
+    latency_ms: int = 0
+
+    def payload(self) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"id": self.call.id, "name": self.call.name}
+        if self.result is not None:
+            payload.update(
+                stdout=self.result.stdout, stderr=self.result.stderr, exit_code=self.result.exit_code
+            )
+        if self.error is not None:
+            payload["error"] = self.error
+        return payload
+
+
+def tool_results_message(results: List[ToolCallResult]) -> ConversationMessage:
+    body = json.dumps([result.payload() for result in results], ensure_ascii=False)
+    return ConversationMessage(role="user", content=f"Tool results: {body}")
+
+
+def run_tool_calls(
+    executor: ToolExecutor,
+    calls: List[ToolCall],
+    allowed_tools: List[str],
+    deadline: float,
+    parallel: bool = True,
+) -> List[ToolCallResult]:
+    """Run ``calls`` on ``executor`` before the monotonic ``deadline``.
+
+    All calls are submitted before any is awaited when ``parallel`` is set; otherwise each one
+    finishes before the next starts. Per-call timeouts are clamped to the remaining budget.
+    Calls that are not allowed, malformed or rejected become results with an ``error``.
+    """
+    results: List[ToolCallResult] = []
+    submitted: List[tuple[ToolCallResult, ToolJob]] = []
+    for call in calls:
+        outcome = ToolCallResult(call=call)
+        results.append(outcome)
+        job = _submit(executor, outcome, allowed_tools, deadline)
+        if job is None:
+            continue
+        if parallel:
+            submitted.append((outcome, job))
+        else:
+            _collect(outcome, job, deadline)
+    for outcome, job in submitted:
+        _collect(outcome, job, deadline)
+    return results
+
+
+def _submit(
+    executor: ToolExecutor, outcome: ToolCallResult, allowed_tools: List[str], deadline: float
+) -> ToolJob | None:
+    call = outcome.call
+    remaining = deadline - time.monotonic()
+    code = call.arguments.get("code")
+    if call.name not in allowed_tools:
+        outcome.error = f"Tool {call.name} is not allowed for this agent"
+    elif call.name not in RUNNABLE_TOOLS:
+        outcome.error = f"Unknown tool: {call.name}"
+    elif not isinstance(code, str) or not code.strip():
+        outcome.error = "Missing 'code' argument"
+    elif remaining < 1:
+        outcome.error = "Agent time budget exhausted"
+    else:
+        try:
+            requested = int(call.arguments.get("timeout_seconds", DEFAULT_TOOL_TIMEOUT_SECONDS))
+        except (TypeError, ValueError, OverflowError):
+            requested = DEFAULT_TOOL_TIMEOUT_SECONDS
+        timeout = max(1, min(requested, MAX_TOOL_TIMEOUT_SECONDS, int(remaining)))
+        try:
+            return executor.submit(call.name, code, timeout)
+        except Exception as exc:
+            outcome.error = str(exc)
+    return None
+
+
+def _collect(outcome: ToolCallResult, job: ToolJob, deadline: float) -> None:
+    try:
+        # A job's own timeout fits the budget; the slack covers process start-up and teardown.
+        outcome.result = job.done.result(timeout=max(deadline - time.monotonic(), 0) + 2)
+    except FutureTimeoutError:
+        outcome.error = "Agent time budget exhausted"
+    except Exception:
+        outcome.error = job.error or "Tool failed"
+    finished = job.finished_at or time.time()
+    outcome.latency_ms = int((finished - job.created_at) * 1000)
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import contextvars
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from typing import Any, Dict
+from uuid import uuid4
+
+from app.admission import QueueFullError, retry_after
+from app.tool_runtime import ToolExecutionResult, execute_tool, validate_tool
+
+
+class ToolJobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+@dataclass
+class ToolJob:
+    id: str
+    language: str
+    code: str
+    timeout_seconds: int
+    status: ToolJobStatus = ToolJobStatus.queued
+    result: ToolExecutionResult | None = None
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    started: Future = field(default_factory=Future, repr=False, compare=False)
+    done: Future = field(default_factory=Future, repr=False, compare=False)
+
+    def payload(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "language": self.language,
+            "status": self.status,
+            "result": asdict(self.result) if self.result is not None else None,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ToolExecutor:
+    """Runs tool snippets on a dedicated, bounded thread pool.
+
+    At most ``workers`` snippets run at once and ``max_pending`` wait behind them; past that,
+    ``submit`` raises ``QueueFullError`` with a ``retry_after`` hint. Code is validated before
+    it is queued, so unsafe snippets fail fast. The last ``max_finished`` jobs stay pollable.
+    ``job.done`` resolves to the result or the tool's exception, so async callers can await it
+    without holding a thread.
+    """
+
+    def __init__(self, workers: int = 4, max_pending: int = 64, max_finished: int = 1024) -> None:
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self._workers = workers
+        self._max_pending = max_pending
+        self._max_finished = max_finished
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tool-worker")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, ToolJob] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._pending = 0
+        self._running = 0
+        self._avg_seconds = 0.0
+
+    def submit(self, language: str, code: str, timeout_seconds: int) -> ToolJob:
+        validate_tool(language, code)
+        job = ToolJob(id=str(uuid4()), language=language, code=code, timeout_seconds=timeout_seconds)
+        with self._lock:
+            if self._pending >= self._max_pending:
+                raise QueueFullError("Tool executor is full", retry_after=self._retry_after())
+            self._pending += 1
+            self._jobs[job.id] = job
+        # Carry the caller's trace context, so the run nests under the submitting span.
+        self._pool.submit(contextvars.copy_context().run, self._run, job)
+        return job
+
+    def get(self, job_id: str) -> ToolJob:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Tool job {job_id} not found")
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self._workers,
+                "running": self._running,
+                "pending": self._pending,
+                "max_pending": self._max_pending,
+                "avg_seconds": round(self._avg_seconds, 4),
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=False)
+
+    def _run(self, job: ToolJob) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+        job.status = ToolJobStatus.running
+        job.started_at = time.time()
+        job.started.set_result(job.status)
+        error: BaseException | None = None
+        try:
+            job.result = execute_tool(job.language, job.code, job.timeout_seconds)
+            job.status = ToolJobStatus.succeeded
+        except subprocess.TimeoutExpired as exc:
+            error, job.error = exc, f"Timed out after {job.timeout_seconds}s"
+        except FileNotFoundError as exc:
+            error, job.error = exc, f"Runtime not installed: {exc}"
+        except Exception as exc:
+            error, job.error = exc, str(exc)
+        if error is not None:
+            job.status = ToolJobStatus.failed
+        job.finished_at = time.time()
+        job.code = ""  # finished jobs stay pollable; their source does not need to
+        with self._lock:
+            self._running -= 1
+            elapsed = job.finished_at - job.started_at
+            self._avg_seconds = elapsed if not self._avg_seconds else 0.8 * self._avg_seconds + 0.2 * elapsed
+            self._finished[job.id] = None
+            while len(self._finished) > self._max_finished:
+                self._jobs.pop(self._finished.popitem(last=False)[0], None)
+        if error is not None:
+            job.done.set_exception(error)
+        else:
+            job.done.set_result(job.result)
+
+    def _retry_after(self) -> int:
+        return retry_after(self._pending, self._avg_seconds, self._workers)
@@ -1,11 +1,34 @@
 from __future__ import annotations
 
 import ast
+import hashlib
+import marshal
 import os
+import select
+import signal
 import subprocess
 import tempfile
-from dataclasses import dataclass
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import Dict, List
+
+from app.telemetry import telemetry
+from app.worker_pool import (
+    NodeWorkerPool,
+    PythonWorkerPool,
+    ResourceLimits,
+    RunResult,
+    node_pool_supported,
+    python_pool_supported,
+)
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
 
 
 class UnsafeCodeError(ValueError):
@@ -17,12 +40,24 @@ class ToolExecutionResult:
     stdout: str
     stderr: str
     exit_code: int
+    wall_time_ms: float = 0.0
+    cpu_time_ms: float = 0.0
+    peak_rss_kb: int = 0
+    truncated: bool = False
+
 
+def default_limits() -> ResourceLimits:
+    return ResourceLimits(
+        cpu_seconds=int(os.environ.get("AGENT_TOOL_CPU_SECONDS", "10")),
+        memory_bytes=int(os.environ.get("AGENT_TOOL_MEMORY_MB", "512")) * 1024 * 1024,
+        file_bytes=int(os.environ.get("AGENT_TOOL_FILE_MB", "16")) * 1024 * 1024,
+        max_output_bytes=int(os.environ.get("AGENT_TOOL_MAX_OUTPUT_KB", "1024")) * 1024,
+    )
 
-def _validate_python(code: str) -> None:
-    tree = ast.parse(code)
-    denied_names = {"__import__", "eval", "exec", "open", "compile", "input", "breakpoint"}
-    denied_modules = {
+
+_DENIED_NAMES = frozenset({"__import__", "eval", "exec", "open", "compile", "input", "breakpoint"})
+_DENIED_MODULES = frozenset(
+    {
         "os",
         "sys",
         "subprocess",
@@ -33,17 +68,122 @@ def _validate_python(code: str) -> None:
         "urllib",
         "requests",
     }
+)
+# Filename baked into cached bytecode; the warm worker runs it from a scratch dir holding script.py.
+_SCRIPT_NAME = "script.py"
+
 
-    for node in ast.walk(tree):
+def _check_safety(tree: ast.AST) -> None:
+    # One pass over an explicit stack, stopping at the first blocked node: generated snippets
+    # (long operator chains) nest deeper than a recursive visitor can follow.
+    stack = [tree]
+    while stack:
+        node = stack.pop()
         if isinstance(node, ast.Import):
             for alias in node.names:
-                if alias.name.split(".")[0] in denied_modules:
+                if alias.name.split(".")[0] in _DENIED_MODULES:
                     raise UnsafeCodeError(f"Import blocked: {alias.name}")
-        if isinstance(node, ast.ImportFrom):
-            if node.module and node.module.split(".")[0] in denied_modules:
+        elif isinstance(node, ast.ImportFrom):
+            if node.module and node.module.split(".")[0] in _DENIED_MODULES:
                 raise UnsafeCodeError(f"Import blocked: {node.module}")
-        if isinstance(node, ast.Name) and node.id in denied_names:
-            raise UnsafeCodeError(f"Name blocked: {node.id}")
+        elif isinstance(node, ast.Name):
+            if node.id in _DENIED_NAMES:
+                raise UnsafeCodeError(f"Name blocked: {node.id}")
+        # Reversed so children are visited in source order, reaching early violations first.
+        stack.extend(reversed(list(ast.iter_child_nodes(node))))
+
+
+@dataclass
+class _Verdict:
+    reason: str | None = None
+    bytecode: bytes | None = None
+
+    @property
+    def size(self) -> int:
+        return len(self.reason or "") + len(self.bytecode or b"")
+
+
+class _VerdictCache:
+    """LRU of safety verdicts keyed by the snippet's content hash, bounded by count and bytes."""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Verdict]" = OrderedDict()
+        self._bytes = 0
+        self._stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str) -> _Verdict | None:
+        with self._lock:
+            verdict = self._entries.get(key)
+            if verdict is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return verdict
+
+    def put(self, key: str, verdict: _Verdict) -> None:
+        if verdict.size > self._max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = verdict
+            self._bytes += verdict.size
+            while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "bytes": self._bytes}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_verdicts = _VerdictCache(
+    max_entries=int(os.environ.get("AGENT_SAFETY_CACHE_SIZE", "1024")),
+)
+
+
+def _check_python(code: str) -> _Verdict:
+    try:
+        tree = ast.parse(code)
+    except RecursionError as exc:
+        raise ValueError("Code is nested too deeply to parse") from exc
+    try:
+        _check_safety(tree)
+    except UnsafeCodeError as exc:
+        return _Verdict(reason=str(exc))
+    try:
+        bytecode = marshal.dumps(compile(tree, _SCRIPT_NAME, "exec"))
+    except (SyntaxError, RecursionError):
+        # Parses but does not compile (e.g. a top-level return): let the run report it as usual.
+        bytecode = None
+    return _Verdict(bytecode=bytecode)
+
+
+def _validate_python(code: str) -> bytes | None:
+    """Raise ``UnsafeCodeError`` for blocked snippets; return marshalled bytecode for safe ones.
+
+    Verdicts are cached by content hash, so resubmitting a snippet skips parsing, the AST walk
+    and compilation. Snippets that fail to parse are not cached.
+    """
+    key = hashlib.sha256(code.encode("utf-8")).hexdigest()
+    verdict = _verdicts.get(key)
+    if verdict is None:
+        verdict = _check_python(code)
+        _verdicts.put(key, verdict)
+    if verdict.reason is not None:
+        raise UnsafeCodeError(verdict.reason)
+    return verdict.bytecode
 
 
 def _safe_env() -> dict[str, str]:
@@ -51,25 +191,153 @@ def _safe_env() -> dict[str, str]:
     return allowed
 
 
-def execute_python(code: str, timeout_seconds: int) -> ToolExecutionResult:
-    _validate_python(code)
+_python_pool: PythonWorkerPool | None = None
+_node_pool: NodeWorkerPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_python_pool() -> PythonWorkerPool | None:
+    global _python_pool
+    if not python_pool_supported():
+        return None
+    with _pool_lock:
+        if _python_pool is None:
+            _python_pool = PythonWorkerPool(
+                env_factory=_safe_env,
+                size=int(os.environ.get("AGENT_PYTHON_POOL_SIZE", "2")),
+                max_runs=int(os.environ.get("AGENT_PYTHON_POOL_MAX_RUNS", "200")),
+            )
+        return _python_pool
+
+
+def get_node_pool() -> NodeWorkerPool | None:
+    global _node_pool
+    if not node_pool_supported():
+        return None
+    with _pool_lock:
+        if _node_pool is None:
+            _node_pool = NodeWorkerPool(
+                env_factory=_safe_env,
+                size=int(os.environ.get("AGENT_NODE_POOL_SIZE", "2")),
+                max_runs=int(os.environ.get("AGENT_NODE_POOL_MAX_RUNS", "500")),
+                memory_mb=int(os.environ.get("AGENT_NODE_POOL_MEMORY_MB", "128")),
+            )
+        return _node_pool
+
+
+def _rlimits(limits: ResourceLimits, address_space: bool) -> list[tuple[int, int]]:
+    if resource is None:
+        return []
+    pairs = [(resource.RLIMIT_CPU, limits.cpu_seconds), (resource.RLIMIT_FSIZE, limits.file_bytes)]
+    if address_space:
+        pairs.append((resource.RLIMIT_AS, limits.memory_bytes))
+    return [(name, value) for name, value in pairs if value > 0]
+
+
+def _run_subprocess(
+    command: List[str], cwd: str, timeout_seconds: float, limits: ResourceLimits, address_space: bool = True
+) -> RunResult:
+    """Run a cold sandbox process under rlimits, reading at most ``max_output_bytes`` per stream.
+
+    Output past the cap is drained and dropped, so a chatty snippet cannot grow this process.
+    """
+    rlimits = _rlimits(limits, address_space)
+
+    def apply_rlimits() -> None:
+        for name, value in rlimits:
+            # A hard CPU limit equal to the soft one is a silent SIGKILL; one second of slack
+            # lets SIGXCPU arrive first so the result can say why the run stopped.
+            resource.setrlimit(name, (value, value + 1 if name == resource.RLIMIT_CPU else value))
+
+    proc = subprocess.Popen(
+        command,
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=_safe_env(),
+        preexec_fn=apply_rlimits if rlimits else None,
+    )
+    stdout, stderr = bytearray(), bytearray()
+    streams = {proc.stdout.fileno(): stdout, proc.stderr.fileno(): stderr}
+    open_fds = list(streams)
+    cap = limits.max_output_bytes
+    truncated = False
+    deadline = time.monotonic() + timeout_seconds
+    try:
+        while open_fds:
+            remaining = deadline - time.monotonic()
+            ready = select.select(open_fds, [], [], remaining)[0] if remaining > 0 else []
+            if not ready:
+                proc.kill()
+                proc.wait()
+                raise subprocess.TimeoutExpired(cmd=command, timeout=timeout_seconds)
+            for fd in ready:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    open_fds.remove(fd)
+                    continue
+                buffer = streams[fd]
+                room = cap - len(buffer) if cap else len(chunk)
+                if room < len(chunk):
+                    truncated = True
+                buffer.extend(chunk[: max(room, 0)])
+        # Closing both pipes does not end the process, so the deadline still applies while it exits.
+        while True:
+            pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+            if pid:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                proc.kill()
+                proc.wait()
+                raise subprocess.TimeoutExpired(cmd=command, timeout=timeout_seconds)
+            time.sleep(min(0.01, remaining))
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+    return RunResult(
+        stdout=stdout.decode("utf-8", "replace"),
+        stderr=stderr.decode("utf-8", "replace"),
+        exit_code=proc.returncode,
+        cpu_time_ms=(usage.ru_utime + usage.ru_stime) * 1000,
+        peak_rss_kb=usage.ru_maxrss,
+        truncated=truncated,
+    )
+
+
+def _to_result(run: RunResult, started: float) -> ToolExecutionResult:
+    result = ToolExecutionResult(**asdict(run), wall_time_ms=(time.perf_counter() - started) * 1000)
+    if result.exit_code == -signal.SIGXCPU:
+        result.stderr += "CPU time limit exceeded\n"
+    return result
+
+
+def execute_python(
+    code: str, timeout_seconds: int, warm: bool = True, limits: ResourceLimits | None = None
+) -> ToolExecutionResult:
+    bytecode = _validate_python(code)
+    limits = limits or default_limits()
+    started = time.perf_counter()
+    pool = get_python_pool() if warm else None
+    if pool is not None:
+        return _to_result(pool.run(code, timeout_seconds, bytecode=bytecode, limits=limits), started)
     with tempfile.TemporaryDirectory(prefix="agent_py_") as temp_dir:
         script_path = Path(temp_dir) / "script.py"
         script_path.write_text(code, encoding="utf-8")
+        run = _run_subprocess(["python3", "-I", "-B", str(script_path)], temp_dir, timeout_seconds, limits)
+        return _to_result(run, started)
 
-        completed = subprocess.run(
-            ["python3", "-I", "-B", str(script_path)],
-            cwd=temp_dir,
-            capture_output=True,
-            text=True,
-            timeout=timeout_seconds,
-            check=False,
-            env=_safe_env(),
-        )
-        return ToolExecutionResult(completed.stdout, completed.stderr, completed.returncode)
 
-
-def execute_javascript(code: str, timeout_seconds: int) -> ToolExecutionResult:
+def execute_javascript(
+    code: str, timeout_seconds: int, warm: bool = True, limits: ResourceLimits | None = None
+) -> ToolExecutionResult:
+    limits = limits or default_limits()
+    started = time.perf_counter()
+    pool = get_node_pool() if warm else None
+    if pool is not None:
+        return _to_result(pool.run(code, timeout_seconds, limits=limits), started)
     with tempfile.TemporaryDirectory(prefix="agent_js_") as temp_dir:
         script_path = Path(temp_dir) / "script.mjs"
         prelude = """
@@ -80,21 +348,37 @@ const fetch = undefined;
 """
         script_path.write_text(prelude + "\n" + code, encoding="utf-8")
 
-        completed = subprocess.run(
-            ["node", "--disallow-code-generation-from-strings", str(script_path)],
-            cwd=temp_dir,
-            capture_output=True,
-            text=True,
-            timeout=timeout_seconds,
-            check=False,
-            env=_safe_env(),
-        )
-        return ToolExecutionResult(completed.stdout, completed.stderr, completed.returncode)
+        # V8 reserves far more address space than it uses, so memory is capped by heap size
+        # rather than RLIMIT_AS.
+        command = ["node", "--disallow-code-generation-from-strings", str(script_path)]
+        if limits.memory_bytes:
+            command.insert(1, f"--max-old-space-size={max(limits.memory_bytes // (1024 * 1024), 16)}")
+        run = _run_subprocess(command, temp_dir, timeout_seconds, limits, address_space=False)
+        return _to_result(run, started)
 
 
-def execute_tool(language: str, code: str, timeout_seconds: int) -> ToolExecutionResult:
+def validate_tool(language: str, code: str) -> None:
     if language == "python":
-        return execute_python(code, timeout_seconds)
-    if language == "javascript":
-        return execute_javascript(code, timeout_seconds)
-    raise ValueError(f"Unsupported language: {language}")
+        _validate_python(code)
+    elif language != "javascript":
+        raise ValueError(f"Unsupported language: {language}")
+
+
+def execute_tool(language: str, code: str, timeout_seconds: int) -> ToolExecutionResult:
+    if language not in ("python", "javascript"):
+        raise ValueError(f"Unsupported language: {language}")
+    outcome = "error"
+    try:
+        with telemetry.span("tool.execute", language=language) as span:
+            if language == "python":
+                result = execute_python(code, timeout_seconds)
+            else:
+                result = execute_javascript(code, timeout_seconds)
+            span.attributes.update(exit_code=result.exit_code, cpu_time_ms=round(result.cpu_time_ms, 3))
+            outcome = "ok" if result.exit_code == 0 else "nonzero_exit"
+    except subprocess.TimeoutExpired:
+        outcome = "timeout"
+        raise
+    finally:
+        telemetry.inc("agent_tool_runs_total", language=language, outcome=outcome)
+    return result
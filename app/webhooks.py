@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import ipaddress
+import json
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable
+from urllib.parse import urlparse
+
+SIGNATURE_HEADER = "X-Agent-Signature"
+
+
+class CallbackURLError(ValueError):
+    pass
+
+
+def validate_callback_url(url: str, allowed_hosts: Iterable[str] = ()) -> None:
+    """Refuse callback URLs that would make the server POST into its own network.
+
+    Hosts in ``allowed_hosts`` are trusted as-is; any other host must resolve only to public
+    addresses, not loopback, private, link-local (cloud metadata) or reserved ones.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise CallbackURLError(f"Invalid callback_url: {url!r} (expected an http or https URL)")
+    host = parsed.hostname.lower()
+    if host in allowed_hosts:
+        return
+    try:
+        infos = socket.getaddrinfo(host, parsed.port or 80, proto=socket.IPPROTO_TCP)
+    except (OSError, ValueError) as exc:
+        raise CallbackURLError(f"Invalid callback_url: {url!r} ({exc})") from exc
+    for *_, sockaddr in infos:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if not address.is_global or address.is_multicast:
+            raise CallbackURLError(f"callback_url {url!r} resolves to a non-public address ({address})")
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    # A redirect could point an allowed callback at an internal address; treat it as a failure.
+    def redirect_request(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+
+class WebhookDispatcher:
+    """POSTs JSON event payloads to callback URLs from a small thread pool.
+
+    Connection errors, 5xx and 429 responses are retried up to ``retries`` times with
+    exponential backoff; other 4xx responses are not. With a ``secret``, each body is signed
+    with HMAC-SHA256 in the ``X-Agent-Signature: sha256=<hex>`` header. At most ``max_pending``
+    deliveries wait or run at once; past that, new ones are dropped and counted in ``stats()``.
+    Callback URLs must pass :func:`validate_callback_url` against ``allowed_hosts``, both when
+    a task is admitted and again before delivery; redirects are not followed.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        timeout: float = 5.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        secret: str | None = None,
+        max_pending: int = 1000,
+        allowed_hosts: Iterable[str] = (),
+    ) -> None:
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="webhook")
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._secret = secret.encode("utf-8") if secret else None
+        self._max_pending = max_pending
+        self._allowed_hosts = frozenset(host.strip().lower() for host in allowed_hosts if host.strip())
+        self._opener = urllib.request.build_opener(_NoRedirects)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats: Dict[str, int] = {"delivered": 0, "failed": 0, "retries": 0, "dropped": 0}
+
+    def send(self, url: str, payload: Dict[str, Any]) -> Future:
+        """Queue a delivery; the future resolves to whether it was acknowledged with a 2xx.
+
+        A slow or dead receiver must not let the backlog grow without bound, so when
+        ``max_pending`` deliveries are outstanding this one is dropped and resolves to False.
+        """
+        with self._lock:
+            if self._pending >= self._max_pending:
+                self._stats["dropped"] += 1
+                dropped: Future = Future()
+                dropped.set_result(False)
+                return dropped
+            self._pending += 1
+        body = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+        return self._pool.submit(self._deliver_pending, url, body)
+
+    def check_url(self, url: str) -> None:
+        validate_callback_url(url, self._allowed_hosts)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "pending": self._pending}
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+    def _deliver_pending(self, url: str, body: bytes) -> bool:
+        try:
+            return self._deliver(url, body)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _deliver(self, url: str, body: bytes) -> bool:
+        try:
+            # Checked again here: the host may resolve differently than it did at admission.
+            self.check_url(url)
+        except CallbackURLError:
+            with self._lock:
+                self._stats["failed"] += 1
+            return False
+        headers = {"Content-Type": "application/json", "User-Agent": "local-agent-builder-webhook"}
+        if self._secret is not None:
+            headers[SIGNATURE_HEADER] = "sha256=" + hmac.new(self._secret, body, hashlib.sha256).hexdigest()
+        for attempt in range(self._retries + 1):
+            if attempt:
+                with self._lock:
+                    self._stats["retries"] += 1
+                time.sleep(self._backoff * 2 ** (attempt - 1))
+            request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+            try:
+                with self._opener.open(request, timeout=self._timeout):
+                    pass
+            except urllib.error.HTTPError as exc:
+                exc.close()
+                if exc.code < 500 and exc.code != 429:
+                    break
+            except OSError:
+                continue
+            else:
+                with self._lock:
+                    self._stats["delivered"] += 1
+                return True
+        with self._lock:
+            self._stats["failed"] += 1
+        return False
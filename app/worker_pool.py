@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import json
+import os
+import queue
+import select
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+_HEADER = struct.Struct(">I")
+_PYTHON_WORKER = Path(__file__).resolve().with_name("_python_worker.py")
+_NODE_WORKER = Path(__file__).resolve().with_name("_node_worker.js")
+# Slack on top of the run timeout for the worker to kill its run and reply.
+_RESPONSE_GRACE_SECONDS = 2.0
+_REPLY_FIELDS = {"stdout": str, "stderr": str, "exit_code": int, "timed_out": bool}
+
+
+class WorkerCrashedError(RuntimeError):
+    pass
+
+
+@dataclass
+class ResourceLimits:
+    """Per-run caps for sandboxed tools; 0 disables a cap."""
+
+    cpu_seconds: int = 0
+    memory_bytes: int = 0
+    file_bytes: int = 0
+    max_output_bytes: int = 0
+
+
+@dataclass
+class RunResult:
+    stdout: str
+    stderr: str
+    exit_code: int
+    cpu_time_ms: float = 0.0
+    peak_rss_kb: int = 0
+    truncated: bool = False
+
+    @classmethod
+    def from_reply(cls, reply: Dict[str, Any]) -> "RunResult":
+        return cls(
+            stdout=reply["stdout"],
+            stderr=reply["stderr"],
+            exit_code=reply["exit_code"],
+            cpu_time_ms=reply.get("cpu_time_ms", 0.0),
+            peak_rss_kb=reply.get("peak_rss_kb", 0),
+            truncated=reply.get("truncated", False),
+        )
+
+
+def python_pool_supported() -> bool:
+    return hasattr(os, "fork") and _PYTHON_WORKER.exists()
+
+
+def node_pool_supported() -> bool:
+    return shutil.which("node") is not None and _NODE_WORKER.exists()
+
+
+class _Worker:
+    def __init__(self, command: List[str], env: Dict[str, str]) -> None:
+        self.runs = 0
+        self.proc = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=env,
+            cwd=tempfile.gettempdir(),
+        )
+
+    def request(self, message: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        body = json.dumps(message).encode("utf-8")
+        try:
+            self.proc.stdin.write(_HEADER.pack(len(body)) + body)
+            self.proc.stdin.flush()
+        except OSError as exc:
+            raise WorkerCrashedError(f"worker is gone: {exc}") from exc
+        deadline = time.monotonic() + timeout
+        header = self._read_exact(_HEADER.size, deadline)
+        return json.loads(self._read_exact(_HEADER.unpack(header)[0], deadline))
+
+    def _read_exact(self, size: int, deadline: float) -> bytes:
+        fd = self.proc.stdout.fileno()
+        chunks: List[bytes] = []
+        while size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise subprocess.TimeoutExpired(cmd=self.proc.args, timeout=remaining)
+            chunk = os.read(fd, size)
+            if not chunk:
+                raise WorkerCrashedError(f"worker exited unexpectedly (code {self.proc.wait()})")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def kill(self) -> None:
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        for stream in (self.proc.stdin, self.proc.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class WorkerPool:
+    """A fixed set of pre-started sandbox worker processes speaking length-prefixed JSON.
+
+    A worker is replaced (off the request path) after ``max_runs`` requests, after a request
+    that timed out, or when it dies.
+    """
+
+    def __init__(
+        self,
+        command: List[str],
+        env_factory: Callable[[], Dict[str, str]],
+        size: int = 2,
+        max_runs: int = 200,
+    ) -> None:
+        if size < 1:
+            raise ValueError("size must be >= 1")
+        self._command = command
+        self._env_factory = env_factory
+        self._max_runs = max_runs
+        self._idle: "queue.LifoQueue[_Worker]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def request(self, message: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        worker = self._idle.get()
+        healthy = False
+        try:
+            reply = worker.request(message, timeout=timeout + _RESPONSE_GRACE_SECONDS)
+            # A malformed reply means the worker's own state was tampered with; it is not reused.
+            if not isinstance(reply, dict) or any(
+                not isinstance(reply.get(key), kind) for key, kind in _REPLY_FIELDS.items()
+            ):
+                raise WorkerCrashedError("worker sent a malformed reply")
+            worker.runs += 1
+            healthy = not reply.get("timed_out") and worker.runs < self._max_runs and worker.alive()
+            return reply
+        finally:
+            self._release(worker, healthy)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+    def _release(self, worker: _Worker, healthy: bool) -> None:
+        if healthy:
+            self._idle.put(worker)
+            return
+        worker.kill()
+        # Replace off the request path so the next caller still finds a warm interpreter.
+        threading.Thread(target=self._replace, daemon=True).start()
+
+    def _replace(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+        self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._command, self._env_factory())
+
+
+class PythonWorkerPool(WorkerPool):
+    """Fork-server interpreters for ``execute_python``.
+
+    Every run gets a fresh scratch directory and executes in a child forked from a worker
+    that never runs user code, under the same ``-I -B`` flags and sanitised environment as the
+    cold path.
+    """
+
+    def __init__(
+        self,
+        env_factory: Callable[[], Dict[str, str]],
+        size: int = 2,
+        max_runs: int = 200,
+        python: str = sys.executable,
+    ) -> None:
+        super().__init__([python, "-I", "-B", str(_PYTHON_WORKER)], env_factory, size=size, max_runs=max_runs)
+
+    def run(
+        self,
+        code: str,
+        timeout_seconds: float,
+        bytecode: bytes | None = None,
+        limits: ResourceLimits | None = None,
+    ) -> RunResult:
+        """Run ``code``; ``bytecode`` is its marshalled code object, which skips the compile step.
+
+        It must come from this interpreter version (``python`` defaults to ``sys.executable``).
+        ``limits`` are applied as rlimits of the forked child.
+        """
+        with tempfile.TemporaryDirectory(prefix="agent_py_") as temp_dir:
+            script_path = Path(temp_dir) / "script.py"
+            script_path.write_text(code, encoding="utf-8")
+            message: Dict[str, Any] = {
+                "path": str(script_path),
+                "cwd": temp_dir,
+                "timeout": timeout_seconds,
+                "limits": asdict(limits or ResourceLimits()),
+            }
+            if bytecode is not None:
+                bytecode_path = Path(temp_dir) / "script.bin"
+                bytecode_path.write_bytes(bytecode)
+                message["bytecode"] = str(bytecode_path)
+            reply = self.request(message, timeout_seconds)
+        if reply["timed_out"]:
+            raise subprocess.TimeoutExpired(cmd=["python3", str(script_path)], timeout=timeout_seconds)
+        return RunResult.from_reply(reply)
+
+
+class NodeWorkerPool(WorkerPool):
+    """Long-lived Node processes for ``execute_javascript``.
+
+    Each run evaluates in a fresh ``vm`` context whose only global beyond the JS built-ins is a
+    captured ``console`` (no ``process``, ``require``, ``global`` or ``fetch``), with string code
+    generation disabled and a per-run timeout. ``memory_mb`` caps each worker's heap; a worker
+    that runs out of memory crashes and is replaced. Runs are synchronous, so a CPU limit is
+    enforced as a tighter run timeout.
+    """
+
+    def __init__(
+        self,
+        env_factory: Callable[[], Dict[str, str]],
+        size: int = 2,
+        max_runs: int = 500,
+        memory_mb: int = 128,
+    ) -> None:
+        command = [
+            "node",
+            "--disallow-code-generation-from-strings",
+            f"--max-old-space-size={memory_mb}",
+            str(_NODE_WORKER),
+        ]
+        super().__init__(command, env_factory, size=size, max_runs=max_runs)
+
+    def run(self, code: str, timeout_seconds: float, limits: ResourceLimits | None = None) -> RunResult:
+        limits = limits or ResourceLimits()
+        if limits.cpu_seconds:
+            timeout_seconds = min(timeout_seconds, limits.cpu_seconds)
+        message = {
+            "code": code,
+            "filename": "script.js",
+            "timeout_ms": int(timeout_seconds * 1000),
+            "max_output_bytes": limits.max_output_bytes,
+        }
+        try:
+            reply = self.request(message, timeout_seconds)
+        except WorkerCrashedError as exc:
+            return RunResult("", f"JavaScript worker crashed (possibly out of memory): {exc}\n", 1)
+        if reply["timed_out"]:
+            raise subprocess.TimeoutExpired(cmd=["node", "script.js"], timeout=timeout_seconds)
+        return RunResult.from_reply(reply)
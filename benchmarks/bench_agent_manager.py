@@ -0,0 +1,88 @@
+"""AgentManager contention benchmark.
+
+Each thread drives its own agent with a read-heavy mix (append, recent-history page, definition
+lookup) for a fixed duration, and the aggregate ops/s is reported per thread count. The
+``global-lock`` rows wrap every call in one process-wide lock, as AgentManager used to, to show
+what the per-agent locking buys.
+
+    python -m benchmarks.bench_agent_manager --threads 1 2 4 8 --seconds 2
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.agent_manager import AgentManager
+from app.conversation_store import InMemoryConversationStore, SQLiteConversationStore
+from app.models import CreateAgentRequest
+
+
+class _GlobalLockManager:
+    def __init__(self, inner: AgentManager) -> None:
+        self._inner = inner
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        method = getattr(self._inner, name)
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return method(*args, **kwargs)
+
+        return locked
+
+
+def _drive(manager, agent_id: str, deadline: float, counts: list[int], slot: int) -> None:
+    ops = 0
+    while time.perf_counter() < deadline:
+        manager.add_message(agent_id, "user", "benchmark message body")
+        manager.get_history(agent_id, limit=50)
+        manager.get_agent(agent_id)
+        ops += 3
+    counts[slot] = ops
+
+
+def run(threads: int, seconds: float, backend: str, global_lock: bool, data_dir: Path) -> float:
+    if backend == "sqlite":
+        store = SQLiteConversationStore(data_dir / f"bench-{threads}-{int(global_lock)}.db")
+    else:
+        store = InMemoryConversationStore()
+    manager = AgentManager(store=store)
+    agent_ids = [manager.create_agent(CreateAgentRequest(name=f"bench-{i}")).id for i in range(threads)]
+    target = _GlobalLockManager(manager) if global_lock else manager
+
+    counts = [0] * threads
+    deadline = time.perf_counter() + seconds
+    workers = [
+        threading.Thread(target=_drive, args=(target, agent_ids[i], deadline, counts, i)) for i in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    store.close()
+    return sum(counts) / seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--backend", choices=["memory", "sqlite"], nargs="+", default=["memory", "sqlite"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_agent_manager_") as tmp:
+        print(f"{'backend':<8} {'locking':<12} {'threads':>7} {'ops/s':>12}")
+        for backend in args.backend:
+            for global_lock in (True, False):
+                for threads in args.threads:
+                    ops = run(threads, args.seconds, backend, global_lock, Path(tmp))
+                    locking = "global-lock" if global_lock else "per-agent"
+                    print(f"{backend:<8} {locking:<12} {threads:>7} {ops:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
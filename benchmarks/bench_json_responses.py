@@ -0,0 +1,90 @@
+"""Serialization and compression cost of a large GET /agents/{id}/history response.
+
+Builds a ``--messages`` history and times encoding it the way the route used to (``model_dump``
+per message, then FastAPI's ``jsonable_encoder`` and ``json.dumps``) against ``dump_json``,
+then compresses the encoded body with gzip and, when ``zstandard`` is installed, zstd. The
+last rows time the whole route through the ASGI stack with and without ``Accept-Encoding``.
+
+    python -m benchmarks.bench_json_responses --messages 100000
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Callable
+
+from fastapi.encoders import jsonable_encoder
+
+from app.agent_manager import AgentManager
+from app.models import CreateAgentRequest
+from app.responses import dump_json, zstandard
+
+_WORDS = "the agent reads the history and writes a short answer about the task at hand".split()
+
+
+def _median_ms(call: Callable[[], Any], runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _row(label: str, ms: float, size: int) -> None:
+    print(f"{label:<28} {ms:>10.1f} {size / 2**20:>10.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    manager = AgentManager()
+    agent_id = manager.create_agent(CreateAgentRequest(name="bench")).id
+    for n in range(args.messages):
+        content = " ".join(_WORDS[(n + i) % len(_WORDS)] for i in range(8 + n % 30))
+        manager.add_message(agent_id, "user" if n % 2 == 0 else "assistant", content)
+    messages = manager.get_history(agent_id)
+
+    def legacy() -> bytes:
+        content = jsonable_encoder([m.model_dump() for m in messages])
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    body = dump_json(messages)
+    assert json.loads(body) == json.loads(legacy())
+    print(f"{'step':<28} {'median ms':>10} {'MiB':>10}")
+    _row("model_dump + json.dumps", _median_ms(legacy, args.runs), len(legacy()))
+    _row("dump_json", _median_ms(lambda: dump_json(messages), args.runs), len(body))
+    _row("gzip level 6", _median_ms(lambda: gzip.compress(body, 6, mtime=0), args.runs), len(gzip.compress(body, 6)))
+    if zstandard is not None:
+        zstd = zstandard.ZstdCompressor(level=3)
+        _row("zstd level 3", _median_ms(lambda: zstd.compress(body), args.runs), len(zstd.compress(body)))
+    else:
+        print("zstandard is not installed; skipping zstd")
+
+    # The route reads from app.main's own store, so fill that one through the API module.
+    os.environ["AGENT_DATA_DIR"] = tempfile.mkdtemp(prefix="agent_bench_")
+    from fastapi.testclient import TestClient
+
+    import app.main as main
+
+    api_agent = main.manager.create_agent(CreateAgentRequest(name="bench")).id
+    for message in messages:
+        main.manager.add_message(api_agent, message.role, message.content)
+    client = TestClient(main.app)
+    for label, encoding in (("GET history (identity)", "identity"), ("GET history (gzip)", "gzip")):
+        url = f"/agents/{api_agent}/history"
+        response = client.get(url, headers={"Accept-Encoding": encoding})
+        size = int(response.headers["content-length"])
+        _row(label, _median_ms(lambda: client.get(url, headers={"Accept-Encoding": encoding}), args.runs), size)
+
+
+if __name__ == "__main__":
+    main()
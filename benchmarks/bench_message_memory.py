@@ -0,0 +1,81 @@
+"""Resident memory of in-memory conversation history.
+
+Appends ``--messages`` messages (uuid ids, a mix of roles, 40-200 characters of content) to
+one agent and reports the memory held afterwards, measured with tracemalloc. The ``objects``
+row keeps every message as a pydantic ``ConversationMessage`` plus an id -> seq dict, as
+``InMemoryConversationStore`` used to; ``columnar`` is the current store.
+
+    python -m benchmarks.bench_message_memory --messages 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+from uuid import uuid4
+
+from app.context import estimate_tokens
+from app.conversation_store import InMemoryConversationStore
+from app.models import ConversationMessage
+
+_ROLES = ("user", "assistant")
+_WORDS = "the agent reads the history and writes a short answer about the task at hand".split()
+
+
+def _message(n: int) -> ConversationMessage:
+    content = " ".join(_WORDS[(n + i) % len(_WORDS)] for i in range(8 + n % 30))
+    return ConversationMessage(role=_ROLES[n % 2], content=content, id=uuid4().hex, tokens=estimate_tokens(content))
+
+
+class _ObjectLog:
+    def __init__(self) -> None:
+        self.messages: List[ConversationMessage] = []
+        self.ids: Dict[str, int] = {}
+
+    def append(self, message: ConversationMessage) -> None:
+        message.seq = len(self.messages) + 1
+        self.ids[message.id] = message.seq
+        self.messages.append(message)
+
+
+def measure(build: Callable[[], object], count: int) -> tuple[float, float, object]:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    holder = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / count, elapsed, holder
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    args = parser.parse_args()
+    count = args.messages
+
+    def objects() -> _ObjectLog:
+        log = _ObjectLog()
+        for n in range(count):
+            log.append(_message(n))
+        return log
+
+    def columnar() -> InMemoryConversationStore:
+        store = InMemoryConversationStore()
+        for n in range(count):
+            store.append("agent", _message(n))
+        return store
+
+    print(f"{'layout':<9} {'messages':>10} {'bytes/msg':>10} {'total MiB':>10} {'append s':>9}")
+    for label, build in (("objects", objects), ("columnar", columnar)):
+        per_message, elapsed, holder = measure(build, count)
+        print(f"{label:<9} {count:>10,} {per_message:>10.1f} {per_message * count / 2**20:>10.1f} {elapsed:>9.2f}")
+        del holder
+
+
+if __name__ == "__main__":
+    main()
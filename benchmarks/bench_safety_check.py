@@ -0,0 +1,113 @@
+"""Cost of the Python safety check on large generated snippets.
+
+Compares the previous check (``ast.parse`` + full ``ast.walk``), the single-pass check, an
+uncached ``_validate_python`` (the check plus compiling the bytecode the warm pool then skips),
+and a verdict cache hit (hash lookup only). Snippets are ``--functions`` generated functions
+and one ``--terms``-long ``1 + 1 + ...`` expression, which nests one AST level per term.
+
+    python -m benchmarks.bench_safety_check --functions 2000 --terms 500 --runs 20
+"""
+from __future__ import annotations
+
+import argparse
+import ast
+import statistics
+import time
+from typing import Callable
+
+from app.tool_runtime import (
+    _DENIED_MODULES,
+    _DENIED_NAMES,
+    UnsafeCodeError,
+    _check_safety,
+    _validate_python,
+    _verdicts,
+)
+
+
+def generate_snippet(functions: int) -> str:
+    lines = ["import math", "import json", ""]
+    for index in range(functions):
+        lines.extend(
+            [
+                f"def step_{index}(values):",
+                "    total = 0",
+                "    for i, value in enumerate(values):",
+                f"        total += math.sqrt(abs(value)) * {index} + i",
+                "    return json.dumps({'total': total})",
+                "",
+            ]
+        )
+    lines.append("print(step_0([1, 2, 3]))")
+    return "\n".join(lines)
+
+
+def walk_check(code: str) -> None:
+    for node in ast.walk(ast.parse(code)):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name.split(".")[0] in _DENIED_MODULES:
+                    raise UnsafeCodeError(f"Import blocked: {alias.name}")
+        if isinstance(node, ast.ImportFrom):
+            if node.module and node.module.split(".")[0] in _DENIED_MODULES:
+                raise UnsafeCodeError(f"Import blocked: {node.module}")
+        if isinstance(node, ast.Name) and node.id in _DENIED_NAMES:
+            raise UnsafeCodeError(f"Name blocked: {node.id}")
+
+
+def single_pass_check(code: str) -> None:
+    _check_safety(ast.parse(code))
+
+
+def uncached_check(code: str) -> None:
+    _verdicts.clear()
+    _validate_python(code)
+
+
+def cached_check(code: str) -> None:
+    _validate_python(code)
+
+
+def measure(check: Callable[[str], None], code: str, runs: int) -> list[float]:
+    _verdicts.clear()
+    try:
+        _validate_python(code)  # primes the cache for cached_check
+    except UnsafeCodeError:
+        pass
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        try:
+            check(code)
+        except UnsafeCodeError:
+            pass
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", type=int, default=2000)
+    parser.add_argument("--terms", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    safe = generate_snippet(args.functions)
+    # A violation near the top: the single pass stops there, ast.walk still builds its whole queue.
+    blocked = "import os\n" + safe
+    chain = "x = " + " + ".join(["1"] * args.terms) + "\nprint(x)"
+    print(f"snippet: {len(safe.splitlines())} lines, {len(safe) / 1024:.0f} KiB")
+    print(f"{'check':<22} {'snippet':<8} {'p50 ms':>9} {'mean ms':>9}")
+    for name, code in (("safe", safe), ("blocked", blocked), ("chain", chain)):
+        for label, check in (
+            ("ast.walk", walk_check),
+            ("single pass", single_pass_check),
+            ("single pass+compile", uncached_check),
+            ("verdict cache hit", cached_check),
+        ):
+            samples = measure(check, code, args.runs)
+            print(f"{label:<22} {name:<8} {statistics.median(samples):>9.2f} {statistics.fmean(samples):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Cold vs warm latency of ``execute_python`` and ``execute_javascript``.
+
+The cold paths write a script and start ``python3 -I -B`` / ``node`` per call; the warm paths
+hand the snippet to a pre-started worker (a fork-server for Python, a vm-context runner for
+Node). Reports p50/p99 wall time per path.
+
+    python -m benchmarks.bench_tool_runtime --runs 200
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+
+from app.tool_runtime import execute_javascript, execute_python, get_node_pool, get_python_pool
+
+SNIPPETS = {
+    "python": (execute_python, "total = sum(i * i for i in range(1000))\nprint(total)"),
+    "js": (execute_javascript, "let total = 0; for (let i = 0; i < 1000; i++) total += i * i; console.log(total);"),
+}
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(language: str, runs: int, warm: bool) -> list[float]:
+    execute, snippet = SNIPPETS[language]
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = execute(snippet, timeout_seconds=5, warm=warm)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert result.exit_code == 0, result.stderr
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    # Start the workers outside the measured region.
+    pools = {"python": get_python_pool(), "js": get_node_pool()}
+    print(f"{'language':<9} {'path':<6} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for language in SNIPPETS:
+        for label, warm in (("cold", False), ("warm", True)):
+            if warm and pools[language] is None:
+                continue
+            samples = measure(language, args.runs, warm)
+            print(
+                f"{language:<9} {label:<6} {statistics.median(samples):>9.2f} "
+                f"{percentile(samples, 99):>9.2f} {statistics.fmean(samples):>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Reproducible benchmark suite with JSON results and baseline comparison.
+
+Scenarios (all model calls go to the built-in stub adapters, so no provider is needed):
+
+  api_tasks      POST /tasks and POST /tasks:batch enqueue rate, end-to-end completion throughput
+  agent_manager  10k agents, a 100k-message history, history reads at that size
+  tools          /tools/execute warm latency vs the cold subprocess path, per language
+  router         ModelRouter.generate per-call overhead over the bare adapter call
+
+Every scenario runs ``--repeat`` times and each metric keeps its median, which damps the
+run-to-run noise of a shared machine. Each metric records its unit and whether higher is
+better. With ``--baseline`` the run is compared metric by metric and exits non-zero if any
+moved the wrong way by more than ``--tolerance``; ``--update-baseline`` writes the results
+as the new baseline instead. ``--quick`` shrinks every scenario for a smoke run. Baselines
+are only comparable on the same machine and with the same ``--quick`` setting.
+
+    python -m benchmarks.suite --output bench.json --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --scenario router tools --quick
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from benchmarks.bench_tool_runtime import percentile
+
+Metrics = Dict[str, Dict[str, Any]]
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+
+def _metric(value: float, unit: str, higher_is_better: bool) -> Dict[str, Any]:
+    return {"value": float(f"{value:.4g}"), "unit": unit, "higher_is_better": higher_is_better}
+
+
+def _latencies(samples: List[float], prefix: str) -> Metrics:
+    return {
+        f"{prefix}_p50_ms": _metric(statistics.median(samples), "ms", False),
+        f"{prefix}_p99_ms": _metric(percentile(samples, 99), "ms", False),
+    }
+
+
+def _timed(call: Callable[[], Any], runs: int) -> List[float]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _per_call_us(call: Callable[[], Any], runs: int) -> float:
+    # Mean over a tight loop: calls this short are below the resolution of per-call timing.
+    for _ in range(runs // 10):
+        call()
+    start = time.perf_counter()
+    for _ in range(runs):
+        call()
+    return (time.perf_counter() - start) / runs * 1e6
+
+
+def _load_app(data_dir: str):
+    # app.main builds its stores at import time, under AGENT_DATA_DIR.
+    os.environ["AGENT_DATA_DIR"] = data_dir
+    from fastapi.testclient import TestClient
+
+    import app.main as main
+
+    return main, TestClient(main.app)
+
+
+def bench_api_tasks(quick: bool, data_dir: str) -> Metrics:
+    tasks = 200 if quick else 2000
+    main, client = _load_app(data_dir)
+    # Spread over several agents: each task's context includes its agent's growing history,
+    # which would exhaust a single agent's token budget.
+    agent_ids = [
+        client.post("/agents", json={"name": f"bench-{i}", "budget_tokens": 10_000_000}).json()["id"]
+        for i in range(16)
+    ]
+
+    ids: List[str] = []
+    samples = []
+    start = time.perf_counter()
+    for n in range(tasks):
+        sent = time.perf_counter()
+        response = client.post("/tasks", json={"agent_id": agent_ids[n % 16], "prompt": f"task {n}"})
+        samples.append((time.perf_counter() - sent) * 1000)
+        ids.append(response.json()["id"])
+    enqueue_seconds = time.perf_counter() - start
+    if not main.queue.wait_for(ids, timeout=300):
+        raise RuntimeError("tasks did not finish")
+    single_seconds = time.perf_counter() - start
+
+    batch = [{"agent_id": agent_ids[n % 16], "prompt": f"batched {n}"} for n in range(100)]
+    start = time.perf_counter()
+    batch_ids: List[str] = []
+    for _ in range(tasks // 40):
+        batch_ids += [task["id"] for task in client.post("/tasks:batch", json={"tasks": batch}).json()["tasks"]]
+    batch_seconds = time.perf_counter() - start
+    if not main.queue.wait_for(batch_ids, timeout=300):
+        raise RuntimeError("batched tasks did not finish")
+    return {
+        "enqueue_per_s": _metric(tasks / enqueue_seconds, "req/s", True),
+        **_latencies(samples, "enqueue"),
+        "completed_per_s": _metric(tasks / single_seconds, "tasks/s", True),
+        "batch_enqueue_per_s": _metric(len(batch_ids) / batch_seconds, "tasks/s", True),
+    }
+
+
+def bench_agent_manager(quick: bool, data_dir: str) -> Metrics:
+    from app.agent_manager import AgentManager
+    from app.models import CreateAgentRequest
+
+    agents = 1000 if quick else 10_000
+    messages = 10_000 if quick else 100_000
+    manager = AgentManager()
+
+    start = time.perf_counter()
+    agent_ids = [manager.create_agent(CreateAgentRequest(name=f"agent-{i}")).id for i in range(agents)]
+    create_seconds = time.perf_counter() - start
+    lookup_us = _per_call_us(lambda: manager.get_agent(agent_ids[len(agent_ids) // 2]), 20_000)
+
+    target = agent_ids[0]
+    start = time.perf_counter()
+    for n in range(messages):
+        manager.add_message(target, "user" if n % 2 == 0 else "assistant", f"message body number {n}")
+    append_seconds = time.perf_counter() - start
+
+    length = manager.history_length(target)
+    recent_us = _per_call_us(lambda: manager.get_history(target, offset=length - 50, limit=50), 5000)
+    start = time.perf_counter()
+    read = sum(len(page) for page in manager.iter_history(target, page_size=500))
+    scan_seconds = time.perf_counter() - start
+    assert read == messages
+    return {
+        "create_agents_per_s": _metric(agents / create_seconds, "ops/s", True),
+        "get_agent_us": _metric(lookup_us, "us", False),
+        "append_messages_per_s": _metric(messages / append_seconds, "ops/s", True),
+        "recent_page_us": _metric(recent_us, "us", False),
+        "full_scan_messages_per_s": _metric(messages / scan_seconds, "msgs/s", True),
+    }
+
+
+def bench_tools(quick: bool, data_dir: str) -> Metrics:
+    from app.tool_runtime import get_node_pool, get_python_pool
+    from benchmarks.bench_tool_runtime import SNIPPETS, measure
+
+    runs = 20 if quick else 100
+    _, client = _load_app(data_dir)
+    pools = {"python": get_python_pool(), "js": get_node_pool()}
+    languages = {"python": "python", "js": "javascript"}
+    metrics: Metrics = {}
+    for key, (_, snippet) in SNIPPETS.items():
+        if pools[key] is None:
+            print(f"skipping {key}: no warm pool on this machine", file=sys.stderr)
+            continue
+        body = {"language": languages[key], "code": snippet, "timeout_seconds": 5}
+        client.post("/tools/execute", json=body)  # start the worker outside the measured region
+        warm = _timed(lambda: client.post("/tools/execute", json=body).raise_for_status(), runs)
+        metrics.update(_latencies(warm, f"{key}_api_warm"))
+        metrics.update(_latencies(measure(key, max(runs // 4, 5), warm=False), f"{key}_cold"))
+    return metrics
+
+
+def bench_router(quick: bool, data_dir: str) -> Metrics:
+    from app.interoperability import AdapterRegistry, ModelRouter
+    from app.models import ConversationMessage, ModelConfig, ProviderType, UnifiedGenerateRequest
+
+    runs = 2000 if quick else 20_000
+    registry = AdapterRegistry()
+    router = ModelRouter(registry)
+    messages = [ConversationMessage(role="user", content="benchmark prompt " * 20)]
+    request = UnifiedGenerateRequest(
+        model=ModelConfig(provider=ProviderType.openai_compatible, model="local/default"), messages=messages
+    )
+    adapter = registry.get_adapter(ProviderType.openai_compatible)
+
+    bare = _per_call_us(lambda: adapter.generate(model="local/default", messages=messages), runs)
+    routed = _per_call_us(lambda: router.generate(request), runs)
+    return {
+        "adapter_call_us": _metric(bare, "us", False),
+        "generate_call_us": _metric(routed, "us", False),
+        "generate_overhead_us": _metric(routed - bare, "us", False),
+    }
+
+
+SCENARIOS: Dict[str, Callable[[bool, str], Metrics]] = {
+    "api_tasks": bench_api_tasks,
+    "agent_manager": bench_agent_manager,
+    "tools": bench_tools,
+    "router": bench_router,
+}
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Lines describing each metric against the baseline; regressions are prefixed ``REGRESSION``."""
+    lines = []
+    for name, current in sorted(results["metrics"].items()):
+        previous = baseline.get("metrics", {}).get(name)
+        if previous is None or not previous["value"]:
+            continue
+        change = current["value"] / previous["value"] - 1
+        worse = -change if current["higher_is_better"] else change
+        status = "REGRESSION" if worse > tolerance else "ok"
+        lines.append(
+            f"{status:<10} {name:<42} {previous['value']:>12.4g} -> {current['value']:>12.4g} "
+            f"{current['unit']:<7} ({change:+.1%})"
+        )
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=list(SCENARIOS), nargs="+", default=list(SCENARIOS))
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario; the median is kept")
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown (default 0.25)")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "quick": args.quick,
+            "repeat": args.repeat,
+        },
+        "metrics": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="agent_bench_") as data_dir:
+        for name in args.scenario:
+            runs: List[Metrics] = []
+            for attempt in range(args.repeat):
+                print(f"running {name} ({attempt + 1}/{args.repeat})...", file=sys.stderr)
+                runs.append(SCENARIOS[name](args.quick, data_dir))
+            for metric, value in runs[0].items():
+                median = statistics.median(run[metric]["value"] for run in runs if metric in run)
+                results["metrics"][f"{name}.{metric}"] = {**value, "value": median}
+
+    rendered = json.dumps(results, indent=2) + "\n"
+    if args.output:
+        args.output.write_text(rendered, encoding="utf-8")
+    if args.update_baseline:
+        args.baseline.write_text(rendered, encoding="utf-8")
+        print(f"wrote baseline {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(rendered)
+        return
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if baseline["meta"].get("quick") != args.quick:
+        print("baseline was recorded with a different --quick setting; not comparing", file=sys.stderr)
+        return
+    lines = compare(results, baseline, args.tolerance)
+    print("\n".join(lines))
+    if any(line.startswith("REGRESSION") for line in lines):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
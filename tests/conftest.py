@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Keep the app's on-disk state out of the working tree while the suite runs.
+os.environ.setdefault("AGENT_DATA_DIR", tempfile.mkdtemp(prefix="agent_test_data_"))
@@ -1,5 +1,10 @@
+import sqlite3
+import threading
+from uuid import uuid4
+
 from app.agent_manager import AgentManager
-from app.models import CreateAgentRequest
+from app.conversation_store import InMemoryConversationStore, SQLiteConversationStore
+from app.models import ConversationMessage, CreateAgentRequest
 
 
 def test_create_and_clear_history() -> None:
@@ -11,3 +16,114 @@ def test_create_and_clear_history() -> None:
 
     manager.clear_history(agent.id)
     assert manager.get_history(agent.id) == []
+
+
+def test_sqlite_store_persists_agents_and_pages_history(tmp_path) -> None:
+    store = SQLiteConversationStore(tmp_path / "conversations.db")
+    manager = AgentManager(store=store)
+    agent = manager.create_agent(CreateAgentRequest(name="durable"))
+    for i in range(25):
+        manager.add_message(agent.id, "user", f"m{i}")
+    store.close()
+
+    reopened = AgentManager(store=SQLiteConversationStore(tmp_path / "conversations.db"))
+    assert [a.id for a in reopened.list_agents()] == [agent.id]
+    assert reopened.history_length(agent.id) == 25
+    assert [m.content for m in reopened.get_history(agent.id, offset=20, limit=3)] == ["m20", "m21", "m22"]
+    pages = list(reopened.iter_history(agent.id, page_size=10))
+    assert [len(p) for p in pages] == [10, 10, 5]
+    assert pages[-1][-1].content == "m24"
+
+
+def test_reads_do_not_wait_for_another_agents_writer() -> None:
+    manager = AgentManager()
+    busy = manager.create_agent(CreateAgentRequest(name="busy"))
+    idle = manager.create_agent(CreateAgentRequest(name="idle"))
+    manager.add_message(idle.id, "user", "hello")
+
+    done = threading.Event()
+    with manager._agents[busy.id].lock:  # simulate a long write in progress on another agent
+        reader = threading.Thread(
+            target=lambda: (manager.get_history(idle.id), manager.get_history(busy.id), manager.list_agents(), done.set())
+        )
+        reader.start()
+        assert done.wait(timeout=1)
+    reader.join()
+
+
+def test_concurrent_appends_to_different_agents_are_all_recorded() -> None:
+    manager = AgentManager()
+    agents = [manager.create_agent(CreateAgentRequest(name=f"a{i}")) for i in range(8)]
+
+    def write(agent_id: str) -> None:
+        for i in range(200):
+            manager.add_message(agent_id, "user", str(i))
+
+    threads = [threading.Thread(target=write, args=(a.id,)) for a in agents]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for agent in agents:
+        assert manager.history_length(agent.id) == 200
+        assert [m.content for m in manager.get_history(agent.id)] == [str(i) for i in range(200)]
+
+
+def test_message_ids_are_stable_and_seqs_survive_clear(tmp_path) -> None:
+    for store in (None, SQLiteConversationStore(tmp_path / "conversations.db")):
+        manager = AgentManager(store=store)
+        agent = manager.create_agent(CreateAgentRequest(name="seq"))
+        first = manager.add_message(agent.id, "user", "a")
+        second = manager.add_message(agent.id, "assistant", "b")
+        assert (first.seq, second.seq) == (1, 2)
+        assert manager.message_seq(agent.id, second.id) == 2
+        assert [m.content for m in manager.get_history(agent.id, after_seq=1)] == ["b"]
+
+        manager.clear_history(agent.id)
+        assert manager.add_message(agent.id, "user", "c").seq == 3
+
+
+def test_failed_sqlite_append_rolls_back_and_leaves_the_store_usable(tmp_path) -> None:
+    store = SQLiteConversationStore(tmp_path / "conversations.db")
+    store.append("a", ConversationMessage(role="user", content="one", id=uuid4().hex))
+    store._conn.execute(
+        "CREATE TRIGGER reject BEFORE INSERT ON messages WHEN NEW.content = 'bad' BEGIN SELECT RAISE(ABORT, 'nope'); END"
+    )
+    try:
+        store.append("a", ConversationMessage(role="user", content="bad", id=uuid4().hex))
+    except sqlite3.IntegrityError:
+        pass
+    else:
+        raise AssertionError("the trigger should have rejected the message")
+    assert not store._conn.in_transaction
+
+    # The seq bump was rolled back together with the rejected insert.
+    assert store.append("a", ConversationMessage(role="user", content="two", id=uuid4().hex)).seq == 2
+    assert [m.content for m in store.read("a")] == ["one", "two"]
+    store.close()
+
+
+def test_in_memory_store_round_trips_messages_through_its_columnar_log() -> None:
+    store = InMemoryConversationStore()
+    originals = [
+        ConversationMessage(role="user", content="héllo ✓", id=uuid4().hex, tokens=2),
+        ConversationMessage(role="critic", content="", id="not-a-uuid"),
+        ConversationMessage(role="assistant", content="plain", id=None, tokens=None),
+    ]
+    for message in originals:
+        store.append("a", message.model_copy())
+
+    stored = store.read("a")
+    assert [(m.role, m.content, m.id, m.tokens) for m in stored] == [
+        (m.role, m.content, m.id, m.tokens) for m in originals
+    ]
+    assert [m.seq for m in stored] == [1, 2, 3]
+    assert [m.seq for m in store.read("a", after_seq=1, limit=1)] == [2]
+    assert store.seq_of("a", originals[0].id) == 1
+    assert store.seq_of("a", "not-a-uuid") == 2
+    assert store.seq_of("a", uuid4().hex) is None
+
+    store.clear("a")
+    assert store.count("a") == 0
+    assert store.append("a", ConversationMessage(role="user", content="again")).seq == 4
+    assert [m.content for m in store.read("a", after_seq=3)] == ["again"]
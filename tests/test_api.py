@@ -1,8 +1,9 @@
+import json
 import time
 
 from fastapi.testclient import TestClient
 
-from app.main import app
+from app.main import app, manager
 
 
 def test_api_agent_history_tasks_and_model_routes() -> None:
@@ -52,3 +53,146 @@ def test_api_agent_history_tasks_and_model_routes() -> None:
 
     cleared = client.delete(f"/agents/{agent_id}/history").json()
     assert cleared["status"] == "cleared"
+
+
+def test_model_search_filters_by_capability_and_context() -> None:
+    client = TestClient(app)
+    search = client.get("/models/search", params={"capability": ["tool_calling", "streaming"], "min_context": 100_000})
+    assert search.status_code == 200
+    assert [m["model"] for m in search.json()["models"]] == ["gpt-4.1-mini"]
+
+
+def test_batch_enqueue_and_task_queries_with_long_poll() -> None:
+    client = TestClient(app)
+    agent_id = client.post("/agents", json={"name": "batcher"}).json()["id"]
+
+    batch = client.post(
+        "/tasks:batch", json={"tasks": [{"agent_id": agent_id, "prompt": f"job {n}"} for n in range(3)]}
+    )
+    assert batch.status_code == 200
+    batch_ids = [task["id"] for task in batch.json()["tasks"]]
+    assert client.post("/tasks:batch", json={"tasks": [{"agent_id": "nope", "prompt": "x"}]}).status_code == 404
+
+    polled = client.post("/tasks:query", json={"ids": batch_ids + ["nope"], "wait_for": "all", "timeout_seconds": 5})
+    body = polled.json()
+    assert not body["timed_out"]
+    assert [task["id"] for task in body["tasks"]] == batch_ids
+    assert {task["status"] for task in body["tasks"]} == {"completed"}
+    assert body["missing"] == ["nope"]
+    listed = client.get("/tasks", params={"agent_id": agent_id, "status": ["completed"], "limit": 2}).json()
+    assert len(listed["tasks"]) == 2
+    assert client.get("/tasks", params={"wait_for": "any"}).status_code == 400
+
+
+def test_agent_event_stream_resumes_from_last_event_id() -> None:
+    client = TestClient(app)
+    agent_id = client.post("/agents", json={"name": "watched"}).json()["id"]
+    task_id = client.post("/tasks", json={"agent_id": agent_id, "prompt": "observe me"}).json()["id"]
+
+    events = client.get(f"/agents/{agent_id}/events", params={"long_poll": True}, headers={"Last-Event-ID": "0"})
+    lines = events.text.splitlines()
+    assert lines[0].startswith("id: ") and lines[1] == "event: status"
+    first = json.loads(lines[2].removeprefix("data: "))
+    assert (first["task_id"], first["status"]) == (task_id, "queued")
+    assert client.get("/agents/nope/events").status_code == 404
+    for callback_url in ("nope", "http://127.0.0.1:8000/admin", "http://169.254.169.254/latest/meta-data"):
+        bad_hook = client.post("/tasks", json={"agent_id": agent_id, "prompt": "x", "callback_url": callback_url})
+        assert bad_hook.status_code == 422
+
+
+def test_metrics_endpoint_serves_prometheus_text() -> None:
+    client = TestClient(app)
+    agent_id = client.post("/agents", json={"name": "measured"}).json()["id"]
+    task_id = client.post("/tasks", json={"agent_id": agent_id, "prompt": "count me"}).json()["id"]
+    assert client.post("/tasks:query", json={"ids": [task_id], "wait_for": "all"}).json()["timed_out"] is False
+
+    scraped = client.get("/metrics")
+    assert scraped.headers["content-type"].startswith("text/plain")
+    assert "agent_queue_depth" in scraped.text
+    assert 'agent_tasks_total{status="completed"}' in scraped.text
+
+
+def test_history_pagination_since_and_ndjson_stream() -> None:
+    client = TestClient(app)
+    agent_id = client.post("/agents", json={"name": "pager"}).json()["id"]
+    for i in range(5):
+        manager.add_message(agent_id, "user", f"m{i}")
+
+    first = client.get(f"/agents/{agent_id}/history", params={"limit": 2})
+    assert [m["content"] for m in first.json()] == ["m0", "m1"]
+    assert all(m["id"] and m["seq"] for m in first.json())
+    cursor = first.headers["X-Next-Cursor"]
+
+    second = client.get(f"/agents/{agent_id}/history", params={"limit": 2, "cursor": cursor})
+    assert [m["content"] for m in second.json()] == ["m2", "m3"]
+
+    since = client.get(f"/agents/{agent_id}/history", params={"since": second.json()[-1]["id"]})
+    assert [m["content"] for m in since.json()] == ["m4"]
+    assert "X-Next-Cursor" not in since.headers
+
+    streamed = client.get(f"/agents/{agent_id}/history", params={"format": "ndjson", "offset": 1})
+    assert streamed.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert [m["content"] for m in lines] == ["m1", "m2", "m3", "m4"]
+
+    missing = client.get(f"/agents/{agent_id}/history", params={"since": "nope"})
+    assert missing.status_code == 404
+
+
+def _sse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_generate_and_task_output_stream_as_server_sent_events() -> None:
+    client = TestClient(app)
+    streamed = client.post(
+        "/models/generate",
+        params={"stream": "true"},
+        json={
+            "model": {"provider": "openai_compatible", "model": "local/default"},
+            "messages": [{"role": "user", "content": "stream these words please"}],
+            "use_cache": False,
+        },
+    )
+    assert streamed.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(streamed.text)
+    deltas = [data["delta"] for name, data in events if name == "delta"]
+    assert len(deltas) > 1
+    name, done = events[-1]
+    assert name == "done"
+    assert "".join(deltas) == done["response"]["output_text"]
+    assert done["response"]["metadata"]["time_to_first_token_ms"] is not None
+
+    agent_id = client.post("/agents", json={"name": "streamer"}).json()["id"]
+    task_id = client.post("/tasks", json={"agent_id": agent_id, "prompt": "hello stream"}).json()["id"]
+    events = _sse_events(client.get(f"/tasks/{task_id}/stream").text)
+    assert events[-1][0] == "done"
+    final = events[-1][1]
+    assert final["status"] == "completed"
+    assert "".join(data["delta"] for name, data in events if name == "delta") == final["result"]
+    assert final["first_token_ms"] is not None
+
+
+def test_tool_execution_sync_and_job_modes() -> None:
+    client = TestClient(app)
+
+    executed = client.post("/tools/execute", json={"language": "python", "code": "print(6 * 7)"})
+    assert executed.status_code == 200
+    assert executed.json()["stdout"] == "42\n"
+    assert client.post("/tools/execute", json={"language": "python", "code": "import os"}).status_code == 400
+
+    submitted = client.post("/tools/jobs", json={"language": "python", "code": "print('later')"})
+    assert submitted.status_code == 202
+    job_id = submitted.json()["id"]
+
+    with client.stream("GET", f"/tools/jobs/{job_id}/stream") as response:
+        body = "".join(response.iter_text())
+    done = json.loads(body.split("event: done\ndata: ")[1].split("\n")[0])
+    assert (done["status"], done["result"]["stdout"]) == ("succeeded", "later\n")
+    assert client.get(f"/tools/jobs/{job_id}").json()["status"] == "succeeded"
+    assert client.get("/tools/jobs/missing").status_code == 404
@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.batching import MicroBatcher
+from app.interoperability import AdapterRegistry, ModelRouter, ProviderAdapter
+from app.models import ConversationMessage, ModelConfig, ProviderType, UnifiedGenerateRequest
+
+
+class _CountingAdapter(ProviderAdapter):
+    def __init__(self) -> None:
+        super().__init__(provider=ProviderType.openai_compatible)
+        self.batch_sizes: list[int] = []
+        self.lock = threading.Lock()
+
+    def generate_batch(self, model, batch):
+        with self.lock:
+            self.batch_sizes.append(len(batch))
+        if any(messages[-1].content == "boom" for messages in batch):
+            raise RuntimeError("provider down")
+        return super().generate_batch(model, batch)
+
+
+def _request(text: str, **kwargs) -> UnifiedGenerateRequest:
+    return UnifiedGenerateRequest(
+        model=ModelConfig(provider=ProviderType.openai_compatible, model="local/default", **kwargs.pop("config", {})),
+        messages=[ConversationMessage(role="user", content=text)],
+        use_cache=False,
+        **kwargs,
+    )
+
+
+def test_concurrent_generates_are_coalesced_and_fanned_out() -> None:
+    adapter = _CountingAdapter()
+    registry = AdapterRegistry()
+    registry._adapters[ProviderType.openai_compatible] = adapter
+    batcher = MicroBatcher(window_ms=50, max_batch=4)
+    router = ModelRouter(registry, batcher=batcher)
+    try:
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            outputs = list(pool.map(lambda i: router.generate(_request(f"q{i}")).output_text, range(6)))
+        assert outputs == [f"[openai_compatible:local/default] q{i}" for i in range(6)]
+        # Full batches go out immediately; the remainder waits for the window.
+        assert sorted(adapter.batch_sizes) == [2, 4]
+
+        async def gather():
+            return await asyncio.gather(*(router.agenerate(_request(f"a{i}")) for i in range(3)))
+
+        responses = asyncio.run(gather())
+        assert [r.metadata["batched"] for r in responses] == [True] * 3
+        assert adapter.batch_sizes[-1] == 3
+
+        # Bypasses: an explicit opt-out and the fast latency tier go straight to the adapter.
+        before = len(adapter.batch_sizes)
+        assert "batched" not in router.generate(_request("direct", allow_batching=False)).metadata
+        assert "batched" not in router.generate(_request("fast", config={"latency_tier": "fast"})).metadata
+        assert len(adapter.batch_sizes) == before
+
+        with pytest.raises(RuntimeError, match="provider down"):
+            router.generate(_request("boom"))
+        stats = batcher.stats()
+        assert stats["requests"] == 10 and stats["max_size"] == 4
+    finally:
+        batcher.close()
+
+
+def test_batcher_dispatches_after_window_without_a_full_batch() -> None:
+    adapter = _CountingAdapter()
+    batcher = MicroBatcher(window_ms=20, max_batch=100)
+    try:
+        start = time.perf_counter()
+        future = batcher.submit(adapter, "m", [ConversationMessage(role="user", content="solo")])
+        assert future.result(timeout=2) == "[openai_compatible:m] solo"
+        assert 0.015 <= time.perf_counter() - start < 1
+    finally:
+        batcher.close()
@@ -0,0 +1,43 @@
+import json
+import os
+
+from app.capability_catalog import CapabilityCatalog, capabilities_in, capability_mask
+from app.models import Capability, CapabilityProfile, ProviderType
+
+
+def _profile(model: str, context: int, *capabilities: Capability) -> dict:
+    return {"provider": "openai", "model": model, "context_length": context, "capabilities": list(capabilities)}
+
+
+def test_find_uses_capability_bitsets_and_context_floor() -> None:
+    catalog = CapabilityCatalog()
+    catalog.add(CapabilityProfile.model_validate(_profile("long-tools", 200_000, "tool_calling", "streaming")))
+
+    wanted = [Capability.tool_calling, Capability.streaming]
+    assert [p.model for p in catalog.find(wanted)] == ["long-tools", "gpt-4.1-mini"]
+    assert [p.model for p in catalog.find(wanted, min_context=150_000)] == ["long-tools"]
+    assert catalog.find([Capability.vision]) == []
+    assert len(catalog.find()) == 3
+
+    local = catalog.get("local/default")
+    assert catalog.missing(local, wanted) == [Capability.tool_calling]
+    assert capabilities_in(capability_mask(wanted)) == [Capability.tool_calling, Capability.streaming]
+
+
+def test_catalog_file_is_hot_reloaded_and_bad_edits_are_ignored(tmp_path) -> None:
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps({"profiles": [_profile("file-model", 32_000, "vision")]}), encoding="utf-8")
+    catalog = CapabilityCatalog(path=path, reload_interval=0)
+    assert [p.model for p in catalog.find([Capability.vision])] == ["file-model"]
+    assert catalog.get("gpt-4.1-mini") is not None
+
+    path.write_text(json.dumps([_profile("file-model", 64_000, "vision", "audio")]), encoding="utf-8")
+    os.utime(path, (1, 1))
+    assert catalog.find([Capability.vision, Capability.audio])[0].context_length == 64_000
+    version = catalog.info()["version"]
+
+    path.write_text("{not json", encoding="utf-8")
+    os.utime(path, (2, 2))
+    assert catalog.get("file-model").provider == ProviderType.openai
+    info = catalog.info()
+    assert info["version"] == version and "Invalid catalog" in info["last_error"]
@@ -0,0 +1,54 @@
+from app.agent_manager import AgentManager
+from app.context import ContextWindowBuilder
+from app.models import CapabilityProfile, CreateAgentRequest, ProviderType
+
+
+def _profile(context_length: int, max_output_tokens: int = 0) -> CapabilityProfile:
+    return CapabilityProfile(
+        provider=ProviderType.openai_compatible,
+        model="test",
+        context_length=context_length,
+        max_output_tokens=max_output_tokens,
+    )
+
+
+def test_window_trims_oldest_turns_to_fit_the_model_budget() -> None:
+    manager = AgentManager()
+    agent = manager.create_agent(CreateAgentRequest(name="ctx", system_prompt="be brief"))
+    for i in range(10):
+        manager.add_message(agent.id, "user", f"turn {i} four tokens")
+
+    # 2 system + 1 prompt tokens leave 12 tokens = the 3 newest turns.
+    window = ContextWindowBuilder(manager).build(agent, "next", _profile(context_length=20, max_output_tokens=5))
+    contents = [m.content for m in window.messages]
+    assert contents[0] == "be brief"
+    assert "7 earlier messages omitted" in contents[1]
+    assert contents[2:] == ["turn 7 four tokens", "turn 8 four tokens", "turn 9 four tokens", "next"]
+    assert window.tokens == 15
+    assert window.dropped == 7
+
+
+def test_window_only_reads_new_messages_and_resets_after_clear() -> None:
+    manager = AgentManager()
+    agent = manager.create_agent(CreateAgentRequest(name="ctx"))
+    builder = ContextWindowBuilder(manager)
+    manager.add_message(agent.id, "user", "hello")
+    builder.build(agent, "p", _profile(1000))
+
+    reads: list[int] = []
+    original = manager.iter_history
+
+    def counting_iter_history(agent_id, page_size=500, after_seq=0):
+        for page in original(agent_id, page_size=page_size, after_seq=after_seq):
+            reads.append(len(page))
+            yield page
+
+    manager.iter_history = counting_iter_history
+    manager.add_message(agent.id, "assistant", "world")
+    window = builder.build(agent, "p", _profile(1000))
+    assert reads == [1]
+    assert [m.content for m in window.messages] == ["", "hello", "world", "p"]
+
+    manager.clear_history(agent.id)
+    window = builder.build(agent, "p", _profile(1000))
+    assert [m.content for m in window.messages] == ["", "p"]
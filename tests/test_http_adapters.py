@@ -0,0 +1,168 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.http_adapters import AnthropicMessagesAdapter, HTTPPoolConfig, OpenAIChatAdapter
+from app.interoperability import AdapterRegistry, ModelRouter, ProviderError
+from app.models import ConversationMessage, ModelConfig, ProviderType, UnifiedGenerateRequest
+
+
+class _StubProvider(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0.0) -> None:
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.delay = delay
+        self.connections: set[int] = set()
+        self.active = 0
+        self.max_active = 0
+        self.bodies: list[dict] = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        server: _StubProvider = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.connections.add(self.client_address[1])
+            server.bodies.append(body)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+
+        if self.path == "/chat/completions" and body.get("stream"):
+            words = body["messages"][-1]["content"].split(" ")
+            chunks = [w + " " for w in words[:-1]] + words[-1:]
+            events = [{"choices": [{"delta": {"content": c}}]} for c in chunks]
+            payload = "".join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+            self._reply(payload.encode(), "text/event-stream")
+            return
+        if self.path == "/chat/completions":
+            reply = {"choices": [{"message": {"content": f"echo:{body['messages'][-1]['content']}"}}]}
+        elif self.path == "/v1/messages":
+            reply = {"content": [{"type": "text", "text": f"claude:{body['messages'][-1]['content']}"}]}
+        else:
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._reply(json.dumps(reply).encode(), "application/json")
+
+    def _reply(self, payload: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def stub_server():
+    server = _StubProvider()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _messages(text: str = "hi") -> list[ConversationMessage]:
+    return [ConversationMessage(role="system", content="sys"), ConversationMessage(role="user", content=text)]
+
+
+def test_sync_adapter_reuses_one_keep_alive_connection(stub_server) -> None:
+    adapter = OpenAIChatAdapter(ProviderType.openai_compatible, stub_server.url)
+    try:
+        outputs = [adapter.generate("m", _messages(str(i))) for i in range(5)]
+    finally:
+        adapter.close()
+    assert outputs == [f"echo:{i}" for i in range(5)]
+    assert len(stub_server.connections) == 1
+
+
+def test_async_adapter_respects_concurrency_limit(stub_server) -> None:
+    stub_server.delay = 0.05
+    adapter = OpenAIChatAdapter(
+        ProviderType.openai_compatible, stub_server.url, pool=HTTPPoolConfig(max_concurrency=2)
+    )
+
+    async def run() -> list[str]:
+        try:
+            return await asyncio.gather(*(adapter.agenerate("m", _messages(str(i))) for i in range(6)))
+        finally:
+            await adapter.aclose()
+
+    assert asyncio.run(run()) == [f"echo:{i}" for i in range(6)]
+    assert stub_server.max_active == 2
+
+
+def test_anthropic_adapter_moves_system_prompt_out_of_messages(stub_server) -> None:
+    adapter = AnthropicMessagesAdapter(ProviderType.anthropic, stub_server.url)
+    try:
+        assert adapter.generate("claude", _messages("yo")) == "claude:yo"
+    finally:
+        adapter.close()
+    body = stub_server.bodies[-1]
+    assert body["system"] == "sys"
+    assert [m["role"] for m in body["messages"]] == ["user"]
+
+
+def test_router_uses_base_url_adapter_and_surfaces_provider_errors(stub_server) -> None:
+    router = ModelRouter(AdapterRegistry(endpoints=[stub_server.url + "/"]))
+    request = UnifiedGenerateRequest(
+        model=ModelConfig(provider=ProviderType.openai_compatible, model="local/default", base_url=stub_server.url),
+        messages=_messages("routed"),
+    )
+    assert asyncio.run(router.agenerate(request)).output_text == "echo:routed"
+
+    broken = request.model_copy(
+        update={"model": ModelConfig(provider=ProviderType.generic_rest, model="x", base_url=stub_server.url)}
+    )
+    with pytest.raises(ProviderError):
+        router.generate(broken)
+
+
+def test_router_refuses_base_urls_outside_the_allowlist(stub_server, monkeypatch) -> None:
+    monkeypatch.setenv("OPENAI_COMPATIBLE_API_KEY", "sk-server-secret")
+    router = ModelRouter(AdapterRegistry())
+    request = UnifiedGenerateRequest(
+        model=ModelConfig(provider=ProviderType.openai_compatible, model="local/default", base_url=stub_server.url),
+        messages=_messages("leak?"),
+    )
+    with pytest.raises(ValueError):
+        router.generate(request)
+    with pytest.raises(ValueError):
+        asyncio.run(router.agenerate(request))
+    assert stub_server.bodies == []
+
+
+def test_openai_adapter_streams_server_sent_chunks(stub_server) -> None:
+    adapter = OpenAIChatAdapter(ProviderType.openai_compatible, stub_server.url)
+
+    async def collect() -> list[str]:
+        try:
+            return [chunk async for chunk in adapter.astream("m", _messages("a b c"))]
+        finally:
+            await adapter.aclose()
+
+    try:
+        assert list(adapter.stream("m", _messages("a b c"))) == ["a ", "b ", "c"]
+    finally:
+        adapter.close()
+    assert asyncio.run(collect()) == ["a ", "b ", "c"]
@@ -2,6 +2,7 @@ import pytest
 
 from app.interoperability import AdapterRegistry, ModelRouter
 from app.models import Capability, ConversationMessage, ModelConfig, ProviderType, UnifiedGenerateRequest
+from app.tool_calls import parse_tool_calls
 
 
 def test_capability_fallback_routes_to_stronger_model() -> None:
@@ -28,3 +29,11 @@ def test_capability_strict_mode_raises() -> None:
                 allow_auto_downgrade=False,
             )
         )
+
+
+def test_tool_calls_are_parsed_from_json_replies() -> None:
+    fenced = '```json\n{"tool_calls": [{"name": "python", "arguments": "{\\"code\\": \\"print(1)\\"}"}, {"id": 3}]}\n```'
+    calls = parse_tool_calls(fenced)
+    assert [(c.id, c.name, c.arguments) for c in calls] == [("call_1", "python", {"code": "print(1)"})]
+    assert parse_tool_calls("The answer is {1, 2}") == []
+    assert parse_tool_calls('{"tool_calls": "nope"}') == []
@@ -0,0 +1,81 @@
+import time
+
+from app.interoperability import AdapterRegistry, ModelRouter
+from app.models import ConversationMessage, ModelConfig, ProviderType, UnifiedGenerateRequest
+from app.response_cache import ResponseCache, request_cache_key
+
+
+def _request(content: str = "hello", **kwargs) -> UnifiedGenerateRequest:
+    return UnifiedGenerateRequest(
+        model=ModelConfig(provider=ProviderType.openai_compatible, model="local/default"),
+        messages=[ConversationMessage(role="user", content=content)],
+        **kwargs,
+    )
+
+
+class _CountingRegistry(AdapterRegistry):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = 0
+        adapter = self._adapters[ProviderType.openai_compatible]
+        original = adapter.generate
+
+        def counting(model, messages):
+            self.calls += 1
+            return original(model=model, messages=messages)
+
+        adapter.generate = counting
+
+
+def test_router_serves_identical_requests_from_cache_and_honours_opt_out() -> None:
+    registry = _CountingRegistry()
+    router = ModelRouter(registry, cache=ResponseCache())
+
+    first = router.generate(_request())
+    second = router.generate(_request())
+    assert registry.calls == 1
+    assert first.metadata["cache"]["status"] == "miss"
+    assert second.metadata["cache"]["status"] == "hit"
+    assert second.output_text == first.output_text
+
+    bypass = router.generate(_request(use_cache=False))
+    assert registry.calls == 2
+    assert bypass.metadata["cache"]["status"] == "bypass"
+
+
+def test_cache_key_ignores_message_bookkeeping_fields() -> None:
+    plain = _request()
+    stored = _request()
+    stored.messages[0].id, stored.messages[0].seq = "abc", 7
+    assert request_cache_key(plain) == request_cache_key(stored)
+    assert request_cache_key(plain) != request_cache_key(_request("other"))
+
+
+def test_cache_evicts_by_count_bytes_and_ttl(tmp_path) -> None:
+    router = ModelRouter(AdapterRegistry())
+    response = router.generate(_request())
+
+    cache = ResponseCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, response)
+    assert cache.get("a") is None and cache.get("c") is not None
+
+    small = ResponseCache(max_bytes=len(response.model_dump_json()) + 1)
+    small.put("a", response)
+    small.put("b", response)
+    assert small.stats()["entries"] == 1
+
+    expiring = ResponseCache(ttl_seconds=0.01, disk_dir=tmp_path)
+    expiring.put("a", response)
+    time.sleep(0.02)
+    assert expiring.get("a") is None
+
+
+def test_disk_tier_survives_a_new_cache_instance(tmp_path) -> None:
+    response = ModelRouter(AdapterRegistry()).generate(_request())
+    ResponseCache(disk_dir=tmp_path).put("k", response)
+
+    fresh = ResponseCache(disk_dir=tmp_path)
+    hit = fresh.get("k")
+    assert hit is not None and hit.output_text == response.output_text
+    assert fresh.stats()["disk_hits"] == 1
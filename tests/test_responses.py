@@ -0,0 +1,73 @@
+import gzip
+import json
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.agent_manager import AgentManager
+from app.main import app, manager
+from app.models import CreateAgentRequest
+from app.responses import CompressionMiddleware, JSONBytesResponse, dump_json
+from app.task_store import TaskStatus
+
+
+def test_dump_json_matches_model_dump_for_models_lists_and_plain_payloads() -> None:
+    agents = AgentManager()
+    agent = agents.create_agent(CreateAgentRequest(name="json"))
+    agents.add_message(agent.id, "user", "héllo")
+    history = agents.get_history(agent.id)
+
+    assert json.loads(dump_json(history)) == [m.model_dump() for m in history]
+    assert json.loads(dump_json(agent)) == json.loads(agent.model_dump_json())
+    assert json.loads(dump_json({"status": TaskStatus.completed, "models": history})) == {
+        "status": "completed",
+        "models": [m.model_dump() for m in history],
+    }
+    assert dump_json([]) == b"[]"
+    assert JSONBytesResponse(b'{"a":1}').body == b'{"a":1}'
+
+
+def test_large_history_is_gzipped_only_when_accepted() -> None:
+    client = TestClient(app)
+    agent_id = client.post("/agents", json={"name": "big-history"}).json()["id"]
+    for n in range(200):
+        manager.add_message(agent_id, "user", f"message number {n} with some repeated text")
+
+    compressed = client.get(f"/agents/{agent_id}/history", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["vary"]
+    assert len(compressed.json()) == 200
+    assert int(compressed.headers["content-length"]) < len(compressed.content)
+
+    plain = client.get(f"/agents/{agent_id}/history", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.json() == compressed.json()
+
+    small = client.get(f"/agents/{agent_id}/history", params={"limit": 1}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert small.headers["x-next-cursor"] == "1"
+
+
+def test_streamed_responses_pass_through_uncompressed() -> None:
+    inner = FastAPI()
+
+    @inner.get("/stream")
+    def stream():
+        return StreamingResponse(iter(["x" * 4096, "y" * 4096]), media_type="application/x-ndjson")
+
+    @inner.get("/plain")
+    def plain():
+        return JSONBytesResponse({"data": "z" * 4096})
+
+    middleware = CompressionMiddleware(inner, minimum_size=100)
+    assert middleware.negotiate("gzip;q=0, identity") is None
+    client = TestClient(middleware)
+    streamed = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in streamed.headers
+    assert streamed.text == "x" * 4096 + "y" * 4096
+
+    with client.stream("GET", "/plain", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        raw = b"".join(response.iter_raw())
+    assert json.loads(gzip.decompress(raw)) == {"data": "z" * 4096}
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from app.interoperability import AdapterRegistry, ModelRouter, ProviderAdapter
+from app.models import (
+    Capability,
+    CapabilityProfile,
+    ConversationMessage,
+    ModelConfig,
+    ProviderType,
+    UnifiedGenerateRequest,
+)
+from app.routing import RoutingEngine
+from app.telemetry import telemetry
+
+
+class _SleepyAdapter(ProviderAdapter):
+    def generate(self, model, messages):
+        if model == "slow-model":
+            time.sleep(0.5)
+        return f"{model} answered"
+
+    async def agenerate(self, model, messages):
+        if model == "slow-model":
+            await asyncio.sleep(0.5)
+        return f"{model} answered"
+
+
+def _registry() -> AdapterRegistry:
+    registry = AdapterRegistry()
+    registry._adapters[ProviderType.openai] = _SleepyAdapter(ProviderType.openai)
+    for name, cost_tier, cost in (("slow-model", "standard", 0.001), ("backup-model", "premium", 0.02)):
+        registry.catalog.add(
+            CapabilityProfile(
+                provider=ProviderType.openai,
+                model=name,
+                capabilities=[Capability.tool_calling],
+                cost_per_1k_tokens=cost,
+                cost_tier=cost_tier,
+            )
+        )
+    return registry
+
+
+def _request(model: str, **config) -> UnifiedGenerateRequest:
+    return UnifiedGenerateRequest(
+        model=ModelConfig(provider=ProviderType.openai, model=model, **config),
+        messages=[ConversationMessage(role="user", content="hi there")],
+        require_capabilities=[Capability.tool_calling],
+        use_cache=False,
+    )
+
+
+def test_fallback_ranks_profiles_by_tier_and_observed_stats() -> None:
+    registry = _registry()
+    router = ModelRouter(registry)
+    # Cheapest capable profile wins for a low-cost request; premium models rank last.
+    route = router.resolve(_request("local/default", cost_tier="low"))
+    assert route.model == "slow-model"
+    assert [p.model for p in route.alternates] == ["gpt-4.1-mini", "backup-model"]
+
+    # A model that keeps failing drops behind its peers once the window shows it.
+    for _ in range(10):
+        router.engine.record(registry.catalog.get("slow-model"), latency_ms=50, ok=False)
+    assert router.resolve(_request("local/default", cost_tier="low")).model == "gpt-4.1-mini"
+    # An explicitly requested model that fits is kept, unless it is mostly failing.
+    assert router.resolve(_request("gpt-4.1-mini")).model == "gpt-4.1-mini"
+    assert router.resolve(_request("slow-model")).model == "gpt-4.1-mini"
+
+    stats = {row["model"]: row for row in router.engine.snapshot()}
+    assert stats["slow-model"]["error_rate"] == 1.0
+
+
+def test_fast_tier_hedges_slow_calls_on_an_alternate() -> None:
+    router = ModelRouter(_registry(), engine=RoutingEngine(hedge_after_ms=50))
+    start = time.perf_counter()
+    response = router.generate(_request("slow-model", latency_tier="fast"))
+    assert time.perf_counter() - start < 0.4
+    assert response.used_model == "gpt-4.1-mini"
+
+    balanced = router.generate(_request("slow-model"))
+    assert balanced.used_model == "slow-model"
+
+    hedged = asyncio.run(router.agenerate(_request("slow-model", latency_tier="fast")))
+    assert hedged.used_model == "gpt-4.1-mini"
+
+    stats = {row["model"]: row for row in router.engine.snapshot()}
+    assert stats["gpt-4.1-mini"]["hedges"] == stats["gpt-4.1-mini"]["hedge_wins"] == 2
+    assert stats["slow-model"]["p50_ms"] >= 500
+
+
+def test_uncatalogued_model_names_do_not_grow_stats_or_metric_labels() -> None:
+    router = ModelRouter(_registry())
+    for n in range(20):
+        request = _request(f"made-up-{n}")
+        request.require_capabilities = []
+        assert router.generate(request).used_model == f"made-up-{n}"
+    assert not [row for row in router.engine.snapshot() if row["model"].startswith("made-up")]
+    text = telemetry.render()
+    assert "made-up" not in text
+    assert 'model="other"' in text
@@ -1,9 +1,16 @@
+import asyncio
+import json
+import threading
 import time
 
+import pytest
+
+from app.admission import BudgetExceededError, QueueFullError
 from app.agent_manager import AgentManager
-from app.interoperability import AdapterRegistry, ModelRouter
-from app.models import CreateAgentRequest
+from app.interoperability import AdapterRegistry, ModelRouter, ProviderAdapter
+from app.models import CreateAgentRequest, ProviderType, TaskPriority
 from app.task_queue import BackgroundTaskQueue, TaskStatus
+from app.task_store import InMemoryTaskStore
 
 
 def test_background_task_executes_and_records_reasoning() -> None:
@@ -26,3 +33,257 @@ def test_background_task_executes_and_records_reasoning() -> None:
         assert stored.tokens_estimate > 0
     finally:
         q.shutdown()
+
+
+class _SlowRouter(ModelRouter):
+    def __init__(self, delay: float) -> None:
+        super().__init__(AdapterRegistry())
+        self.delay = delay
+
+    def stream(self, request):
+        time.sleep(self.delay)
+        yield from super().stream(request)
+
+
+def _wait_all(q: BackgroundTaskQueue, task_ids: list[str], timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(q.get_task(t).status == TaskStatus.completed for t in task_ids):
+            return
+        time.sleep(0.01)
+    raise AssertionError("tasks did not complete in time")
+
+
+def test_worker_pool_runs_agents_concurrently_and_keeps_per_agent_order() -> None:
+    manager = AgentManager()
+    agents = [manager.create_agent(CreateAgentRequest(name=f"a{i}")) for i in range(4)]
+    q = BackgroundTaskQueue(agent_manager=manager, router=_SlowRouter(0.1), workers=4)
+    try:
+        start = time.monotonic()
+        task_ids = [q.enqueue(agent_id=a.id, prompt=f"step {n}").id for n in range(2) for a in agents]
+        _wait_all(q, task_ids)
+        # 8 tasks * 0.1s would take 0.8s serially; 4 workers should finish in ~0.2s.
+        assert time.monotonic() - start < 0.6
+
+        for agent in agents:
+            prompts = [m.content for m in manager.get_history(agent.id) if m.role == "user"]
+            assert prompts == ["step 0", "step 1"]
+
+        stats = q.stats()
+        assert stats["workers"] == 4
+        assert stats["queue_depth"] == 0
+        assert stats["in_flight"] == 0
+        assert sum(w["tasks_processed"] for w in stats["worker_stats"]) == 8
+    finally:
+        q.shutdown()
+
+
+def test_queue_rejects_when_full_and_when_budget_exhausted() -> None:
+    manager = AgentManager()
+    agent = manager.create_agent(CreateAgentRequest(name="noisy", budget_tokens=100))
+    q = BackgroundTaskQueue(agent_manager=manager, router=_SlowRouter(0.2), workers=1, max_pending=2)
+    try:
+        q.enqueue(agent_id=agent.id, prompt="first")  # picked up by the worker
+        time.sleep(0.05)
+        q.enqueue(agent_id=agent.id, prompt="second")
+        q.enqueue(agent_id=agent.id, prompt="third")
+        with pytest.raises(QueueFullError) as exc_info:
+            q.enqueue(agent_id=agent.id, prompt="fourth")
+        assert exc_info.value.retry_after >= 1
+    finally:
+        q.shutdown()
+
+    q = BackgroundTaskQueue(agent_manager=manager, router=_SlowRouter(0.0), workers=1, budget_window=0.5)
+    try:
+        # A prompt larger than the whole quota can never run.
+        with pytest.raises(ValueError):
+            q.enqueue(agent_id=agent.id, prompt="word " * 150)
+        task = q.enqueue(agent_id=agent.id, prompt="word " * 60)
+        _wait_all(q, [task.id])
+        # The finished task is charged, so a second one of the same size no longer fits this window.
+        assert q.get_usage(agent.id).tokens > 0
+        with pytest.raises(BudgetExceededError) as exc_info:
+            q.enqueue(agent_id=agent.id, prompt="word " * 60)
+        assert exc_info.value.retry_after == 1
+        time.sleep(0.6)
+        assert q.get_usage(agent.id).tokens == 0
+        _wait_all(q, [q.enqueue(agent_id=agent.id, prompt="word " * 60).id])
+    finally:
+        q.shutdown()
+
+
+def test_enqueue_many_is_all_or_nothing_and_wait_for_long_polls() -> None:
+    manager = AgentManager()
+    agents = [manager.create_agent(CreateAgentRequest(name=f"bulk{i}")) for i in range(2)]
+    q = BackgroundTaskQueue(agent_manager=manager, router=_SlowRouter(0.05), workers=2, max_pending=5)
+    try:
+        with pytest.raises(KeyError):
+            q.enqueue_many([(agents[0].id, "ok", TaskPriority.normal, None), ("missing", "x", TaskPriority.low, None)])
+        with pytest.raises(QueueFullError):
+            q.enqueue_many([(agents[0].id, f"t{n}", TaskPriority.normal, None) for n in range(6)])
+        assert q.stats()["queue_depth"] == 0
+
+        tasks = q.enqueue_many([(agent.id, f"t{n}", TaskPriority.normal, None) for n in range(2) for agent in agents])
+        ids = [task.id for task in tasks]
+        assert not q.wait_for(ids, mode="all", timeout=0.01)
+        assert q.wait_for(ids, mode="any", timeout=5)
+        assert q.wait_for(ids, mode="all", timeout=5)
+        found = q.find_tasks(task_ids=[ids[2], "unknown", ids[0]])
+        assert [t.id for t in found] == [ids[2], ids[0]]
+        assert all(t.status == TaskStatus.completed for t in found)
+
+        mine = q.find_tasks(agent_id=agents[1].id, statuses=[TaskStatus.completed])
+        assert {t.id for t in mine} == {ids[1], ids[3]}
+        assert len(q.find_tasks(limit=3)) == 3
+    finally:
+        q.shutdown()
+
+
+def test_completion_futures_and_per_agent_event_stream() -> None:
+    manager = AgentManager()
+    first, second = (manager.create_agent(CreateAgentRequest(name=name)) for name in ("first", "second"))
+    q = BackgroundTaskQueue(agent_manager=manager, router=_SlowRouter(0.05), workers=2)
+    try:
+        task = q.enqueue(agent_id=first.id, prompt="one")
+        q.enqueue(agent_id=second.id, prompt="two")
+        future = q.completion(task.id)
+        assert future.result(timeout=5).status == TaskStatus.completed
+        # Already finished: resolved immediately from the store.
+        assert q.completion(task.id).result(timeout=0).id == task.id
+        with pytest.raises(KeyError):
+            q.completion("unknown")
+
+        events = q.events(agent_id=first.id, timeout=0)
+        assert [(e.task_id, e.status) for e in events] == [
+            (task.id, TaskStatus.queued),
+            (task.id, TaskStatus.running),
+            (task.id, TaskStatus.completed),
+        ]
+        assert q.events(after=events[-1].seq, agent_id=first.id, timeout=0.01) == []
+    finally:
+        q.shutdown()
+
+
+class _BrokenStore(InMemoryTaskStore):
+    def __init__(self, broken_prompt: str) -> None:
+        super().__init__()
+        self.broken_prompt = broken_prompt
+
+    def save(self, task):
+        if task.prompt == self.broken_prompt and task.status != TaskStatus.queued:
+            raise OSError("disk full")
+        super().save(task)
+
+
+def test_worker_survives_errors_outside_the_task_error_path() -> None:
+    manager = AgentManager()
+    agent = manager.create_agent(CreateAgentRequest(name="crash"))
+    q = BackgroundTaskQueue(agent_manager=manager, router=ModelRouter(AdapterRegistry()), store=_BrokenStore("boom"))
+    try:
+        broken = q.enqueue(agent_id=agent.id, prompt="boom")
+        failed = q.completion(broken.id).result(timeout=5)
+        assert failed.status == TaskStatus.failed
+        assert "disk full" in failed.error
+
+        healthy = q.enqueue(agent_id=agent.id, prompt="fine")
+        assert q.completion(healthy.id).result(timeout=5).status == TaskStatus.completed
+        stats = q.stats()
+        assert stats["in_flight"] == 0
+        assert sum(w["tasks_processed"] for w in stats["worker_stats"]) == 2
+    finally:
+        q.shutdown()
+
+
+def test_async_waiters_share_one_loop_and_wake_per_agent() -> None:
+    manager = AgentManager()
+    watched, other = (manager.create_agent(CreateAgentRequest(name=name)) for name in ("watched", "other"))
+    q = BackgroundTaskQueue(agent_manager=manager, router=_SlowRouter(0.05), workers=2)
+
+    async def scenario() -> None:
+        threads = threading.active_count()
+        subscribers = [asyncio.create_task(q.aevents(agent_id=watched.id, timeout=5)) for _ in range(100)]
+        bystander = asyncio.create_task(q.aevents(agent_id=other.id, timeout=0.3))
+        await asyncio.sleep(0.05)
+        assert threading.active_count() == threads  # waiting holds no threads
+        task = q.enqueue(agent_id=watched.id, prompt="wake up")
+        batches = await asyncio.gather(*subscribers)
+        assert all(batch[0].task_id == task.id for batch in batches)
+        assert await bystander == []
+        assert await q.await_for([task.id], timeout=5)
+        finished = await q.awatch(task.id, seen_chars=0, seen_status=TaskStatus.running, timeout=5)
+        assert finished.status == TaskStatus.completed
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        q.shutdown()
+
+
+def test_high_priority_tasks_get_a_larger_share_of_workers() -> None:
+    manager = AgentManager()
+    low = manager.create_agent(CreateAgentRequest(name="low"))
+    high = manager.create_agent(CreateAgentRequest(name="high"))
+    router = _SlowRouter(0.01)
+    order: list[str] = []
+    original = router.stream
+
+    def recording_stream(request):
+        order.append(request.messages[-1].content)
+        return original(request)
+
+    router.stream = recording_stream
+    q = BackgroundTaskQueue(agent_manager=manager, router=router, workers=1)
+    try:
+        # Hold the single worker while both agents fill their lanes.
+        blocker = q.enqueue(agent_id=low.id, prompt="blocker")
+        time.sleep(0.005)
+        ids = [q.enqueue(agent_id=low.id, prompt="low", priority=TaskPriority.low).id for _ in range(6)]
+        ids += [q.enqueue(agent_id=high.id, prompt="high", priority=TaskPriority.high).id for _ in range(6)]
+        _wait_all(q, [blocker.id, *ids])
+        # With weights 4:1 the high agent drains its lane before the low agent gets through half of its own,
+        # but the low agent is not starved either.
+        last_high = max(i for i, p in enumerate(order) if p == "high")
+        assert 1 <= order[1:last_high].count("low") <= 3
+    finally:
+        q.shutdown()
+
+
+class _ToolCallingAdapter(ProviderAdapter):
+    def generate(self, model, messages):
+        last = messages[-1].content
+        if last.startswith("Tool results: "):
+            results = json.loads(last[len("Tool results: ") :])
+            return "answer: " + " | ".join(r.get("stdout", "").strip() or r.get("error", "") for r in results)
+        sleep = "import time\ntime.sleep(0.5)\n"
+        return json.dumps(
+            {
+                "tool_calls": [
+                    {"id": "a", "name": "python", "arguments": {"code": sleep + "print('one')"}},
+                    {"id": "b", "name": "python", "arguments": {"code": sleep + "print('two')"}},
+                    {"id": "c", "name": "javascript", "arguments": {"code": "console.log('js')"}},
+                ]
+            }
+        )
+
+
+def test_agent_step_loop_runs_allowed_tool_calls_in_parallel() -> None:
+    registry = AdapterRegistry()
+    # Tool-enabled agents negotiate tool_calling, which routes local/default to the openai profile.
+    registry._adapters[ProviderType.openai] = _ToolCallingAdapter(ProviderType.openai)
+    manager = AgentManager()
+    agent = manager.create_agent(CreateAgentRequest(name="tools", allowed_tools=["python"], budget_seconds=20))
+    q = BackgroundTaskQueue(agent_manager=manager, router=ModelRouter(registry), workers=2)
+    try:
+        task_id = q.enqueue(agent_id=agent.id, prompt="use tools").id
+        _wait_all(q, [task_id], timeout=15)
+        task = q.get_task(task_id)
+
+        assert task.result == "answer: one | two | Tool javascript is not allowed for this agent"
+        assert task.actions.count("model_call") == 2
+        assert task.actions.count("tool:python") == 2 and "tool:javascript:error" in task.actions
+        tool_step = next(step for step in task.reasoning_steps if "tool calls in parallel" in step)
+        # Two 0.5 s snippets side by side, not back to back.
+        assert int(tool_step.split(" in ")[2].split(" ms")[0]) < 950
+        assert manager.get_history(agent.id)[-1].content == task.result
+    finally:
+        q.shutdown()
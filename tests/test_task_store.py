@@ -0,0 +1,113 @@
+import time
+
+from app.agent_manager import AgentManager
+from app.interoperability import AdapterRegistry, ModelRouter
+from app.models import CreateAgentRequest
+from app.task_queue import BackgroundTaskQueue
+from app.task_store import InMemoryTaskStore, SQLiteTaskStore, TaskState, TaskStatus
+
+
+def test_sqlite_store_batches_writes_and_replays_unfinished(tmp_path) -> None:
+    store = SQLiteTaskStore(tmp_path / "tasks.db", flush_interval=10)
+    queued = TaskState(id="t1", agent_id="a", prompt="p1")
+    running = TaskState(id="t2", agent_id="a", prompt="p2", status=TaskStatus.running)
+    done = TaskState(id="t3", agent_id="a", prompt="p3", status=TaskStatus.completed, finished_at=time.time())
+    for task in (queued, running, done):
+        store.save(task)
+    # Readable from the write-behind buffer before anything is flushed.
+    assert store.get("t3").status == TaskStatus.completed
+    store.close()
+
+    reopened = SQLiteTaskStore(tmp_path / "tasks.db")
+    try:
+        assert [t.id for t in reopened.load_unfinished()] == ["t1", "t2"]
+        assert reopened.get("t3").prompt == "p3"
+    finally:
+        reopened.close()
+
+
+def test_stores_fetch_by_ids_and_query_by_agent_and_status(tmp_path) -> None:
+    for store in (InMemoryTaskStore(), SQLiteTaskStore(tmp_path / "tasks.db", flush_interval=10)):
+        for n in range(4):
+            status = TaskStatus.completed if n % 2 else TaskStatus.queued
+            store.save(TaskState(id=f"t{n}", agent_id="a" if n < 3 else "b", prompt="p", status=status, created_at=n))
+        try:
+            assert sorted(store.get_many(["t1", "t3", "nope"])) == ["t1", "t3"]
+            assert [t.id for t in store.query(agent_id="a")] == ["t2", "t1", "t0"]
+            assert [t.id for t in store.query(statuses=[TaskStatus.completed], limit=1)] == ["t3"]
+        finally:
+            store.close()
+
+
+def test_failed_batch_rolls_back_and_is_retried_by_the_writer(tmp_path, caplog) -> None:
+    store = SQLiteTaskStore(tmp_path / "tasks.db", flush_interval=0.01)
+    store._conn.execute(
+        "CREATE TRIGGER reject BEFORE INSERT ON tasks WHEN NEW.agent_id = 'bad' BEGIN SELECT RAISE(ABORT, 'nope'); END"
+    )
+
+    def count() -> int:
+        with store._db_lock:
+            return store._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    try:
+        store.save(TaskState(id="good", agent_id="a", prompt="p"))
+        store.save(TaskState(id="bad", agent_id="bad", prompt="p"))
+        for _ in range(200):
+            if "Writing tasks" in caplog.text:
+                break
+            time.sleep(0.01)
+        # The whole batch was rolled back and the writer is still running, retrying it.
+        assert "Writing tasks" in caplog.text
+        assert count() == 0
+        assert store._writer.is_alive()
+        assert store.get("good") is not None
+
+        with store._db_lock:
+            store._conn.execute("DROP TRIGGER reject")
+        for _ in range(200):
+            if count() == 2:
+                break
+            time.sleep(0.01)
+        assert count() == 2
+    finally:
+        store.close()
+
+
+def test_finished_tasks_are_evicted_by_size_and_ttl(tmp_path) -> None:
+    memory = InMemoryTaskStore(max_finished=2)
+    for i in range(4):
+        memory.save(TaskState(id=f"t{i}", agent_id="a", prompt="p", status=TaskStatus.completed))
+    assert memory.get("t0") is None and memory.get("t1") is None
+    assert memory.get("t3") is not None
+
+    store = SQLiteTaskStore(tmp_path / "tasks.db", finished_ttl_seconds=60)
+    try:
+        store.save(TaskState(id="old", agent_id="a", prompt="p", status=TaskStatus.failed, finished_at=time.time() - 120))
+        store.save(TaskState(id="new", agent_id="a", prompt="p", status=TaskStatus.failed, finished_at=time.time()))
+        store.flush()
+        assert store.evict_finished() == 1
+        assert store.get("old") is None
+        assert store.get("new") is not None
+    finally:
+        store.close()
+
+
+def test_queue_recovers_tasks_left_running_by_a_previous_process(tmp_path) -> None:
+    manager = AgentManager()
+    agent = manager.create_agent(CreateAgentRequest(name="recover"))
+    store = SQLiteTaskStore(tmp_path / "tasks.db")
+    store.save(TaskState(id="orphan", agent_id=agent.id, prompt="resume me", status=TaskStatus.running))
+    store.flush()
+
+    q = BackgroundTaskQueue(agent_manager=manager, router=ModelRouter(AdapterRegistry()), store=store)
+    try:
+        for _ in range(100):
+            if q.get_task("orphan").status == TaskStatus.completed:
+                break
+            time.sleep(0.01)
+        task = q.get_task("orphan")
+        assert task.status == TaskStatus.completed
+        assert "recover" in task.actions
+    finally:
+        q.shutdown()
+        store.close()
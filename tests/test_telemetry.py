@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from app.agent_manager import AgentManager
+from app.interoperability import AdapterRegistry, ModelRouter
+from app.models import CreateAgentRequest
+from app.task_queue import BackgroundTaskQueue, TaskStatus
+from app.telemetry import Telemetry, telemetry
+
+
+def test_spans_nest_feed_histograms_and_export_otlp_json(tmp_path) -> None:
+    trace_path = tmp_path / "traces.jsonl"
+    t = Telemetry(trace_path=trace_path, buckets=(0.01, 1.0))
+    with t.span("outer", job="a") as outer:
+        with t.span("inner"):
+            pass
+        with pytest.raises(ValueError):
+            with t.span("failing"):
+                raise ValueError("bad")
+    t.observe("agent_model_call_duration_seconds", 0.5, model='say "hi"')
+    t.inc("agent_tasks_total", status="completed")
+    t.gauge("agent_queue_depth", lambda: 3)
+    t.close()
+
+    text = t.render()
+    assert 'agent_span_duration_seconds_count{span="inner"} 1' in text
+    assert 'agent_model_call_duration_seconds_bucket{model="say \\"hi\\"",le="0.01"} 0' in text
+    assert 'agent_model_call_duration_seconds_bucket{model="say \\"hi\\"",le="+Inf"} 1' in text
+    assert 'agent_tasks_total{status="completed"} 1.0' in text
+    assert "# TYPE agent_queue_depth gauge\nagent_queue_depth 3.0" in text
+
+    spans = [
+        span
+        for line in trace_path.read_text().splitlines()
+        for resource in json.loads(line)["resourceSpans"]
+        for scope in resource["scopeSpans"]
+        for span in scope["spans"]
+    ]
+    by_name = {span["name"]: span for span in spans}
+    assert by_name["inner"]["parentSpanId"] == outer.span_id
+    assert by_name["inner"]["traceId"] == outer.trace_id
+    assert "parentSpanId" not in by_name["outer"]
+    assert by_name["failing"]["status"] == {"code": 2, "message": "ValueError: bad"}
+    assert by_name["outer"]["attributes"] == [{"key": "job", "value": {"stringValue": "a"}}]
+
+
+def test_task_pipeline_records_stage_timings() -> None:
+    manager = AgentManager()
+    agent = manager.create_agent(CreateAgentRequest(name="traced"))
+    q = BackgroundTaskQueue(agent_manager=manager, router=ModelRouter(AdapterRegistry()), workers=1)
+    try:
+        task = q.enqueue(agent_id=agent.id, prompt="hello")
+        assert q.wait_for([task.id], timeout=5)
+        stored = q.get_task(task.id)
+    finally:
+        q.shutdown()
+    assert stored.status == TaskStatus.completed
+    assert set(stored.stage_ms) >= {"queue_wait", "negotiate", "context", "model_call", "history"}
+    text = telemetry.render()
+    for stage in ("task", "task.queue_wait", "task.model_call", "router.resolve"):
+        assert f'agent_span_duration_seconds_count{{span="{stage}"}}' in text
+    assert "agent_model_call_duration_seconds_count" in text
@@ -0,0 +1,72 @@
+import subprocess
+import threading
+import time
+
+import pytest
+
+from app.admission import QueueFullError
+from app.tool_calls import parse_tool_calls, run_tool_calls
+from app.tool_executor import ToolExecutor, ToolJobStatus
+from app.tool_runtime import UnsafeCodeError
+
+
+def test_executor_runs_jobs_and_reports_failures() -> None:
+    tools = ToolExecutor(workers=2)
+    try:
+        with pytest.raises(UnsafeCodeError):
+            tools.submit("python", "import os", timeout_seconds=3)
+
+        ok = tools.submit("python", "print('job')", timeout_seconds=3)
+        slow = tools.submit("python", "while True:\n    pass", timeout_seconds=1)
+        assert ok.done.result(timeout=10).stdout == "job\n"
+        with pytest.raises(subprocess.TimeoutExpired):
+            slow.done.result(timeout=10)
+
+        assert tools.get(ok.id).status == ToolJobStatus.succeeded
+        failed = tools.get(slow.id).payload()
+        assert (failed["status"], failed["error"], failed["result"]) == (ToolJobStatus.failed, "Timed out after 1s", None)
+        with pytest.raises(KeyError):
+            tools.get("missing")
+    finally:
+        tools.shutdown()
+
+
+def test_executor_bounds_concurrency_and_queue() -> None:
+    tools = ToolExecutor(workers=1, max_pending=2)
+    gate = threading.Event()
+    real_run = tools._run
+
+    def gated_run(job):
+        gate.wait(10)
+        real_run(job)
+
+    tools._run = gated_run
+    try:
+        jobs = [tools.submit("python", f"print({i})", timeout_seconds=3) for i in range(2)]
+        with pytest.raises(QueueFullError) as excinfo:
+            tools.submit("python", "print(2)", timeout_seconds=3)
+        assert excinfo.value.retry_after >= 1
+        assert tools.stats()["pending"] == 2
+
+        gate.set()
+        assert [job.done.result(timeout=10).stdout for job in jobs] == ["0\n", "1\n"]
+        deadline = time.monotonic() + 5
+        while tools.stats()["running"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert tools.stats()["pending"] == tools.stats()["running"] == 0
+    finally:
+        gate.set()
+        tools.shutdown()
+
+
+def test_tool_calls_with_out_of_range_timeouts_fall_back_to_the_default() -> None:
+    calls = parse_tool_calls(
+        '{"tool_calls": [{"id": "a", "name": "python", "arguments": {"code": "print(1)", "timeout_seconds": 1e999}},'
+        ' {"id": "b", "name": "python", "arguments": {"code": "print(2)", "timeout_seconds": "soon"}}]}'
+    )
+    tools = ToolExecutor(workers=2)
+    try:
+        results = run_tool_calls(tools, calls, ["python"], deadline=time.monotonic() + 20)
+    finally:
+        tools.shutdown()
+    assert [(r.error, r.result.stdout) for r in results] == [(None, "1\n"), (None, "2\n")]
@@ -1,6 +1,11 @@
+import signal
+import subprocess
+import time
+
 import pytest
 
-from app.tool_runtime import UnsafeCodeError, execute_python
+from app.tool_runtime import UnsafeCodeError, _safe_env, _validate_python, _verdicts, execute_javascript, execute_python
+from app.worker_pool import NodeWorkerPool, PythonWorkerPool, ResourceLimits, node_pool_supported
 
 
 def test_python_runtime_executes_safe_code() -> None:
@@ -12,3 +17,137 @@ def test_python_runtime_executes_safe_code() -> None:
 def test_python_runtime_blocks_unsafe_import() -> None:
     with pytest.raises(UnsafeCodeError):
         execute_python("import os\nprint('x')", timeout_seconds=3)
+
+
+def test_safety_verdicts_are_cached_by_content() -> None:
+    _verdicts.clear()
+    before = _verdicts.stats()
+    unsafe = "def f():\n    return [eval(x) for x in 'ab']"
+    for _ in range(2):
+        with pytest.raises(UnsafeCodeError, match="Name blocked: eval"):
+            _validate_python(unsafe)
+    assert _validate_python("print(1)") == _validate_python("print(1)") is not None
+    stats = _verdicts.stats()
+    assert (stats["misses"] - before["misses"], stats["hits"] - before["hits"]) == (2, 2)
+    assert stats["entries"] == 2
+
+    # Long generated expressions nest past the recursion limit; the check must not recurse.
+    assert _validate_python("x = " + " + ".join(["1"] * 500)) is not None
+    chain = "x = " + " + ".join(["1"] * 2000)
+    _validate_python(chain)  # too deep to compile here: no bytecode, the run reports it
+    with pytest.raises(UnsafeCodeError):
+        _validate_python(chain + " + eval('1')")
+    with pytest.raises(ValueError):
+        _validate_python("x = " + " + ".join(["1"] * 10_000))
+
+    # Cached bytecode runs on the warm pool exactly like the source would.
+    result = execute_python("def f():\n    return 1 / 0\nf()", timeout_seconds=3)
+    assert result.exit_code == 1
+    assert 'File "script.py", line 2, in f' in result.stderr
+    assert "ZeroDivisionError" in result.stderr
+
+
+def test_warm_pool_matches_cold_path_and_isolates_runs() -> None:
+    code = "import json\nx = 41\nprint(json.dumps({'x': x + 1}))"
+    warm = execute_python(code, timeout_seconds=3)
+    cold = execute_python(code, timeout_seconds=3, warm=False)
+    assert (warm.stdout, warm.exit_code) == (cold.stdout, cold.exit_code) == ('{"x": 42}\n', 0)
+
+    # Globals from one run never reach the next, and each run gets its own scratch dir.
+    assert execute_python("x = 1", timeout_seconds=3).exit_code == 0
+    leaked = execute_python("print(x)", timeout_seconds=3)
+    assert leaked.exit_code == 1
+    assert "NameError" in leaked.stderr
+
+
+def test_warm_pool_reports_exit_codes_and_recycles_after_timeout() -> None:
+    pool = PythonWorkerPool(env_factory=_safe_env, size=1, max_runs=2)
+    try:
+        assert pool.run("raise SystemExit(3)", timeout_seconds=3).exit_code == 3
+        with pytest.raises(subprocess.TimeoutExpired):
+            pool.run("while True:\n    pass", timeout_seconds=1)
+        result = pool.run("print('after')", timeout_seconds=3)
+        assert (result.stdout, result.exit_code) == ("after\n", 0)
+    finally:
+        pool.close()
+
+
+def test_cold_run_deadline_holds_after_the_child_closes_its_pipes() -> None:
+    code = "import io\nio.open(1,'wb').close()\nio.open(2,'wb').close()\nimport time\ntime.sleep(6)"
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        execute_python(code, 1, warm=False)
+    assert time.monotonic() - start < 3
+
+
+@pytest.mark.parametrize("warm", [True, False])
+def test_python_runs_are_metered_and_capped(warm: bool) -> None:
+    limits = ResourceLimits(cpu_seconds=1, memory_bytes=256 * 1024 * 1024, max_output_bytes=1000)
+    chatty = execute_python("print('x' * 5000)", timeout_seconds=5, warm=warm, limits=limits)
+    assert (chatty.exit_code, len(chatty.stdout), chatty.truncated) == (0, 1000, True)
+    assert chatty.wall_time_ms > 0 and chatty.peak_rss_kb > 0
+
+    spinning = execute_python("while True:\n    pass", timeout_seconds=5, warm=warm, limits=limits)
+    assert spinning.exit_code == -signal.SIGXCPU
+    assert "CPU time limit exceeded" in spinning.stderr
+    assert spinning.cpu_time_ms >= 900
+
+    hungry = execute_python("x = bytearray(512 * 1024 * 1024)", timeout_seconds=5, warm=warm, limits=limits)
+    assert hungry.exit_code == 1 and "MemoryError" in hungry.stderr
+
+
+@pytest.mark.skipif(not node_pool_supported(), reason="node is not installed")
+def test_node_runs_are_metered_and_capped() -> None:
+    limits = ResourceLimits(max_output_bytes=100)
+    for warm in (True, False):
+        result = execute_javascript("console.log('y'.repeat(500))", timeout_seconds=5, warm=warm, limits=limits)
+        assert (result.exit_code, result.stdout, result.truncated) == (0, "y" * 100, True)
+        assert result.cpu_time_ms > 0 and result.peak_rss_kb > 0
+
+
+@pytest.mark.skipif(not node_pool_supported(), reason="node is not installed")
+def test_warm_node_pool_runs_in_a_stripped_context() -> None:
+    result = execute_javascript("console.log('sum', 1 + 2); console.error('warn')", timeout_seconds=3)
+    assert (result.stdout, result.stderr, result.exit_code) == ("sum 3\n", "warn\n", 0)
+
+    escaped = execute_javascript(
+        "console.log(typeof process, typeof require, typeof global, typeof fetch)", timeout_seconds=3
+    )
+    assert escaped.stdout == "undefined undefined undefined undefined\n"
+
+    blocked = execute_javascript("eval('1 + 1')", timeout_seconds=3)
+    assert blocked.exit_code == 1
+    assert "EvalError" in blocked.stderr
+
+
+@pytest.mark.skipif(not node_pool_supported(), reason="node is not installed")
+def test_warm_node_pool_enforces_timeout_and_recycles_crashed_workers() -> None:
+    pool = NodeWorkerPool(env_factory=_safe_env, size=1, memory_mb=32)
+    try:
+        with pytest.raises(subprocess.TimeoutExpired):
+            pool.run("while (true) {}", timeout_seconds=1)
+        crashed = pool.run("const a = []; while (true) { a.push(new Array(1e6).fill(1)); }", 10)
+        assert crashed.exit_code == 1 and "crashed" in crashed.stderr
+        assert pool.run("console.log('alive')", timeout_seconds=3).stdout == "alive\n"
+    finally:
+        pool.close()
+
+
+@pytest.mark.skipif(not node_pool_supported(), reason="node is not installed")
+def test_warm_node_runs_cannot_reach_the_worker_realm() -> None:
+    pool = NodeWorkerPool(env_factory=_safe_env, size=1)
+    try:
+        polluted = pool.run(
+            "console.__proto__.leak = 1; console.log.__proto__.leak = 2;"
+            "console.__proto__.toJSON = () => 1; console.log({ a: 1 })",
+            timeout_seconds=3,
+        )
+        assert polluted.stdout == "{ a: 1 }\n"
+        fresh = pool.run("console.log(typeof console.leak, typeof console.log.leak)", timeout_seconds=3)
+        assert fresh.stdout == "undefined undefined\n"
+        custom = pool.run(
+            "console.log({ [Symbol.for('nodejs.util.inspect.custom')]: (d, o, inspect) => typeof inspect })", 3
+        )
+        assert custom.exit_code == 0 and "function" not in custom.stdout
+    finally:
+        pool.close()
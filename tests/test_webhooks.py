@@ -0,0 +1,120 @@
+import hashlib
+import hmac
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.agent_manager import AgentManager
+from app.interoperability import AdapterRegistry, ModelRouter
+from app.models import CreateAgentRequest
+from app.task_queue import BackgroundTaskQueue
+from app.webhooks import SIGNATURE_HEADER, CallbackURLError, WebhookDispatcher, validate_callback_url
+
+
+class _Receiver:
+    """Local HTTP endpoint recording POSTs; answers with the queued status codes, then 200."""
+
+    def __init__(self, statuses: list[int] | None = None) -> None:
+        self.statuses = list(statuses or [])
+        self.requests: list[tuple[dict, bytes]] = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                receiver.requests.append((dict(self.headers), body))
+                self.send_response(receiver.statuses.pop(0) if receiver.statuses else 200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def test_dispatcher_signs_retries_server_errors_and_gives_up_on_client_errors() -> None:
+    receiver = _Receiver(statuses=[503, 200, 404])
+    dispatcher = WebhookDispatcher(backoff=0.01, secret="s3cret", allowed_hosts=["127.0.0.1"])
+    try:
+        assert dispatcher.send(receiver.url, {"n": 1}).result(timeout=5) is True
+        assert dispatcher.send(receiver.url, {"n": 2}).result(timeout=5) is False
+        assert dispatcher.stats() == {"delivered": 1, "failed": 1, "retries": 1, "dropped": 0, "pending": 0}
+        headers, body = receiver.requests[0]
+        expected = hmac.new(b"s3cret", body, hashlib.sha256).hexdigest()
+        assert headers[SIGNATURE_HEADER] == f"sha256={expected}"
+        assert json.loads(body) == {"n": 1}
+        assert len(receiver.requests) == 3
+    finally:
+        dispatcher.close()
+        receiver.close()
+
+
+def test_callback_urls_must_be_public_or_allowlisted() -> None:
+    for url in (
+        "file:///etc/passwd",
+        "http://localhost:8000/hook",
+        "http://127.0.0.1/hook",
+        "http://10.0.0.5/hook",
+        "http://169.254.169.254/latest/meta-data",
+        "http://[::1]/hook",
+        "http://[::ffff:127.0.0.1]/hook",
+    ):
+        with pytest.raises(CallbackURLError):
+            validate_callback_url(url)
+    validate_callback_url("https://93.184.216.34/hook")
+    validate_callback_url("http://127.0.0.1:9000/hook", allowed_hosts={"127.0.0.1"})
+
+    # Not allowlisted: refused again at delivery time, without connecting.
+    dispatcher = WebhookDispatcher()
+    try:
+        assert dispatcher.send("http://127.0.0.1:9/hook", {"n": 1}).result(timeout=5) is False
+        assert dispatcher.stats()["failed"] == 1
+    finally:
+        dispatcher.close()
+
+
+def test_dispatcher_drops_deliveries_past_max_pending() -> None:
+    release = threading.Event()
+    dispatcher = WebhookDispatcher(workers=1, max_pending=2)
+    dispatcher._deliver = lambda url, body: release.wait(5)  # a receiver that never answers
+    try:
+        queued = [dispatcher.send("http://127.0.0.1:9/hook", {"n": n}) for n in range(5)]
+        assert [future.done() for future in queued[2:]] == [True, True, True]
+        assert [future.result() for future in queued[2:]] == [False, False, False]
+        assert dispatcher.stats()["dropped"] == 3 and dispatcher.stats()["pending"] == 2
+    finally:
+        release.set()
+        dispatcher.close()
+    assert dispatcher.stats()["pending"] == 0
+
+
+def test_queue_posts_completion_to_the_task_callback_url() -> None:
+    receiver = _Receiver()
+    dispatcher = WebhookDispatcher(allowed_hosts=["127.0.0.1"])
+    manager = AgentManager()
+    agent = manager.create_agent(CreateAgentRequest(name="hooked"))
+    q = BackgroundTaskQueue(agent_manager=manager, router=ModelRouter(AdapterRegistry()), webhooks=dispatcher)
+    try:
+        with pytest.raises(CallbackURLError):
+            q.enqueue(agent.id, "bad", callback_url="ftp://example.com")
+        with pytest.raises(CallbackURLError):
+            q.enqueue(agent.id, "bad", callback_url="http://10.1.2.3/hook")
+        task = q.enqueue(agent.id, "notify me", callback_url=receiver.url)
+        q.completion(task.id).result(timeout=5)
+    finally:
+        q.shutdown()
+        dispatcher.close()
+        receiver.close()
+    payload = json.loads(receiver.requests[0][1])
+    assert payload["event"] == "task.completed"
+    assert payload["task"]["id"] == task.id
+    assert payload["task"]["result"]